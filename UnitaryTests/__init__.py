@@ -1 +1,12 @@
-# Este archivo vacío convierte la carpeta UnitaryTests en un paquete Python
\ No newline at end of file
+# Este archivo convierte la carpeta UnitaryTests en un paquete Python.
+#
+# Las pruebas usan los servicios compartidos de app.servicios y vacían sus almacenes
+# (series, geocodificación): antes de importarlos se apunta AIRE_CLIMA_INSTANCE a
+# una carpeta temporal, para no tocar la carpeta instance del proyecto.
+import atexit
+import os
+import shutil
+import tempfile
+
+os.environ["AIRE_CLIMA_INSTANCE"] = tempfile.mkdtemp(prefix="aire-clima-pruebas-")
+atexit.register(shutil.rmtree, os.environ["AIRE_CLIMA_INSTANCE"], ignore_errors=True)
@@ -4,10 +4,13 @@ import os
 
 if __name__ == '__main__':
     # Asegurarse de que el directorio raíz del proyecto esté en el path
-    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    raiz = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    sys.path.insert(0, raiz)
     
-    # Descubrir y ejecutar todas las pruebas
-    test_suite = unittest.defaultTestLoader.discover('.', pattern='test_*.py')
+    # Descubrir y ejecutar todas las pruebas como módulos del paquete UnitaryTests,
+    # cuyo __init__ aísla los almacenes en una carpeta temporal
+    test_suite = unittest.defaultTestLoader.discover(os.path.dirname(os.path.abspath(__file__)),
+                                                     pattern='test_*.py', top_level_dir=raiz)
     test_runner = unittest.TextTestRunner(verbosity=2)
     result = test_runner.run(test_suite)
     
@@ -0,0 +1,82 @@
+import unittest
+import random
+from datetime import date, timedelta
+from app.facade.agregados import AnaliticaIncremental
+from app.facade.analisis import analizar_tendencias_numpy
+from app.facade.series import Serie, compactar
+
+def generar_datos(inicio, dias, semilla=0):
+    """Datos históricos sintéticos con fechas reales y algunos huecos (None)"""
+    aleatorio = random.Random(semilla)
+    fechas = [inicio + timedelta(days=d) for d in range(dias)]
+    def valor(a, b):
+        return None if aleatorio.random() < 0.05 else round(aleatorio.uniform(a, b), 1)
+    return {
+        "weather_historical": compactar({"daily": {
+            "time": [f.isoformat() for f in fechas],
+            "temperature_2m_max": [valor(10, 35) for _ in fechas],
+            "temperature_2m_min": [valor(-5, 15) for _ in fechas]
+        }}),
+        "air_quality_historical": compactar({"hourly": {
+            "time": [f"{f.isoformat()}T{h:02d}:00" for f in fechas for h in range(24)],
+            "pm10": [valor(5, 90) for _ in fechas for _ in range(24)],
+            "pm2_5": [valor(2, 45) for _ in fechas for _ in range(24)]
+        }})
+    }
+
+def recortar(datos, desde, dias):
+    """Ventana de `dias` días a partir del día `desde` de los datos"""
+    daily = datos["weather_historical"]["daily"]
+    hourly = datos["air_quality_historical"]["hourly"]
+    return {
+        "weather_historical": {"daily": Serie(daily.tiempo[desde:desde + dias], {
+            nombre: columna[desde:desde + dias] for nombre, columna in daily.columnas.items()}, daily.unidad)},
+        "air_quality_historical": {"hourly": Serie(hourly.tiempo[desde * 24:(desde + dias) * 24], {
+            nombre: columna[desde * 24:(desde + dias) * 24] for nombre, columna in hourly.columnas.items()})}
+    }
+
+class TestAnaliticaIncremental(unittest.TestCase):
+    
+    def setUp(self):
+        self.analitica = AnaliticaIncremental()
+        self.celda = (40.4, -3.7)
+        self.datos = generar_datos(date(2024, 1, 1), 120, semilla=3)
+    
+    def test_mismo_informe_que_motor_numpy(self):
+        for desde, dias in ((0, 1), (0, 4), (10, 7), (10, 8), (11, 7), (0, 120), (50, 30)):
+            ventana = recortar(self.datos, desde, dias)
+            with self.subTest(desde=desde, dias=dias):
+                self.assertEqual(self.analitica.informe(self.celda, ventana), analizar_tendencias_numpy(ventana))
+    
+    def test_reutiliza_los_dias_ya_agregados(self):
+        self.analitica.informe(self.celda, recortar(self.datos, 0, 30))
+        # 30 días de la serie diaria y 30 de la horaria
+        self.assertEqual(self.analitica.dias_calculados, 60)
+        # Ampliar la ventana o desplazarla un día solo calcula los días nuevos
+        self.analitica.informe(self.celda, recortar(self.datos, 0, 31))
+        self.analitica.informe(self.celda, recortar(self.datos, 1, 31))
+        self.assertEqual(self.analitica.dias_calculados, 64)
+        # Otra celda tiene sus propios agregados
+        self.analitica.informe((43.3, -2.9), recortar(self.datos, 0, 7))
+        self.assertEqual(self.analitica.dias_calculados, 78)
+    
+    def test_recalcula_los_dias_abiertos(self):
+        hoy = date.today()
+        datos = generar_datos(hoy - timedelta(days=6), 7)
+        self.analitica.informe(self.celda, datos)
+        
+        # Los datos del último día cambian: el informe los refleja
+        nuevos = generar_datos(hoy - timedelta(days=6), 7)
+        hourly = nuevos["air_quality_historical"]["hourly"]
+        hourly.columnas["pm10"] = hourly["pm10"].copy()
+        hourly.columnas["pm10"][-24:] = 500.0
+        informe = self.analitica.informe(self.celda, nuevos)
+        self.assertEqual(informe, analizar_tendencias_numpy(nuevos))
+        self.assertEqual(informe["calidad_aire"]["pm10_max"], 500.0)
+    
+    def test_series_sin_eje_de_tiempos(self):
+        datos = {"weather_historical": {"daily": {"temperature_2m_max": [20.0]}}, "air_quality_historical": {}}
+        self.assertIsNone(self.analitica.informe(self.celda, datos))
+
+if __name__ == '__main__':
+    unittest.main()
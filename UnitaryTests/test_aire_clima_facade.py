@@ -1,8 +1,16 @@
 import unittest
 from unittest.mock import patch, Mock
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
 from app.facade.aireYClimaFacade import AireYClimaFacade
-from datetime import datetime
+from app.facade.limitador import FONDO, con_prioridad
+from app.facade.resiliencia import CircuitoAbierto, PlazoAgotado
+from app.facade.series import Serie, a_json
+from datetime import datetime, date, timedelta, timezone
+from app.cache_http import version_datos
 
 class TestAireYClimaFacade(unittest.TestCase):
     
@@ -41,67 +49,407 @@ class TestAireYClimaFacade(unittest.TestCase):
             }
         }
 
-    @patch('app.facade.aireYClimaFacade.requests.get')
-    def test_recoger_ultimo_dato(self, mock_requests_get):
-        # Configurar las respuestas simuladas
-        mock_weather_response = Mock()
-        mock_weather_response.status_code = 200
-        mock_weather_response.json.return_value = self.mock_weather_data
-        
-        mock_air_quality_response = Mock()
-        mock_air_quality_response.status_code = 200
-        mock_air_quality_response.json.return_value = self.mock_air_quality_data
-        
-        # Configurar el comportamiento del mock para retornar las respuestas simuladas
-        mock_requests_get.side_effect = [mock_weather_response, mock_air_quality_response]
-        
-        # Ejecutar la función a probar
-        resultado = self.facade.recoger_ultimo_dato(40.4, -3.7)
+    def _respuestas_por_url(self, weather_data, air_quality_data):
+        """Devuelve un side_effect que responde según la API consultada (las peticiones van en paralelo)"""
+        def responder(url, *args, **kwargs):
+            mock_response = Mock()
+            mock_response.status_code = 200
+            if url == self.facade.weather_api_url:
+                mock_response.json.return_value = weather_data
+            else:
+                mock_response.json.return_value = air_quality_data
+            mock_response.content = json.dumps(mock_response.json.return_value).encode()
+            return mock_response
+        return responder
+
+    @patch('app.facade.aireYClimaFacade._hora_en_curso', return_value=datetime(2023, 5, 20, 12, tzinfo=timezone.utc))
+    def test_recoger_ultimo_dato(self, mock_hora):
+        with patch.object(self.facade.session, 'get') as mock_session_get:
+            # Configurar el comportamiento del mock para retornar las respuestas simuladas
+            mock_session_get.side_effect = self._respuestas_por_url(self.mock_weather_data, self.mock_air_quality_data)
+            
+            # Ejecutar la función a probar
+            resultado = self.facade.recoger_ultimo_dato(40.4, -3.7)
         
-        # Verificar los resultados
+        # Verificar los resultados: la calidad del aire empieza en la hora en curso
         self.assertEqual(resultado['weather'], self.mock_weather_data)
-        self.assertEqual(resultado['air_quality'], self.mock_air_quality_data)
+        self.assertEqual(resultado['air_quality'], {"hourly": {"time": ["2023-05-20T12:00"], "pm10": [15.2], "pm2_5": [8.4]}})
         
-        # Verificar que se llamó a requests.get con los parámetros correctos
-        calls = mock_requests_get.call_args_list
-        self.assertEqual(len(calls), 2)
+        # Verificar que se llamó a la sesión con los parámetros correctos
+        calls = {c[0][0]: c[1] for c in mock_session_get.call_args_list}
+        self.assertEqual(mock_session_get.call_count, 2)
         
         # Verificar la llamada para obtener datos del clima
-        weather_args = calls[0][1]
+        weather_args = calls[self.facade.weather_api_url]
         self.assertEqual(weather_args['params']['latitude'], 40.4)
         self.assertEqual(weather_args['params']['longitude'], -3.7)
         self.assertTrue(weather_args['params']['current_weather'])
+        self.assertEqual(weather_args['timeout'], self.facade.timeout)
         
         # Verificar la llamada para obtener calidad del aire
-        air_quality_args = calls[1][1]
+        air_quality_args = calls[self.facade.air_quality_api_url]
         self.assertEqual(air_quality_args['params']['latitude'], 40.4)
         self.assertEqual(air_quality_args['params']['longitude'], -3.7)
         self.assertEqual(air_quality_args['params']['hourly'], "pm10,pm2_5")
+        self.assertEqual(air_quality_args['params']['forecast_hours'], 2)
+
+    def test_recoger_ultimo_dato_alineado_con_la_hora(self):
+        hora = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        horas = [hora + timedelta(hours=h) for h in range(2)]
+        air_quality_data = {"hourly": {
+            "time": [h.strftime("%Y-%m-%dT%H:%M") for h in horas],
+            "pm10": [15.2, 16.7],
+            "pm2_5": [8.4, 9.1]
+        }}
+        with patch.object(self.facade.session, 'get') as mock_session_get, \
+                patch('app.facade.aireYClimaFacade._hora_en_curso') as mock_hora:
+            mock_session_get.side_effect = self._respuestas_por_url(self.mock_weather_data, air_quality_data)
+            mock_hora.return_value = horas[0]
+            esta_hora = self.facade.recoger_ultimo_dato(40.4, -3.7)
+            # Al cambiar la hora, la misma copia en caché se recorta desde la nueva hora
+            mock_hora.return_value = horas[1]
+            siguiente = self.facade.recoger_ultimo_dato(40.4, -3.7)
+            # Con datos que ya no llegan a la hora en curso se conservan las últimas horas
+            mock_hora.return_value = hora + timedelta(hours=6)
+            obsoleto = self.facade.recoger_ultimo_dato(40.4, -3.7)
+            mock_hora.return_value = horas[0]
+            ventana = self.facade.recoger_ultimo_dato(40.4, -3.7, horas=2)
+        
+        # Otra ventana de horas es otra petición de calidad del aire; el clima sigue en caché
+        self.assertEqual(mock_session_get.call_count, 3)
+        self.assertEqual(mock_session_get.call_args_list[-1][1]["params"]["forecast_hours"], 3)
+        self.assertEqual(esta_hora["air_quality"]["hourly"]["pm10"], [15.2])
+        self.assertEqual(siguiente["air_quality"]["hourly"]["pm10"], [16.7])
+        self.assertEqual(obsoleto["air_quality"]["hourly"]["pm10"], [16.7])
+        self.assertEqual(ventana["air_quality"]["hourly"]["pm10"], [15.2, 16.7])
+        # La versión de los datos cambia con la hora aunque la copia sea la misma
+        self.assertNotEqual(version_datos(esta_hora["frescura"]), version_datos(siguiente["frescura"]))
+
+    def test_recoger_ultimo_dato_error_api(self):
+        with patch.object(self.facade.session, 'get') as mock_session_get:
+            mock_response = Mock()
+            mock_response.status_code = 500
+            mock_response.content = b""
+            mock_session_get.return_value = mock_response
+            
+            resultado = self.facade.recoger_ultimo_dato(40.4, -3.7)
+        
+        # Una respuesta distinta de 200 se traduce en un diccionario vacío
+        self.assertEqual(resultado["weather"], {})
+        self.assertEqual(resultado["air_quality"], {})
+        self.assertEqual(resultado["frescura"]["weather"], {"edad": None, "obsoleto": False, "actualizado": None})
 
-    @patch('app.facade.aireYClimaFacade.requests.get')
-    def test_obtener_datos_historicos(self, mock_requests_get):
-        # Configurar las respuestas simuladas
-        mock_weather_response = Mock()
-        mock_weather_response.status_code = 200
-        mock_weather_response.json.return_value = self.mock_historical_weather_data
+    def test_recoger_ultimo_dato_usa_cache(self):
+        with patch.object(self.facade.session, 'get') as mock_session_get:
+            mock_session_get.side_effect = self._respuestas_por_url(self.mock_weather_data, self.mock_air_quality_data)
+            
+            primero = self.facade.recoger_ultimo_dato(40.4, -3.7)
+            # Coordenadas muy próximas caen en la misma celda de la caché
+            segundo = self.facade.recoger_ultimo_dato(40.41, -3.69)
         
-        mock_air_quality_response = Mock()
-        mock_air_quality_response.status_code = 200
-        mock_air_quality_response.json.return_value = self.mock_historical_air_quality_data
+        self.assertEqual(primero, segundo)
+        self.assertEqual(mock_session_get.call_count, 2)
+        self.assertEqual(self.facade.cache.estadisticas()["aciertos"], 2)
+
+    def test_recoger_ultimo_dato_coalesce_peticiones(self):
+        liberar = threading.Event()
+        responder = self._respuestas_por_url(self.mock_weather_data, self.mock_air_quality_data)
         
-        # Configurar el comportamiento del mock
-        mock_requests_get.side_effect = [mock_weather_response, mock_air_quality_response]
+        def responder_al_liberar(url, *args, **kwargs):
+            liberar.wait(5)
+            return responder(url, *args, **kwargs)
         
-        # Ejecutar la función a probar
-        resultado = self.facade.obtener_datos_historicos(40.4, -3.7, 7)
+        with patch.object(self.facade.session, 'get', side_effect=responder_al_liberar) as mock_session_get, \
+                ThreadPoolExecutor(max_workers=20) as executor:
+            futuros = [executor.submit(self.facade.recoger_ultimo_dato, 40.4, -3.7) for _ in range(20)]
+            # Esperar a que todas las llamadas estén pendientes de las dos primeras
+            while self.facade.coalescedor.estadisticas()["coalescidas"] < 38:
+                time.sleep(0.01)
+            liberar.set()
+            resultados = [futuro.result() for futuro in futuros]
+        
+        self.assertEqual(mock_session_get.call_count, 2)
+        self.assertTrue(all(resultado == resultados[0] for resultado in resultados))
+        self.assertEqual(self.facade.coalescedor.estadisticas(), {"lanzadas": 2, "coalescidas": 38, "en_curso": 0})
+
+    @patch('app.facade.cache.time.monotonic')
+    def test_sirve_obsoleto_mientras_refresca(self, mock_monotonic):
+        mock_monotonic.return_value = 1000.0
+        with patch.object(self.facade.session, 'get') as mock_session_get:
+            mock_session_get.side_effect = self._respuestas_por_url(self.mock_weather_data, self.mock_air_quality_data)
+            self.facade.recoger_ultimo_dato(40.4, -3.7)
+        
+        # Caducados los datos actuales, se devuelven sin esperar mientras se piden de nuevo
+        mock_monotonic.return_value = 1000.0 + 16 * 60
+        liberar = threading.Event()
+        nuevo_tiempo = {"current_weather": {"temperature": 25.0}}
+        
+        def responder_al_liberar(url, *args, **kwargs):
+            liberar.wait(5)
+            return self._respuestas_por_url(nuevo_tiempo, self.mock_air_quality_data)(url)
+        
+        with patch.object(self.facade.session, 'get', side_effect=responder_al_liberar) as mock_session_get:
+            resultado = self.facade.recoger_ultimo_dato(40.4, -3.7)
+            self.assertEqual(resultado["weather"], self.mock_weather_data)
+            self.assertEqual(resultado["frescura"]["weather"]["edad"], 960)
+            self.assertTrue(resultado["frescura"]["weather"]["obsoleto"])
+            self.assertFalse(resultado["frescura"]["air_quality"]["obsoleto"])
+            
+            liberar.set()
+            self.facade.executor.shutdown(wait=True)
+        
+        self.assertEqual(mock_session_get.call_count, 1)
+        self.assertEqual(self.facade.recoger_ultimo_dato(40.4, -3.7)["weather"], nuevo_tiempo)
+    
+    def test_plazo_agotado(self):
+        self.facade.plazo = 0.1
+        liberar = threading.Event()
+        self.addCleanup(liberar.set)
+        with patch.object(self.facade.session, 'get', side_effect=lambda *args, **kwargs: liberar.wait(5)):
+            inicio = time.monotonic()
+            with self.assertRaises(PlazoAgotado):
+                self.facade.recoger_ultimo_dato(40.4, -3.7)
+        # La espera se corta en el plazo aunque la API siga sin responder
+        self.assertLess(time.monotonic() - inicio, 1)
+    
+    def test_plazo_agotado_en_lote(self):
+        self.facade.plazo = 0.1
+        liberar = threading.Event()
+        self.addCleanup(liberar.set)
+        
+        def responder_al_liberar(url, params=None, **kwargs):
+            liberar.wait(5)
+            mock_response = Mock(status_code=200, headers={})
+            mock_response.json.return_value = self.mock_weather_data if "current_weather" in params \
+                else self.mock_air_quality_data
+            mock_response.content = json.dumps(mock_response.json.return_value).encode()
+            return mock_response
+        
+        with patch.object(self.facade.session, 'get', side_effect=responder_al_liberar):
+            inicio = time.monotonic()
+            with self.assertRaises(PlazoAgotado):
+                self.facade.recoger_ultimos_datos_lote([(40.4, -3.7)])
+            self.assertLess(time.monotonic() - inicio, 1)
+            
+            # La respuesta que llega tarde se guarda en la caché para la siguiente consulta
+            liberar.set()
+            self.facade.executor_lote.shutdown(wait=True)
+        self.assertEqual(self.facade.recoger_ultimos_datos_lote([(40.4, -3.7)])[0]["weather"], self.mock_weather_data)
+    
+    def test_lotes_no_ocupan_los_hilos_interactivos(self):
+        self.facade = AireYClimaFacade(pool_size=2, plazo=1.0)
+        liberar = threading.Event()
+        self.addCleanup(liberar.set)
+        
+        def responder(url, params=None, **kwargs):
+            # Las peticiones de fondo se quedan colgadas; las interactivas responden
+            if params.get("start_date"):
+                liberar.wait(5)
+            return self._respuestas_por_url(self.mock_weather_data, self.mock_air_quality_data)(url)
+        
+        def de_fondo(i):
+            with con_prioridad(FONDO):
+                try:
+                    self.facade.obtener_datos_historicos(40.0 + i, -3.7)
+                except PlazoAgotado:
+                    pass
         
-        # Verificar los resultados
-        self.assertEqual(resultado['weather_historical'], self.mock_historical_weather_data)
-        self.assertEqual(resultado['air_quality_historical'], self.mock_historical_air_quality_data)
+        with patch.object(self.facade.session, 'get', side_effect=responder) as mock_session_get:
+            hilos = [threading.Thread(target=de_fondo, args=(i,)) for i in range(4)]
+            for hilo in hilos:
+                hilo.start()
+            limite = time.monotonic() + 5
+            while mock_session_get.call_count < 2 and time.monotonic() < limite:
+                time.sleep(0.01)
+            # Con todos los hilos de lotes ocupados, la consulta interactiva no espera a ninguno
+            self.assertEqual(self.facade.recoger_ultimo_dato(45.0, -3.7)["weather"], self.mock_weather_data)
+            liberar.set()
+            for hilo in hilos:
+                hilo.join()
+            self.facade.executor_lote.shutdown(wait=True)
+    
+    def test_circuito_abierto_no_llama_a_la_api(self):
+        with patch.object(self.facade.session, 'get', side_effect=requests.ConnectionError("caída")) as mock_session_get:
+            for i in range(5):
+                with self.assertRaises(requests.ConnectionError):
+                    self.facade.recoger_ultimo_dato(40.0 + i, -3.7)
+            
+            # Tras cinco fallos seguidos de cada API se rechaza sin llegar a la red
+            with self.assertRaises(CircuitoAbierto):
+                self.facade.recoger_ultimo_dato(45.0, -3.7)
+        self.assertEqual(mock_session_get.call_count, 10)
+        self.assertEqual(self.facade.disyuntores["clima"].estado, "abierto")
+
+    @patch('app.facade.cache.time.monotonic')
+    def test_lote_con_circuito_abierto_sirve_obsoletos(self, mock_monotonic):
+        mock_monotonic.return_value = 1000.0
+        with patch.object(self.facade.session, 'get') as mock_session_get:
+            mock_session_get.side_effect = self._respuestas_por_url(self.mock_weather_data, self.mock_air_quality_data)
+            self.facade.recoger_ultimos_datos_lote([(40.4, -3.7)])
+        
+        # Caducados los datos y con los dos disyuntores abiertos
+        mock_monotonic.return_value = 1000.0 + 2 * 60 * 60
+        for disyuntor in self.facade.disyuntores.values():
+            for _ in range(disyuntor.umbral_fallos):
+                disyuntor.fallo()
+        with patch.object(self.facade.session, 'get') as mock_session_get:
+            resultados = self.facade.recoger_ultimos_datos_lote([(40.4, -3.7), (43.26, -2.93)])
+            self.facade.executor_lote.shutdown(wait=True)
+        mock_session_get.assert_not_called()
+        # Las copias caducadas se sirven como en recoger_ultimo_dato; sin copia, sin datos
+        self.assertEqual(resultados[0]["weather"], self.mock_weather_data)
+        self.assertEqual(len(resultados[0]["air_quality"]["hourly"]["pm10"]), 1)
+        self.assertEqual((resultados[1]["weather"], resultados[1]["air_quality"]), ({}, {}))
+
+    @patch('app.facade.cache.time.monotonic')
+    def test_lote_sirve_obsoleto_mientras_refresca(self, mock_monotonic):
+        mock_monotonic.return_value = 1000.0
+        with patch.object(self.facade.session, 'get') as mock_session_get:
+            mock_session_get.side_effect = self._respuestas_por_url(self.mock_weather_data, self.mock_air_quality_data)
+            self.facade.recoger_ultimos_datos_lote([(40.4, -3.7)])
+        
+        mock_monotonic.return_value = 1000.0 + 16 * 60
+        liberar = threading.Event()
+        nuevo_tiempo = {"current_weather": {"temperature": 25.0}}
+        
+        def responder_al_liberar(url, *args, **kwargs):
+            liberar.wait(5)
+            return self._respuestas_por_url(nuevo_tiempo, self.mock_air_quality_data)(url)
+        
+        with patch.object(self.facade.session, 'get', side_effect=responder_al_liberar) as mock_session_get:
+            self.assertEqual(self.facade.recoger_ultimos_datos_lote([(40.4, -3.7)])[0]["weather"], self.mock_weather_data)
+            liberar.set()
+            self.facade.executor_lote.shutdown(wait=True)
+        self.assertEqual(mock_session_get.call_count, 1)
+        self.assertEqual(self.facade.recoger_ultimos_datos_lote([(40.4, -3.7)])[0]["weather"], nuevo_tiempo)
+
+    def test_recoger_ultimos_datos_lote(self):
+        def responder(url, params=None, **kwargs):
+            # Open-Meteo devuelve una lista con una respuesta por coordenada
+            latitudes = params["latitude"].split(",")
+            mock_response = Mock()
+            mock_response.status_code = 200
+            if url == self.facade.weather_api_url:
+                datos = [{"current_weather": {"temperature": float(lat)}} for lat in latitudes]
+            else:
+                datos = [{"hourly": {"pm10": [float(lat)], "pm2_5": [1.0]}} for lat in latitudes]
+            mock_response.json.return_value = datos if len(datos) > 1 else datos[0]
+            mock_response.content = json.dumps(mock_response.json.return_value).encode()
+            return mock_response
+        
+        coordenadas = [(40.4, -3.7), (43.26, -2.93), (40.41, -3.69), (42.85, -2.67)]
+        with patch.object(self.facade.session, 'get', side_effect=responder) as mock_session_get:
+            resultados = self.facade.recoger_ultimos_datos_lote(coordenadas, tam_lote=2)
+        
+        # 3 celdas distintas en grupos de 2: dos peticiones por API
+        self.assertEqual(mock_session_get.call_count, 4)
+        self.assertEqual(len(resultados), 4)
+        # Se piden los datos del centro de cada celda, que se indica en cada resultado
+        self.assertEqual(resultados[1]["weather"]["current_weather"]["temperature"], 43.3)
+        self.assertEqual(resultados[1]["celda"], {"latitude": 43.3, "longitude": -2.9})
+        self.assertEqual(resultados[3]["air_quality"]["hourly"]["pm10"], [42.8])
+        # Las coordenadas de la misma celda reciben los mismos datos
+        self.assertEqual(resultados[2], resultados[0])
+        
+        # Las ubicaciones quedan en caché para las consultas individuales
+        with patch.object(self.facade.session, 'get') as mock_session_get:
+            resultado = self.facade.recoger_ultimo_dato(43.26, -2.93)
+        mock_session_get.assert_not_called()
+        self.assertEqual(resultado["weather"], resultados[1]["weather"])
+        self.assertEqual(resultado["air_quality"], resultados[1]["air_quality"])
+
+    def test_obtener_datos_historicos(self):
+        with patch.object(self.facade.session, 'get') as mock_session_get:
+            # Configurar el comportamiento del mock
+            mock_session_get.side_effect = self._respuestas_por_url(
+                self.mock_historical_weather_data, self.mock_historical_air_quality_data)
+            
+            # Ejecutar la función a probar
+            resultado = self.facade.obtener_datos_historicos(40.4, -3.7, 7)
+        
+        # Verificar los resultados: las series se guardan en columnas y vuelven a JSON sin cambios
+        self.assertIsInstance(resultado['weather_historical']['daily'], Serie)
+        self.assertEqual(a_json(resultado['weather_historical']), self.mock_historical_weather_data)
+        self.assertEqual(a_json(resultado['air_quality_historical']), self.mock_historical_air_quality_data)
+        
+        # Verificar que se llamó a la sesión con los parámetros correctos
+        self.assertEqual(mock_session_get.call_count, 2)
+
+    def test_sesion_compartida_con_pool(self):
+        facade = AireYClimaFacade(pool_size=4, reintentos=2, backoff=0.1)
+        adapter = facade.session.get_adapter(facade.weather_api_url)
+        
+        # La misma sesión y el mismo adaptador sirven a ambas APIs
+        self.assertIs(adapter, facade.session.get_adapter(facade.air_quality_api_url))
+        # Conexiones para los hilos del ejecutor interactivo y del de lotes
+        self.assertEqual(adapter._pool_maxsize, 8)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertEqual(adapter.max_retries.backoff_factor, 0.1)
+
+    def test_iterar_datos_historicos(self):
+        def responder(url, params=None, **kwargs):
+            # Genera datos deterministas para el rango de fechas pedido
+            inicio = date.fromisoformat(params["start_date"])
+            dias = (date.fromisoformat(params["end_date"]) - inicio).days + 1
+            ordinales = [inicio.toordinal() + d for d in range(dias)]
+            mock_response = Mock()
+            mock_response.status_code = 200
+            if url == self.facade.weather_api_url:
+                mock_response.json.return_value = {"daily": {
+                    "time": [date.fromordinal(o).isoformat() for o in ordinales],
+                    "temperature_2m_max": [20.0 + o % 7 for o in ordinales],
+                    "temperature_2m_min": [5.0 + o % 5 for o in ordinales]
+                }}
+            else:
+                mock_response.json.return_value = {"hourly": {
+                    "time": [f"{date.fromordinal(o).isoformat()}T{h:02d}:00" for o in ordinales for h in range(24)],
+                    "pm10": [10.0 + (o % 9) * 6 + h for o in ordinales for h in range(24)],
+                    "pm2_5": [5.0 + o % 4 for o in ordinales for h in range(24)]
+                }}
+            mock_response.content = json.dumps(mock_response.json.return_value).encode()
+            return mock_response
+        
+        with patch.object(self.facade.session, 'get', side_effect=responder) as mock_session_get:
+            registros = list(self.facade.iterar_datos_historicos(40.4, -3.7, dias=20, dias_por_bloque=7))
+            datos_completos = self.facade.obtener_datos_historicos(40.4, -3.7, dias=20)
+        
+        dias = registros[:-1]
+        self.assertEqual(len(dias), 21)
+        self.assertTrue(all(r["tipo"] == "dia" and len(r["pm10"]) == 24 for r in dias))
+        self.assertEqual([r["fecha"] for r in dias], datos_completos["weather_historical"]["daily"].fechas())
+        # 21 días en bloques de 7: tres bloques con dos peticiones cada uno (más las dos de la consulta completa)
+        self.assertEqual(mock_session_get.call_count, 8)
+        
+        # El informe incremental coincide con el calculado sobre la serie completa
+        self.assertEqual(registros[-1]["tipo"], "informe")
+        self.assertEqual(registros[-1]["informe"], self.facade.analizar_tendencias(datos_completos))
+
+    def test_analizar_tendencias_usa_la_celda_de_los_datos(self):
+        weather = {"daily": {"time": [date.today().isoformat()], "temperature_2m_max": [20.0], "temperature_2m_min": [10.0]}}
+        air_quality = {"hourly": {"time": [f"{date.today().isoformat()}T00:00"], "pm10": [1.0], "pm2_5": [0.5]}}
+        with patch.object(self.facade.session, 'get', side_effect=self._respuestas_por_url(weather, air_quality)):
+            datos_historicos = self.facade.obtener_datos_historicos(40.4, -3.7, dias=0)
+        reutilizadas = self.facade.celdas.estadisticas()["reutilizadas"]
+        
+        with patch.object(self.facade, 'resolver_celda') as mock_resolver_celda:
+            self.facade.analizar_tendencias(datos_historicos)
+        mock_resolver_celda.assert_not_called()
+        self.assertEqual(self.facade.celdas.estadisticas()["reutilizadas"], reutilizadas)
+
+    def test_iterar_datos_historicos_con_huecos(self):
+        # Sin el 2.º día de temperaturas, sin el 2.º día de calidad del aire y con el 3.º incompleto
+        fechas = [(date.today() - timedelta(days=d)).isoformat() for d in (2, 1, 0)]
+        weather = {"daily": {"time": [fechas[0], fechas[2]], "temperature_2m_max": [20.0, 22.0],
+                             "temperature_2m_min": [10.0, 12.0]}}
+        horas = [f"{fechas[0]}T{h:02d}:00" for h in range(24)] + [f"{fechas[2]}T{h:02d}:00" for h in range(12)]
+        air_quality = {"hourly": {"time": horas, "pm10": [1.0] * 24 + [3.0] * 12, "pm2_5": [0.5] * 36}}
+        with patch.object(self.facade.session, 'get', side_effect=self._respuestas_por_url(weather, air_quality)):
+            dias = list(self.facade.iterar_datos_historicos(40.4, -3.7, dias=2))[:-1]
         
-        # Verificar que se llamó a requests.get con los parámetros correctos
-        calls = mock_requests_get.call_args_list
-        self.assertEqual(len(calls), 2)
+        self.assertEqual([d["fecha"] for d in dias], fechas)
+        self.assertEqual([d["temperature_2m_max"] for d in dias], [20.0, None, 22.0])
+        self.assertEqual([len(d["pm10"]) for d in dias], [24, 0, 12])
+        self.assertEqual(dias[2]["pm10"][0], 3.0)
 
     def test_analizar_tendencias(self):
         # Datos para la prueba
@@ -0,0 +1,109 @@
+import unittest
+import asyncio
+import time
+from unittest.mock import patch
+import httpx
+from app.facade.aireYClimaFacade import HORAS_ACTUAL
+from app.facade.aireYClimaFacadeAsync import AireYClimaFacadeAsync
+from app.facade.resiliencia import PlazoAgotado
+
+class TestAireYClimaFacadeAsync(unittest.IsolatedAsyncioTestCase):
+    
+    def setUp(self):
+        self.mock_weather_data = {"current_weather": {"temperature": 23.5}}
+        self.mock_air_quality_data = {"hourly": {"pm10": [15.2], "pm2_5": [8.4]}}
+        self.peticiones = []
+        self.estados = []
+    
+    def _fachada(self, retraso=0.0):
+        async def responder(request):
+            self.peticiones.append(request)
+            await asyncio.sleep(retraso)
+            estado = self.estados.pop(0) if self.estados else 200
+            if request.url.host == "api.open-meteo.com":
+                return httpx.Response(estado, json=self.mock_weather_data)
+            return httpx.Response(estado, json=self.mock_air_quality_data)
+        return AireYClimaFacadeAsync(transport=httpx.MockTransport(responder), backoff=0)
+    
+    async def test_recoger_ultimo_dato(self):
+        fachada = self._fachada()
+        resultado = await fachada.recoger_ultimo_dato(40.4, -3.7)
+        await fachada.cerrar()
+        
+        self.assertEqual(resultado["weather"], self.mock_weather_data)
+        self.assertEqual(resultado["air_quality"], self.mock_air_quality_data)
+        self.assertEqual(resultado["frescura"]["weather"]["edad"], 0)
+        self.assertFalse(resultado["frescura"]["weather"]["obsoleto"])
+        self.assertEqual(len(self.peticiones), 2)
+        params = {p.url.host: dict(p.url.params) for p in self.peticiones}
+        self.assertEqual(params["api.open-meteo.com"]["latitude"], "40.4")
+        self.assertEqual(params["air-quality-api.open-meteo.com"]["hourly"], "pm10,pm2_5")
+    
+    async def test_peticiones_concurrentes(self):
+        fachada = self._fachada(retraso=0.05)
+        coordenadas = [(40.0 + i, -3.7) for i in range(50)]
+        inicio = asyncio.get_running_loop().time()
+        resultados = await asyncio.gather(*(fachada.recoger_ultimo_dato(lat, lon) for lat, lon in coordenadas))
+        duracion = asyncio.get_running_loop().time() - inicio
+        await fachada.cerrar()
+        
+        # 100 peticiones de 50 ms en paralelo tardan mucho menos que en serie
+        self.assertEqual(len(resultados), 50)
+        self.assertEqual(len(self.peticiones), 100)
+        self.assertLess(duracion, 1.0)
+    
+    async def test_peticiones_identicas_coalescidas(self):
+        fachada = self._fachada(retraso=0.05)
+        resultados = await asyncio.gather(*(fachada.recoger_ultimo_dato(40.4, -3.7) for _ in range(50)))
+        await fachada.cerrar()
+        
+        self.assertEqual(len(self.peticiones), 2)
+        self.assertTrue(all(resultado == resultados[0] for resultado in resultados))
+        self.assertEqual(fachada.coalescedor.estadisticas(), {"lanzadas": 2, "coalescidas": 98, "en_curso": 0})
+    
+    async def test_plazo_y_obsoletos(self):
+        fachada = self._fachada(retraso=1.0)
+        fachada.plazo = 0.05
+        with self.assertRaises(PlazoAgotado):
+            await fachada.recoger_ultimo_dato(40.4, -3.7)
+        
+        # Con una copia caducada en caché se responde sin esperar a la API
+        clave = fachada.cache.clave("actual", 43.3, -2.9)
+        fachada.cache.guardar(clave, {"current_weather": {"temperature": 10.0}})
+        fachada.cache.guardar(fachada.cache.clave("horario", 43.3, -2.9, HORAS_ACTUAL), self.mock_air_quality_data)
+        with patch('app.facade.cache.time.monotonic', return_value=time.monotonic() + 16 * 60):
+            resultado = await fachada.recoger_ultimo_dato(43.3, -2.9)
+        self.assertEqual(resultado["weather"], {"current_weather": {"temperature": 10.0}})
+        self.assertTrue(resultado["frescura"]["weather"]["obsoleto"])
+        await fachada.cerrar()
+    
+    async def test_cache_compartida(self):
+        fachada = self._fachada()
+        await fachada.recoger_ultimo_dato(40.4, -3.7)
+        await fachada.recoger_ultimo_dato(40.41, -3.69)
+        await fachada.cerrar()
+        self.assertEqual(len(self.peticiones), 2)
+    
+    async def test_reintentos_y_errores(self):
+        fachada = self._fachada()
+        # Un 503 se reintenta; un 400 devuelve un diccionario vacío
+        self.estados = [503, 400]
+        resultado = await fachada.obtener_datos_historicos(40.4, -3.7, 7)
+        await fachada.cerrar()
+        
+        self.assertEqual(len(self.peticiones), 3)
+        self.assertEqual(sorted([len(resultado["weather_historical"]), len(resultado["air_quality_historical"])]), [0, 1])
+    
+    async def test_informe_historico(self):
+        self.mock_weather_data = {"daily": {"temperature_2m_max": [25.3, 24.8, 26.2], "temperature_2m_min": [15.1, 14.9, 16.2]}}
+        self.mock_air_quality_data = {"hourly": {"pm10": [20.1] * 72, "pm2_5": [12.3] * 72}}
+        fachada = self._fachada()
+        datos = await fachada.obtener_datos_historicos(40.4, -3.7, 2)
+        await fachada.cerrar()
+        
+        informe = fachada.analizar_tendencias(datos)
+        self.assertEqual(informe["temperatura"]["max_registrada"], 26.2)
+        self.assertEqual(informe["calidad_aire"]["pm10_promedio"], 20.1)
+
+if __name__ == '__main__':
+    unittest.main()
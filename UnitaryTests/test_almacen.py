@@ -0,0 +1,123 @@
+import unittest
+import json
+from unittest.mock import patch, Mock
+from datetime import date, timedelta
+from app.facade.aireYClimaFacade import AireYClimaFacade
+from app.facade.almacen import AlmacenSeries
+from app.facade.series import a_json
+
+def respuesta_open_meteo(url, params, weather_api_url):
+    """Genera una respuesta determinista de Open-Meteo para el rango de fechas pedido"""
+    inicio = date.fromisoformat(params["start_date"])
+    fechas = [inicio + timedelta(days=d) for d in range((date.fromisoformat(params["end_date"]) - inicio).days + 1)]
+    if url == weather_api_url:
+        return {"timezone": "Europe/Madrid", "daily": {
+            "time": [f.isoformat() for f in fechas],
+            "temperature_2m_max": [float(f.day) for f in fechas],
+            "temperature_2m_min": [f.day - 10.0 for f in fechas]
+        }}
+    return {"timezone": "Europe/Madrid", "hourly": {
+        "time": [f"{f.isoformat()}T{h:02d}:00" for f in fechas for h in range(24)],
+        "pm10": [f.day + h / 100 for f in fechas for h in range(24)],
+        "pm2_5": [None if h == 3 else f.day / 2 for f in fechas for h in range(24)]
+    }}
+
+class TestAlmacenSeries(unittest.TestCase):
+    
+    def setUp(self):
+        self.almacen = AlmacenSeries()
+        self.celda = (40.4, -3.7)
+        self.inicio = date(2024, 1, 1)
+        self.fin = date(2024, 1, 10)
+        params = {"start_date": "2024-01-01", "end_date": "2024-01-10"}
+        self.weather = respuesta_open_meteo("clima", params, "clima")
+        self.aire = respuesta_open_meteo("aire", params, "clima")
+    
+    def test_guardar_y_leer(self):
+        self.almacen.guardar(self.celda, self.weather, self.aire, self.inicio, self.fin)
+        weather, aire = self.almacen.leer(self.celda, self.inicio, self.fin)
+        
+        self.assertEqual(a_json(weather)["daily"], self.weather["daily"])
+        self.assertEqual(a_json(aire)["hourly"], self.aire["hourly"])
+        # Otra celda no comparte datos
+        self.assertEqual(len(self.almacen.leer((43.3, -2.9), self.inicio, self.fin)[0]["daily"]), 0)
+    
+    def test_guardar_solo_el_rango_indicado(self):
+        self.almacen.guardar(self.celda, self.weather, self.aire, date(2024, 1, 3), date(2024, 1, 4))
+        weather, aire = self.almacen.leer(self.celda, self.inicio, self.fin)
+        self.assertEqual(weather["daily"].fechas(), ["2024-01-03", "2024-01-04"])
+        self.assertEqual(len(aire["hourly"]["pm10"]), 48)
+    
+    def test_rangos_faltantes(self):
+        self.assertEqual(self.almacen.rangos_faltantes(self.celda, self.inicio, self.fin), [(self.inicio, self.fin)])
+        self.almacen.guardar(self.celda, self.weather, self.aire, date(2024, 1, 3), date(2024, 1, 5))
+        # Un día con clima pero sin calidad del aire sigue contando como faltante
+        self.almacen.guardar(self.celda, self.weather, {}, date(2024, 1, 8), date(2024, 1, 8))
+        
+        self.assertEqual(self.almacen.rangos_faltantes(self.celda, self.inicio, self.fin), [
+            (date(2024, 1, 1), date(2024, 1, 2)),
+            (date(2024, 1, 6), date(2024, 1, 10))
+        ])
+        self.assertEqual(self.almacen.rangos_faltantes(self.celda, self.fin, self.inicio), [])
+    
+    def test_limpiar(self):
+        self.almacen.guardar(self.celda, self.weather, self.aire, self.inicio, self.fin)
+        self.almacen.limpiar()
+        self.assertEqual(len(self.almacen.rangos_faltantes(self.celda, self.inicio, self.fin)), 1)
+
+class TestFachadaConAlmacen(unittest.TestCase):
+    
+    def setUp(self):
+        self.facade = AireYClimaFacade(almacen=AlmacenSeries(margen_dias=2))
+        self.peticiones = []
+        
+        def responder(url, params=None, **kwargs):
+            self.peticiones.append((params["start_date"], params["end_date"]))
+            mock_response = Mock()
+            mock_response.status_code = 200
+            mock_response.json.return_value = respuesta_open_meteo(url, params, self.facade.weather_api_url)
+            mock_response.content = json.dumps(mock_response.json.return_value).encode()
+            return mock_response
+        
+        patcher = patch.object(self.facade.session, 'get', side_effect=responder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def _rangos_pedidos(self):
+        rangos = sorted(set(self.peticiones))
+        self.peticiones.clear()
+        return rangos
+    
+    def test_solo_pide_los_dias_que_faltan(self):
+        hoy = date.today()
+        primera = self.facade.obtener_datos_historicos(40.4, -3.7, 30)
+        self.assertEqual(self._rangos_pedidos(), [
+            ((hoy - timedelta(days=30)).isoformat(), (hoy - timedelta(days=2)).isoformat()),
+            ((hoy - timedelta(days=1)).isoformat(), hoy.isoformat())
+        ])
+        self.assertEqual(len(primera["weather_historical"]["daily"]), 31)
+        self.assertEqual(len(primera["air_quality_historical"]["hourly"]["pm10"]), 31 * 24)
+        self.assertEqual(primera["weather_historical"]["timezone"], "Europe/Madrid")
+        
+        # Con la caché de respuestas vacía solo se vuelven a pedir los días recientes
+        self.facade.cache.limpiar()
+        segunda = self.facade.obtener_datos_historicos(40.41, -3.69, 30)
+        self.assertEqual(self._rangos_pedidos(), [((hoy - timedelta(days=1)).isoformat(), hoy.isoformat())])
+        self.assertEqual(a_json(segunda["weather_historical"]), a_json(primera["weather_historical"]))
+        self.assertEqual(a_json(segunda["air_quality_historical"]), a_json(primera["air_quality_historical"]))
+        
+        # Ampliar la ventana solo descarga los días anteriores que faltan
+        self.facade.obtener_datos_historicos(40.4, -3.7, 90)
+        self.assertEqual(self._rangos_pedidos()[0], (
+            (hoy - timedelta(days=90)).isoformat(), (hoy - timedelta(days=31)).isoformat()))
+    
+    def test_informe_igual_sin_almacen(self):
+        sin_almacen = AireYClimaFacade()
+        with patch.object(sin_almacen.session, 'get', side_effect=self.facade.session.get.side_effect):
+            esperado = sin_almacen.analizar_tendencias(sin_almacen.obtener_datos_historicos(40.4, -3.7, 10))
+        self.facade.obtener_datos_historicos(40.4, -3.7, 10)
+        informe = self.facade.analizar_tendencias(self.facade.obtener_datos_historicos(40.4, -3.7, 10))
+        self.assertEqual(informe, esperado)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+import random
+import statistics
+from app.facade.aireYClimaFacade import AireYClimaFacade
+from app.facade.analisis import AgregadorInforme, SumaExacta, analizar_tendencias_numpy, promedios_diarios
+
+def generar_datos(dias, semilla=0):
+    """Genera datos históricos sintéticos con el formato de Open-Meteo"""
+    aleatorio = random.Random(semilla)
+    return {
+        "weather_historical": {
+            "daily": {
+                "time": [f"dia-{d}" for d in range(dias)],
+                "temperature_2m_max": [round(aleatorio.uniform(10, 35), 1) for _ in range(dias)],
+                "temperature_2m_min": [round(aleatorio.uniform(-5, 15), 1) for _ in range(dias)]
+            }
+        },
+        "air_quality_historical": {
+            "hourly": {
+                "pm10": [round(aleatorio.uniform(5, 90), 1) for _ in range(dias * 24)],
+                "pm2_5": [round(aleatorio.uniform(2, 45), 1) for _ in range(dias * 24)]
+            }
+        }
+    }
+
+class TestAnalisisNumpy(unittest.TestCase):
+    
+    def setUp(self):
+        self.motor_python = AireYClimaFacade(motor_analisis="python")
+        self.motor_numpy = AireYClimaFacade(motor_analisis="numpy")
+    
+    def test_mismo_informe_que_motor_python(self):
+        for dias in (1, 4, 30, 365):
+            for semilla in range(3):
+                datos = generar_datos(dias, semilla)
+                with self.subTest(dias=dias, semilla=semilla):
+                    self.assertEqual(self.motor_numpy.analizar_tendencias(datos),
+                                     self.motor_python.analizar_tendencias(datos))
+    
+    def test_dia_incompleto(self):
+        datos = generar_datos(5)
+        hourly = datos["air_quality_historical"]["hourly"]
+        hourly["pm10"] = hourly["pm10"][:100]
+        hourly["pm2_5"] = hourly["pm2_5"][:100]
+        self.assertEqual(self.motor_numpy.analizar_tendencias(datos), self.motor_python.analizar_tendencias(datos))
+    
+    def test_huecos_en_las_series(self):
+        datos = {
+            "weather_historical": {
+                "daily": {
+                    "temperature_2m_max": [None, 20.0, 22.0, 25.0, None],
+                    "temperature_2m_min": [10.0, None, 12.0, 11.0, 9.0]
+                }
+            },
+            "air_quality_historical": {
+                "hourly": {
+                    "pm10": [None] * 24 + [40.0] * 24 + [60.0] * 24 + [None] * 24 + [70.0] * 24,
+                    "pm2_5": [10.0] * 24 + [None] * 24 + [30.0] * 24 + [None] * 24 + [12.0] * 24
+                }
+            }
+        }
+        
+        # El motor original no soporta huecos; el vectorizado los ignora
+        self.assertIn("errores", self.motor_python.analizar_tendencias(datos))
+        informe = analizar_tendencias_numpy(datos)
+        self.assertNotIn("errores", informe)
+        self.assertEqual(informe["temperatura"]["max_promedio"], 22.3)
+        self.assertEqual(informe["temperatura"]["min_registrada"], 9.0)
+        self.assertEqual(informe["tendencias"]["temperatura"], "al alza")
+        self.assertEqual(informe["calidad_aire"]["pm10_promedio"], round((40 + 60 + 70) / 3, 2))
+        self.assertEqual(informe["calidad_aire"]["pm10_max"], 70.0)
+        self.assertEqual(informe["calidad_aire"]["dias_calidad_mala"], 2)
+        self.assertEqual(informe["tendencias"]["calidad_aire"], "empeorando")
+    
+    def test_series_vacias(self):
+        informe = analizar_tendencias_numpy({"weather_historical": {}, "air_quality_historical": {"hourly": {"pm10": []}}})
+        self.assertEqual(informe, {"temperatura": {}, "calidad_aire": {}, "tendencias": {}, "recomendaciones": []})
+    
+    def test_promedios_diarios(self):
+        self.assertEqual(list(promedios_diarios([1.0] * 24 + [3.0] * 12)), [1.0, 3.0])
+
+class TestAgregadorInforme(unittest.TestCase):
+    
+    def setUp(self):
+        self.motor_python = AireYClimaFacade(motor_analisis="python")
+    
+    def _agregar(self, datos):
+        agregador = AgregadorInforme()
+        daily = datos["weather_historical"]["daily"]
+        hourly = datos["air_quality_historical"]["hourly"]
+        for i, (temp_max, temp_min) in enumerate(zip(daily["temperature_2m_max"], daily["temperature_2m_min"])):
+            agregador.agregar_dia(temp_max, temp_min, hourly["pm10"][i * 24:(i + 1) * 24], hourly["pm2_5"][i * 24:(i + 1) * 24])
+        return agregador.informe()
+    
+    def test_suma_exacta(self):
+        valores = [random.Random(1).uniform(0, 100) for _ in range(1000)] + [1e16, 1.0, -1e16]
+        suma = SumaExacta()
+        for valor in valores:
+            suma.agregar(valor)
+        self.assertEqual(suma.media(), statistics.mean(valores))
+    
+    def test_mismo_informe_que_motor_python(self):
+        for dias in (1, 4, 30, 365):
+            datos = generar_datos(dias, semilla=dias)
+            informe_python = self.motor_python._analizar_tendencias_python(datos)
+            with self.subTest(dias=dias):
+                self.assertEqual(self._agregar(datos), informe_python)
+    
+    def test_sin_datos(self):
+        self.assertEqual(AgregadorInforme().informe(),
+                         {"temperatura": {}, "calidad_aire": {}, "tendencias": {}, "recomendaciones": []})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,13 @@
 import unittest
 from unittest.mock import patch, Mock
-from flask import Flask
+from flask import Flask, jsonify
 import json
+import gzip
 from app.api.routes import api
+from app.cache_http import comprimir_respuesta, respuesta_condicional
+from app.facade.series import compactar
+from app.facade.resiliencia import CircuitoAbierto
+from app.facade.limitador import CuotaAgotada
 
 class TestApiRoutes(unittest.TestCase):
     
@@ -78,12 +83,57 @@ class TestApiRoutes(unittest.TestCase):
         self.assertEqual(data, self.mock_datos)
         
         # Verificar que se llamó al método de la fachada con los parámetros correctos
-        mock_recoger_ultimo_dato.assert_called_once_with(40.4, -3.7)
+        mock_recoger_ultimo_dato.assert_called_once_with(40.4, -3.7, 1)
         
         # Probar con parámetros faltantes
         response = self.client.get('/api/aire-clima/actual')
         self.assertEqual(response.status_code, 400)
         
+        # Ventana de horas explícita y fuera de rango
+        self.client.get('/api/aire-clima/actual?latitude=40.4&longitude=-3.7&horas=6')
+        mock_recoger_ultimo_dato.assert_called_with(40.4, -3.7, 6)
+        response = self.client.get('/api/aire-clima/actual?latitude=40.4&longitude=-3.7&horas=0')
+        self.assertEqual(response.status_code, 400)
+        
+        # Coordenadas no finitas o fuera de rango
+        for query in ("latitude=nan&longitude=-3.7", "latitude=40.4&longitude=inf", "latitude=91&longitude=0"):
+            self.assertEqual(self.client.get('/api/aire-clima/actual?' + query).status_code, 400, query)
+        self.assertEqual(mock_recoger_ultimo_dato.call_count, 2)
+        
+    @patch('app.api.routes.fachada.recoger_ultimo_dato')
+    def test_respuesta_condicional(self, mock_recoger_ultimo_dato):
+        mock_recoger_ultimo_dato.return_value = dict(self.mock_datos, frescura={
+            "weather": {"edad": 5, "obsoleto": False, "actualizado": 1684584000.0},
+            "air_quality": {"edad": 5, "obsoleto": False, "actualizado": 1684584000.0}
+        })
+        
+        response = self.client.get('/api/aire-clima/actual?latitude=40.4&longitude=-3.7')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["ETag"].startswith('W/"'))
+        self.assertIn("max-age=60", response.headers["Cache-Control"])
+        self.assertIsNotNone(response.last_modified)
+        
+        # Con la misma versión de los datos el cliente recibe un 304 sin cuerpo
+        response = self.client.get('/api/aire-clima/actual?latitude=40.4&longitude=-3.7',
+                                   headers={"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+    
+    @patch('app.api.routes.fachada.recoger_ultimo_dato')
+    def test_servicio_externo_no_disponible(self, mock_recoger_ultimo_dato):
+        # Circuito abierto y sin copia en caché: 503 en lugar de un error interno
+        mock_recoger_ultimo_dato.side_effect = CircuitoAbierto("API de clima no disponible temporalmente")
+        response = self.client.get('/api/aire-clima/actual?latitude=40.4&longitude=-3.7')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("API de clima", json.loads(response.data)["error"])
+        self.assertNotIn("Retry-After", response.headers)
+        
+        # Sin cuota diaria: el cliente sabe cuándo volver a intentarlo
+        mock_recoger_ultimo_dato.side_effect = CuotaAgotada("Cuota diaria agotada", reintentar_en=3600.4)
+        response = self.client.get('/api/aire-clima/actual?latitude=40.4&longitude=-3.7')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "3600")
+        
     @patch('app.api.routes.fachada.obtener_datos_historicos')
     @patch('app.api.routes.fachada.analizar_tendencias')
     def test_obtener_datos_historicos(self, mock_analizar_tendencias, mock_obtener_datos_historicos):
@@ -108,5 +158,127 @@ class TestApiRoutes(unittest.TestCase):
         response = self.client.get('/api/aire-clima/historico')
         self.assertEqual(response.status_code, 400)
 
+    @patch('app.api.routes.geocodificador.resolver_lote')
+    def test_geocodificar_lote(self, mock_resolver_lote):
+        mock_resolver_lote.return_value = {"Madrid": (40.4, -3.7), "Atlantis": (None, None)}
+        
+        response = self.client.post('/api/geocode', json={"ciudades": ["Madrid", "Atlantis"]})
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data["resultados"]["Madrid"], {"latitude": 40.4, "longitude": -3.7})
+        self.assertIsNone(data["resultados"]["Atlantis"])
+        mock_resolver_lote.assert_called_once_with(["Madrid", "Atlantis"])
+        
+        # También acepta las ciudades como parámetros de la URL
+        self.client.get('/api/geocode?ciudad=Madrid&ciudad=Bilbao')
+        mock_resolver_lote.assert_called_with(["Madrid", "Bilbao"])
+        
+        # Peticiones sin ciudades o con demasiadas ciudades
+        self.assertEqual(self.client.post('/api/geocode', json={}).status_code, 400)
+        self.assertEqual(self.client.post('/api/geocode', json={"ciudades": "Madrid"}).status_code, 400)
+        self.assertEqual(self.client.post('/api/geocode', json={"ciudades": ["x"] * 101}).status_code, 400)
+
+    @patch('app.api.routes.fachada.recoger_ultimos_datos_lote')
+    def test_obtener_datos_actuales_lote(self, mock_recoger_lote):
+        mock_recoger_lote.return_value = [self.mock_datos, self.mock_datos]
+        
+        ubicaciones = [{"latitude": 40.4, "longitude": -3.7}, {"latitude": "43.26", "longitude": "-2.93"}]
+        response = self.client.post('/api/aire-clima/lote', json={"ubicaciones": ubicaciones})
+        
+        self.assertEqual(response.status_code, 200)
+        resultados = json.loads(response.data)["resultados"]
+        self.assertEqual(len(resultados), 2)
+        self.assertEqual(resultados[1]["latitude"], 43.26)
+        self.assertEqual(resultados[1]["weather"], self.mock_weather_data)
+        mock_recoger_lote.assert_called_once_with([(40.4, -3.7), (43.26, -2.93)])
+        
+        # Peticiones mal formadas
+        self.assertEqual(self.client.post('/api/aire-clima/lote', json={}).status_code, 400)
+        self.assertEqual(self.client.post('/api/aire-clima/lote', json={"ubicaciones": [{"latitude": 1}]}).status_code, 400)
+        for latitude in ("nan", "-inf", 200):
+            ubicaciones = [{"latitude": latitude, "longitude": -3.7}]
+            self.assertEqual(self.client.post('/api/aire-clima/lote', json={"ubicaciones": ubicaciones}).status_code, 400)
+
+    @patch('app.api.routes.fachada.iterar_datos_historicos')
+    def test_obtener_datos_historicos_ndjson(self, mock_iterar_datos_historicos):
+        mock_iterar_datos_historicos.return_value = iter([
+            {"tipo": "dia", "fecha": "2023-05-15", "pm10": [20.1] * 24},
+            {"tipo": "dia", "fecha": "2023-05-16", "pm10": [18.5] * 24},
+            {"tipo": "informe", "informe": self.mock_informe}
+        ])
+        
+        response = self.client.get('/api/aire-clima/historico?latitude=40.4&longitude=-3.7&dias=1&formato=ndjson')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lineas = [json.loads(linea) for linea in response.data.decode("utf-8").splitlines()]
+        self.assertEqual([l["tipo"] for l in lineas], ["dia", "dia", "informe"])
+        self.assertEqual(lineas[-1]["informe"], self.mock_informe)
+        mock_iterar_datos_historicos.assert_called_once_with(40.4, -3.7, 1)
+        
+        # Formato desconocido
+        response = self.client.get('/api/aire-clima/historico?latitude=40.4&longitude=-3.7&formato=xml')
+        self.assertEqual(response.status_code, 400)
+        
+        # Periodo demasiado largo: se rechaza sin consultar las APIs
+        response = self.client.get('/api/aire-clima/historico?latitude=40.4&longitude=-3.7&dias=100000&formato=ndjson')
+        self.assertEqual(response.status_code, 400)
+        mock_iterar_datos_historicos.assert_called_once()
+
+    @patch('app.api.routes.fachada.obtener_datos_historicos')
+    @patch('app.api.routes.fachada.analizar_tendencias')
+    def test_historico_proyeccion_y_agregacion(self, mock_analizar_tendencias, mock_obtener_datos_historicos):
+        hourly = {
+            "time": ["2023-05-15T%02d:00" % h for h in range(24)] + ["2023-05-16T%02d:00" % h for h in range(24)],
+            "pm10": [float(h) for h in range(48)],
+            "pm2_5": [1.0] * 48
+        }
+        mock_obtener_datos_historicos.return_value = {
+            "weather_historical": compactar({"daily": self.mock_datos_historicos["weather_historical"]["daily"]}),
+            "air_quality_historical": compactar({"hourly": hourly, "hourly_units": {"pm10": "μg/m³"}}),
+            "frescura": {},
+            "celda": {"latitude": 40.4, "longitude": -3.7}
+        }
+        mock_analizar_tendencias.return_value = self.mock_informe
+        url = '/api/aire-clima/historico?latitude=40.4&longitude=-3.7'
+        
+        # Solo el informe: sin series, pero con la celda y la edad de los datos
+        data = json.loads(self.client.get(url + '&campos=informe').data)
+        self.assertEqual(set(data), {"informe", "celda", "frescura"})
+        
+        # Solo PM10, con medias diarias y sin calcular el informe
+        mock_analizar_tendencias.reset_mock()
+        data = json.loads(self.client.get(url + '&campos=pm10&horas=24').data)
+        aire = data["datos_historicos"]["air_quality_historical"]
+        self.assertEqual(aire["hourly"], {"time": ["2023-05-15T00:00", "2023-05-16T00:00"], "pm10": [11.5, 35.5]})
+        self.assertEqual(aire["hourly_units"], {"pm10": "μg/m³"})
+        self.assertEqual(data["datos_historicos"]["weather_historical"]["daily"], {"time": ["2023-05-15", "2023-05-16", "2023-05-17"]})
+        self.assertNotIn("informe", data)
+        mock_analizar_tendencias.assert_not_called()
+        
+        # Campos u horas no válidos
+        self.assertEqual(self.client.get(url + '&campos=viento').status_code, 400)
+        self.assertEqual(self.client.get(url + '&horas=0').status_code, 400)
+
+    def test_comprimir_respuesta(self):
+        self.app.after_request(comprimir_respuesta)
+        cuerpo = {"valores": list(range(1000))}
+        self.app.add_url_rule('/grande', 'grande', lambda: respuesta_condicional(jsonify(cuerpo)))
+        self.app.add_url_rule('/pequena', 'pequena', lambda: jsonify({"a": 1}))
+        
+        response = self.client.get('/grande', headers={"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(json.loads(gzip.decompress(response.data)), cuerpo)
+        self.assertTrue(response.headers["ETag"].startswith('W/'))
+        
+        # Sin Accept-Encoding, o si la respuesta es pequeña o un 304, no se comprime
+        self.assertNotIn("Content-Encoding", self.client.get('/grande').headers)
+        self.assertNotIn("Content-Encoding", self.client.get('/pequena', headers={"Accept-Encoding": "gzip"}).headers)
+        response = self.client.get('/grande', headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn("Content-Encoding", response.headers)
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
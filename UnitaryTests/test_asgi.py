@@ -0,0 +1,160 @@
+import unittest
+from unittest.mock import patch, AsyncMock
+import asyncio
+import json
+from app.api import asgi
+from app.facade.limitador import CuotaAgotada, LimiteSuperado
+from app.facade.resiliencia import CircuitoAbierto
+from app.facade.series import Serie
+from app.servicios import fachada as fachada_sincrona
+from main import create_app
+
+async def llamar(path, query_string=b"", method="GET", cabeceras=None):
+    """
+    Ejecuta una petición contra la aplicación ASGI y devuelve (estado, cuerpo). Si se
+    pasa un diccionario en `cabeceras`, se rellena con las de la respuesta.
+    """
+    mensajes = []
+    
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    
+    async def send(mensaje):
+        mensajes.append(mensaje)
+    
+    scope = {"type": "http", "method": method, "path": path, "query_string": query_string}
+    await asgi.aplicacion(scope, receive, send)
+    if cabeceras is not None:
+        cabeceras.update((nombre.decode(), valor.decode()) for nombre, valor in mensajes[0]["headers"])
+    return mensajes[0]["status"], json.loads(mensajes[1]["body"])
+
+class TestAsgi(unittest.IsolatedAsyncioTestCase):
+    
+    def setUp(self):
+        self.mock_datos = {
+            "weather": {"current_weather": {"temperature": 23.5}},
+            "air_quality": {"hourly": {"pm10": [15.2], "pm2_5": [8.4]}}
+        }
+    
+    async def test_obtener_dato_actual(self):
+        with patch.object(asgi.fachada, 'recoger_ultimo_dato', AsyncMock(return_value=self.mock_datos)) as mock_recoger:
+            estado, cuerpo = await llamar("/api/aire-clima/actual", b"latitude=40.4&longitude=-3.7")
+        
+        self.assertEqual(estado, 200)
+        self.assertEqual(cuerpo, self.mock_datos)
+        mock_recoger.assert_awaited_once_with(40.4, -3.7, 1)
+        self.assertEqual((await llamar("/api/aire-clima/actual", b"latitude=40.4&longitude=-3.7&horas=49"))[0], 400)
+        
+        # Parámetros faltantes o no numéricos
+        self.assertEqual((await llamar("/api/aire-clima/actual"))[0], 400)
+        self.assertEqual((await llamar("/api/aire-clima/actual", b"latitude=x&longitude=1"))[0], 400)
+        self.assertEqual((await llamar("/api/aire-clima/actual", b"latitude=nan&longitude=1"))[0], 400)
+    
+    async def test_servicio_externo_no_disponible(self):
+        # Mismas respuestas que el manejador de errores del blueprint síncrono
+        url = b"latitude=40.4&longitude=-3.7"
+        cabeceras = {}
+        with patch.object(asgi.fachada, 'recoger_ultimo_dato', AsyncMock(side_effect=CircuitoAbierto("API de clima"))):
+            self.assertEqual((await llamar("/api/aire-clima/actual", url, cabeceras=cabeceras))[0], 503)
+        self.assertNotIn("retry-after", cabeceras)
+        
+        for error in (CuotaAgotada("Cuota diaria agotada", reintentar_en=3600.4),
+                      LimiteSuperado("Sin turno", reintentar_en=0.2)):
+            cabeceras = {}
+            with patch.object(asgi.fachada, 'recoger_ultimo_dato', AsyncMock(side_effect=error)):
+                estado, cuerpo = await llamar("/api/aire-clima/actual", url, cabeceras=cabeceras)
+            self.assertEqual(estado, 503)
+            self.assertEqual(cabeceras["retry-after"], str(max(1, round(error.reintentar_en))))
+    
+    async def test_obtener_datos_historicos(self):
+        datos_historicos = {"weather_historical": {}, "air_quality_historical": {}}
+        informe = {"temperatura": {}, "calidad_aire": {}, "tendencias": {}, "recomendaciones": []}
+        with patch.object(asgi.fachada, 'obtener_datos_historicos', AsyncMock(return_value=datos_historicos)) as mock_historicos, \
+                patch.object(asgi.fachada, 'analizar_tendencias', return_value=informe):
+            estado, cuerpo = await llamar("/api/aire-clima/historico", b"latitude=40.4&longitude=-3.7&dias=30")
+        
+        self.assertEqual(estado, 200)
+        self.assertEqual(cuerpo, {"datos_historicos": datos_historicos, "informe": informe})
+        mock_historicos.assert_awaited_once_with(40.4, -3.7, 30)
+    
+    async def test_historico_como_la_api_sincrona(self):
+        # Los mismos servicios que la API síncrona: una sola caché, almacén y límites
+        self.assertIs(asgi.fachada.cache, fachada_sincrona.cache)
+        self.assertIs(asgi.fachada.almacen, fachada_sincrona.almacen)
+        self.assertIs(asgi.fachada.planificador, fachada_sincrona.planificador)
+        
+        datos_historicos = {
+            "weather_historical": {"daily": Serie.desde_json({"time": ["2024-01-01"], "temperature_2m_max": [20.0]})},
+            "air_quality_historical": {"hourly": Serie.desde_json(
+                {"time": ["2024-01-01T00:00", "2024-01-01T01:00"], "pm10": [10.0, 20.0], "pm2_5": [1.0, 3.0]})},
+            "celda": {"latitude": 40.4, "longitude": -3.7}
+        }
+        query = b"latitude=40.4&longitude=-3.7&campos=pm10&horas=2"
+        with patch.object(asgi.fachada, 'obtener_datos_historicos', AsyncMock(return_value=datos_historicos)), \
+                patch.object(fachada_sincrona, 'obtener_datos_historicos', return_value=datos_historicos):
+            estado, cuerpo = await llamar("/api/aire-clima/historico", query)
+            esperado = create_app({"PRECALENTAR": False}).test_client().get(
+                "/api/aire-clima/historico?" + query.decode()).get_json()
+        self.assertEqual(estado, 200)
+        self.assertEqual(cuerpo, esperado)
+        self.assertEqual(cuerpo["datos_historicos"]["air_quality_historical"]["hourly"], {
+            "time": ["2024-01-01T00:00"], "pm10": [15.0]})
+        
+        for query in (b"latitude=40.4&longitude=-3.7&campos=otro", b"latitude=40.4&longitude=-3.7&dias=100000",
+                      b"latitude=40.4&longitude=-3.7&horas=0", b"latitude=40.4&longitude=-3.7&formato=xml",
+                      b"latitude=inf&longitude=-3.7"):
+            self.assertEqual((await llamar("/api/aire-clima/historico", query))[0], 400, query)
+    
+    async def test_historico_ndjson(self):
+        registros = [{"tipo": "dia", "fecha": "2024-01-01"}, {"tipo": "informe", "informe": {}}]
+        mensajes = []
+        
+        async def send(mensaje):
+            mensajes.append(mensaje)
+        
+        scope = {"type": "http", "method": "GET", "path": "/api/aire-clima/historico",
+                 "query_string": b"latitude=40.4&longitude=-3.7&dias=1&formato=ndjson"}
+        with patch.object(fachada_sincrona, 'iterar_datos_historicos', return_value=iter(registros)) as mock_iterar:
+            await asgi.aplicacion(scope, None, send)
+        
+        self.assertIn((b"content-type", b"application/x-ndjson"), mensajes[0]["headers"])
+        lineas = b"".join(mensaje.get("body", b"") for mensaje in mensajes[1:]).decode().splitlines()
+        self.assertEqual([json.loads(linea) for linea in lineas], registros)
+        mock_iterar.assert_called_once_with(40.4, -3.7, 1)
+    
+    async def test_stream(self):
+        self.addCleanup(asgi.difusor.detener)
+        mensajes = []
+        desconectar = asyncio.Event()
+        
+        async def receive():
+            await desconectar.wait()
+            return {"type": "http.disconnect"}
+        
+        async def send(mensaje):
+            mensajes.append(mensaje)
+            if b"event: actual" in mensaje.get("body", b""):
+                desconectar.set()
+        
+        # El canal se refresca con la fachada síncrona, en el hilo del difusor
+        datos = [{"weather": {"current_weather": {"temperature": 19.0}}, "air_quality": {}, "celda": (12.3, 45.6)}]
+        scope = {"type": "http", "method": "GET", "path": "/api/aire-clima/stream",
+                 "query_string": b"ubicacion=12.3,45.6"}
+        with patch.object(fachada_sincrona, 'recoger_ultimos_datos_lote', return_value=datos):
+            await asyncio.wait_for(asgi.aplicacion(scope, receive, send), 5)
+        
+        self.assertEqual(mensajes[0]["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream; charset=utf-8"), mensajes[0]["headers"])
+        self.assertEqual(mensajes[1]["body"], b"retry: 5000\n\n")
+        cuerpo = json.loads(mensajes[2]["body"].decode().split("data: ")[1])
+        self.assertEqual(cuerpo["weather"]["current_weather"]["temperature"], 19.0)
+        # Desconectado el cliente, la suscripción se cierra
+        self.assertEqual(asgi.difusor.estadisticas()["suscripciones"], 0)
+        self.assertEqual((await llamar("/api/aire-clima/stream", b"ubicacion=1"))[0], 400)
+    
+    async def test_rutas_desconocidas(self):
+        self.assertEqual((await llamar("/api/otra"))[0], 404)
+        self.assertEqual((await llamar("/api/aire-clima/actual", method="POST"))[0], 405)
+
+if __name__ == '__main__':
+    unittest.main()
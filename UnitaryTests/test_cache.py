@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import patch
+from app.facade.cache import CacheRespuestas
+
+class TestCacheRespuestas(unittest.TestCase):
+    
+    def setUp(self):
+        self.cache = CacheRespuestas(resolucion=0.1, ttl={"actual": 60})
+    
+    def test_clave_ajustada_a_rejilla(self):
+        # Coordenadas muy próximas comparten celda
+        self.assertEqual(self.cache.clave("actual", 42.8467, -2.6716), self.cache.clave("actual", 42.8312, -2.6989))
+        self.assertEqual(self.cache.clave("actual", 42.8467, -2.6716), ("actual", 42.8, -2.7))
+        # Distinto tipo de dato o distinta celda implican claves distintas
+        self.assertNotEqual(self.cache.clave("actual", 42.84, -2.67), self.cache.clave("horario", 42.84, -2.67))
+        self.assertNotEqual(self.cache.clave("actual", 42.84, -2.67), self.cache.clave("actual", 43.26, -2.93))
+    
+    def test_aciertos_y_fallos(self):
+        clave = self.cache.clave("actual", 40.4, -3.7)
+        self.assertIsNone(self.cache.obtener(clave))
+        self.cache.guardar(clave, {"temperature": 23.5})
+        self.assertEqual(self.cache.obtener(clave), {"temperature": 23.5})
+        
+        estadisticas = self.cache.estadisticas()
+        self.assertEqual(estadisticas["aciertos"], 1)
+        self.assertEqual(estadisticas["fallos"], 1)
+        self.assertEqual(estadisticas["entradas"], 1)
+    
+    @patch('app.facade.cache.time.monotonic')
+    def test_ttl_por_tipo(self, mock_monotonic):
+        mock_monotonic.return_value = 1000.0
+        clave_actual = self.cache.clave("actual", 40.4, -3.7)
+        clave_diaria = self.cache.clave("diario", 40.4, -3.7)
+        self.cache.guardar(clave_actual, {"a": 1})
+        self.cache.guardar(clave_diaria, {"d": 1})
+        
+        # Pasado el TTL del dato actual, el diario sigue vigente
+        mock_monotonic.return_value = 1061.0
+        self.assertIsNone(self.cache.obtener(clave_actual))
+        self.assertEqual(self.cache.obtener(clave_diaria), {"d": 1})
+    
+    @patch('app.facade.cache.time.monotonic')
+    def test_vigente_con_margen(self, mock_monotonic):
+        mock_monotonic.return_value = 1000.0
+        clave = self.cache.clave("actual", 40.4, -3.7)
+        self.cache.guardar(clave, {"a": 1})
+        
+        # A 50 s de caducar: vigente sin margen, pero no con un margen de un minuto
+        mock_monotonic.return_value = 1010.0
+        self.assertEqual(self.cache.vigente(clave), {"a": 1})
+        self.assertIsNone(self.cache.vigente(clave, margen=60))
+        # No altera los contadores
+        self.assertEqual(self.cache.estadisticas()["aciertos"], 0)
+        self.assertEqual(self.cache.estadisticas()["fallos"], 0)
+    
+    def test_desalojo_lru_por_memoria(self):
+        cache = CacheRespuestas(max_bytes=40)
+        claves = [cache.clave("actual", lat, 0) for lat in (10, 20, 30)]
+        cache.guardar(claves[0], {"v": "x" * 10})
+        cache.guardar(claves[1], {"v": "y" * 10})
+        # Acceder a la primera la convierte en la más reciente
+        cache.obtener(claves[0])
+        cache.guardar(claves[2], {"v": "z" * 10})
+        
+        self.assertIsNotNone(cache.obtener(claves[0]))
+        self.assertIsNone(cache.obtener(claves[1]))
+        self.assertIsNotNone(cache.obtener(claves[2]))
+        self.assertEqual(cache.estadisticas()["desalojos"], 1)
+        self.assertLessEqual(cache.estadisticas()["bytes"], 40)
+    
+    def test_limpiar(self):
+        clave = self.cache.clave("actual", 40.4, -3.7)
+        self.cache.guardar(clave, {"a": 1})
+        self.cache.limpiar()
+        self.assertIsNone(self.cache.obtener(clave))
+        self.assertEqual(self.cache.estadisticas()["entradas"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+from unittest.mock import patch, Mock
+import json
+import multiprocessing
+import os
+import tempfile
+import numpy as np
+from app.facade.aireYClimaFacade import AireYClimaFacade
+from app.facade.cache_compartida import CacheCompartida
+from app.facade.series import Serie
+
+def _guardar_en_otro_proceso(cache, clave, valor):
+    cache.guardar(clave, valor)
+
+class TestCacheCompartida(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.directorio.name, "cache.sqlite")
+        self.cache = CacheCompartida(self.ruta, ttl={"actual": 60}, gracia=600)
+
+    def tearDown(self):
+        self.directorio.cleanup()
+
+    def test_misma_interfaz_que_la_cache_en_memoria(self):
+        clave = self.cache.clave("actual", 40.4, -3.7)
+        self.assertIsNone(self.cache.obtener(clave))
+        self.cache.guardar(clave, {"temperature": 23.5})
+        self.assertEqual(self.cache.obtener(clave), {"temperature": 23.5})
+        self.assertEqual(self.cache.vigente(clave, margen=30), {"temperature": 23.5})
+        self.assertIsNone(self.cache.vigente(clave, margen=61))
+        self.assertLess(self.cache.edad(clave)[0], 1)
+
+        estadisticas = self.cache.estadisticas()
+        self.assertEqual((estadisticas["aciertos"], estadisticas["fallos"], estadisticas["entradas"]), (1, 1, 1))
+
+    @patch('app.facade.cache_compartida.time.time')
+    def test_caducidad_y_gracia(self, mock_time):
+        mock_time.return_value = 1000.0
+        clave = self.cache.clave("actual", 40.4, -3.7)
+        self.cache.guardar(clave, {"a": 1})
+
+        # Caducada: ya no se sirve como vigente, pero sí como obsoleta durante la gracia
+        mock_time.return_value = 1061.0
+        self.assertIsNone(self.cache.obtener(clave))
+        self.assertEqual(self.cache.obtener_obsoleto(clave), {"a": 1})
+        self.assertEqual(self.cache.edad(clave), (61.0, True, 1000.0))
+
+        mock_time.return_value = 1661.0
+        self.assertIsNone(self.cache.obtener(clave))
+        self.assertIsNone(self.cache.obtener_obsoleto(clave))
+        self.assertEqual(self.cache.estadisticas()["entradas"], 0)
+
+    def test_compartida_entre_instancias_y_series(self):
+        serie = Serie(np.array([0, 3600], dtype=np.int64), {"pm10": np.array([1.0, np.nan])})
+        clave = self.cache.clave("horario", 40.4, -3.7, "2024-01-01", "2024-01-02")
+        self.cache.guardar(clave, {"hourly": serie})
+
+        otra = CacheCompartida(self.ruta)
+        leida = otra.obtener(clave)["hourly"]
+        self.assertEqual(leida.lista("pm10"), [1.0, None])
+        # Mientras no cambie, el valor no se vuelve a deserializar
+        self.assertIs(otra.obtener(clave), otra.obtener(clave))
+
+        self.cache.guardar(clave, {"hourly": Serie(None, {"pm10": np.array([2.0])})})
+        self.assertEqual(otra.obtener(clave)["hourly"].lista("pm10"), [2.0])
+
+    def test_desaloja_las_menos_usadas(self):
+        cache = CacheCompartida(self.ruta, max_bytes=2000)
+        valor = {"datos": "x" * 800}
+        for i in range(3):
+            cache.guardar(("actual", i), valor)
+        self.assertIsNone(cache.obtener(("actual", 0)))
+        self.assertEqual(cache.obtener(("actual", 2)), valor)
+        self.assertLessEqual(cache.estadisticas()["bytes"], 2000)
+        self.assertEqual(cache.estadisticas()["desalojos"], 1)
+
+    def test_total_de_bytes_sin_recorrer_las_entradas(self):
+        cache = CacheCompartida(self.ruta, max_bytes=2000, ttl={"actual": 60}, gracia=0)
+
+        def suma():
+            return cache._conexion().execute("SELECT COALESCE(SUM(tamano), 0) FROM entradas").fetchone()[0]
+
+        cache.guardar(("actual", 0), {"datos": "x" * 100})
+        cache.guardar(("actual", 0), {"datos": "x" * 300})
+        for i in range(1, 4):
+            cache.guardar(("actual", i), {"datos": "x" * 800})
+        self.assertEqual(cache.estadisticas()["bytes"], suma())
+        with patch('app.facade.cache_compartida.time.time', return_value=10 ** 10):
+            self.assertIsNone(cache.obtener(("actual", 3)))
+        self.assertEqual(cache.estadisticas()["bytes"], suma())
+
+        # Un fichero anterior a la tabla de totales parte de la suma de sus entradas
+        with cache._escritura() as db:
+            db.execute("DROP TABLE totales")
+        self.assertEqual(CacheCompartida(self.ruta).estadisticas()["bytes"], suma())
+        cache.limpiar()
+        self.assertEqual(cache.estadisticas()["bytes"], 0)
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "requiere fork")
+    def test_procesos_hijos_tras_fork(self):
+        # Como los workers de gunicorn: heredan el objeto y abren su propia conexión
+        clave = self.cache.clave("actual", 43.3, -2.9)
+        self.cache.estadisticas()
+        proceso = multiprocessing.get_context("fork").Process(
+            target=_guardar_en_otro_proceso, args=(self.cache, clave, {"temperature": 12.0}))
+        proceso.start()
+        proceso.join(10)
+        self.assertEqual(proceso.exitcode, 0)
+        self.assertEqual(self.cache.obtener(clave), {"temperature": 12.0})
+
+    def test_fachada_con_cache_compartida(self):
+        datos = {"current_weather": {"temperature": 20.0}}
+        respuesta = Mock(status_code=200, content=json.dumps(datos).encode(), **{"json.return_value": datos})
+        fachadas = [AireYClimaFacade(cache=CacheCompartida(self.ruta)) for _ in range(2)]
+        with patch.object(fachadas[0].session, 'get', return_value=respuesta) as mock_get:
+            fachadas[0].recoger_ultimo_dato(40.4, -3.7)
+        with patch.object(fachadas[1].session, 'get') as mock_get_otra:
+            resultado = fachadas[1].recoger_ultimo_dato(40.4, -3.7)
+
+        # La segunda fachada (otro worker) encuentra la caché ya caliente
+        self.assertEqual(mock_get.call_count, 2)
+        mock_get_otra.assert_not_called()
+        self.assertEqual(resultado["weather"], datos)
+
+if __name__ == '__main__':
+    unittest.main()
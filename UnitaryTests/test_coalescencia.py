@@ -0,0 +1,75 @@
+import unittest
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.facade.coalescencia import Coalescedor
+
+class TestCoalescedor(unittest.TestCase):
+    
+    def setUp(self):
+        self.coalescedor = Coalescedor()
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(self.executor.shutdown)
+    
+    def test_misma_clave_comparte_futuro(self):
+        liberar = threading.Event()
+        llamadas = []
+        
+        def peticion(valor):
+            llamadas.append(valor)
+            liberar.wait(5)
+            return valor
+        
+        primero = self.coalescedor.enviar(("actual", 40.4, -3.7), self.executor, peticion, 1)
+        segundo = self.coalescedor.enviar(("actual", 40.4, -3.7), self.executor, peticion, 2)
+        otro = self.coalescedor.enviar(("actual", 43.3, -2.9), self.executor, peticion, 3)
+        self.assertIs(primero, segundo)
+        self.assertEqual(self.coalescedor.estadisticas()["en_curso"], 2)
+        
+        liberar.set()
+        self.assertEqual((primero.result(), segundo.result(), otro.result()), (1, 1, 3))
+        self.assertEqual(sorted(llamadas), [1, 3])
+        self.assertEqual(self.coalescedor.estadisticas(), {"lanzadas": 2, "coalescidas": 1, "en_curso": 0})
+    
+    def test_clave_libre_al_terminar(self):
+        # Una petición terminada no se reutiliza: la siguiente se lanza de nuevo
+        self.assertEqual(self.coalescedor.enviar("clave", self.executor, lambda: 1).result(), 1)
+        self.assertEqual(self.coalescedor.enviar("clave", self.executor, lambda: 2).result(), 2)
+        self.assertEqual(self.coalescedor.estadisticas()["lanzadas"], 2)
+    
+    def test_error_compartido(self):
+        liberar = threading.Event()
+        
+        def peticion():
+            liberar.wait(5)
+            raise ConnectionError("sin conexión")
+        
+        futuros = [self.coalescedor.enviar("clave", self.executor, peticion) for _ in range(3)]
+        liberar.set()
+        for futuro in futuros:
+            self.assertRaises(ConnectionError, futuro.result)
+        self.assertEqual(self.coalescedor.estadisticas()["en_curso"], 0)
+    
+    def test_esperar_asincrono(self):
+        llamadas = []
+        
+        async def peticion():
+            llamadas.append(1)
+            await asyncio.sleep(0.01)
+            return {"temperature": 23.5}
+        
+        async def probar():
+            esperas = [self.coalescedor.esperar("clave", peticion) for _ in range(5)]
+            # Cancelar una de las esperas no cancela la petición compartida
+            cancelada = asyncio.ensure_future(self.coalescedor.esperar("clave", peticion))
+            await asyncio.sleep(0)
+            cancelada.cancel()
+            return await asyncio.gather(*esperas)
+        
+        resultados = asyncio.run(probar())
+        self.assertEqual(resultados, [{"temperature": 23.5}] * 5)
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(self.coalescedor.estadisticas(), {"lanzadas": 1, "coalescidas": 5, "en_curso": 0})
+
+if __name__ == '__main__':
+    unittest.main()
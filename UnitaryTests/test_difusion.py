@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import patch, Mock
+import json
+from app.facade.difusion import Difusor, leer_ubicaciones
+from app.servicios import difusor, fachada
+from main import create_app
+
+class TestDifusor(unittest.TestCase):
+
+    def setUp(self):
+        self.temperaturas = {(40.4, -3.7): 20.0, (43.3, -2.9): 15.0}
+        self.fachada = Mock()
+        self.fachada.resolver_celda.side_effect = lambda lat, lon: (round(lat, 1), round(lon, 1))
+        self.fachada.recoger_ultimos_datos_lote.side_effect = lambda celdas: [
+            {"weather": {"temperature": self.temperaturas[celda]}, "air_quality": {}, "celda": celda}
+            for celda in celdas
+        ]
+        self.difusor = Difusor(self.fachada, intervalo=0.02)
+        self.addCleanup(self.difusor.detener)
+
+    def test_un_refresco_para_todos_los_suscriptores(self):
+        madrid = [self.difusor.suscribir([(40.41, -3.69)]) for _ in range(100)]
+        ambas = self.difusor.suscribir([(40.4, -3.7), (43.3, -2.9)])
+
+        self.assertEqual(len(madrid[0].esperar(2)), 1)
+        self.assertTrue(all(len(suscripcion.esperar(1)) == 1 for suscripcion in madrid[1:]))
+        recibidas = set()
+        for _ in range(10):
+            recibidas.update(celda for celda, _, _ in ambas.esperar(2))
+            if len(recibidas) == 2:
+                break
+        self.assertEqual(recibidas, {(40.4, -3.7), (43.3, -2.9)})
+        # Una sola consulta en lote por refresco, con cada celda una vez
+        for llamada in self.fachada.recoger_ultimos_datos_lote.call_args_list:
+            self.assertEqual(len(llamada.args[0]), len(set(llamada.args[0])))
+
+        # Sin cambios en los datos no se vuelve a enviar nada
+        self.assertEqual(madrid[0].esperar(0.1), [])
+        self.temperaturas[(43.3, -2.9)] = 16.0
+        celda, huella, datos = ambas.esperar(2)[0]
+        self.assertEqual((celda, datos["weather"]["temperature"]), ((43.3, -2.9), 16.0))
+        self.assertEqual(madrid[0].esperar(0.1), [])
+
+        estadisticas = self.difusor.estadisticas()
+        self.assertEqual((estadisticas["suscripciones"], estadisticas["celdas"], estadisticas["publicados"]), (101, 2, 3))
+
+        # Los nuevos suscriptores reciben al momento lo último publicado
+        self.assertEqual(self.difusor.suscribir([(43.3, -2.9)]).esperar(0)[0][1], huella)
+
+    def test_cancelar_y_limite(self):
+        difusor = Difusor(self.fachada, max_suscripciones=1)
+        self.addCleanup(difusor.detener)
+        suscripcion = difusor.suscribir([(40.4, -3.7)])
+        self.assertIsNone(difusor.suscribir([(43.3, -2.9)]))
+        difusor.cancelar(suscripcion)
+        self.assertEqual(difusor.estadisticas()["celdas"], 0)
+        self.assertIsNotNone(difusor.suscribir([(43.3, -2.9)]))
+
+    def test_leer_ubicaciones(self):
+        self.assertEqual(leer_ubicaciones(["40.4,-3.7", "43.3,-2.9"]), [(40.4, -3.7), (43.3, -2.9)])
+        self.assertRaises(ValueError, leer_ubicaciones, ["40.4"])
+        self.assertRaises(ValueError, leer_ubicaciones, ["a,b"])
+
+
+class TestEndpointStream(unittest.TestCase):
+
+    def setUp(self):
+        fachada.cache.limpiar()
+        self.client = create_app({"PRECALENTAR": False}).test_client()
+        self.addCleanup(difusor.detener)
+
+    def test_eventos_al_cambiar_los_datos(self):
+        datos = [{"weather": {"current_weather": {"temperature": 21.0}}, "air_quality": {}, "celda": (12.3, 45.6)}]
+        with patch.object(fachada, 'recoger_ultimos_datos_lote', return_value=datos):
+            respuesta = self.client.get('/api/aire-clima/stream?ubicacion=12.3,45.6', buffered=False)
+            self.assertEqual(respuesta.mimetype, "text/event-stream")
+            self.assertNotIn("Content-Encoding", respuesta.headers)
+            fragmentos = iter(respuesta.response)
+            self.assertEqual(next(fragmentos), b"retry: 5000\n\n")
+            evento = next(fragmentos).decode()
+            respuesta.close()
+
+        self.assertTrue(evento.startswith("id: "))
+        self.assertIn("event: actual\n", evento)
+        cuerpo = json.loads(evento.split("data: ")[1])
+        self.assertEqual(cuerpo["weather"]["current_weather"]["temperature"], 21.0)
+        self.assertEqual(cuerpo["ubicaciones"], [{"latitude": 12.3, "longitude": 45.6}])
+        # Al cerrarse la conexión se cancela la suscripción
+        self.assertEqual(difusor.estadisticas()["suscripciones"], 0)
+
+    def test_ubicaciones_no_validas(self):
+        self.assertEqual(self.client.get('/api/aire-clima/stream').status_code, 400)
+        self.assertEqual(self.client.get('/api/aire-clima/stream?ubicacion=norte').status_code, 400)
+        self.assertEqual(self.client.get('/api/aire-clima/stream?ubicacion=nan,1').status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
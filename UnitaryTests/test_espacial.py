@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import patch, Mock
+import json
+from app.facade.aireYClimaFacade import AireYClimaFacade
+from app.facade.espacial import IndiceEspacial, distancia_km
+
+class TestIndiceEspacial(unittest.TestCase):
+
+    def test_distancia(self):
+        # Un grado de latitud son unos 111 km
+        self.assertAlmostEqual(distancia_km(40.0, -3.0, 41.0, -3.0), 111.2, places=1)
+        self.assertEqual(distancia_km(40.0, -3.0, 40.0, -3.0), 0)
+
+    def test_reutiliza_celda_cercana(self):
+        indice = IndiceEspacial(radio_km=11.0)
+        self.assertEqual(indice.resolver(40.449, -3.7, (40.4, -3.7)), (40.4, -3.7))
+        # Al otro lado de la frontera de la rejilla, a unos cientos de metros
+        self.assertEqual(indice.resolver(40.451, -3.7, (40.5, -3.7)), (40.4, -3.7))
+        # Lejos de cualquier celda ya consultada se usa la propia
+        self.assertEqual(indice.resolver(40.6, -3.7, (40.6, -3.7)), (40.6, -3.7))
+        self.assertEqual(indice.estadisticas(), {"celdas": 2, "reutilizadas": 1})
+
+    def test_prefiere_la_celda_propia_y_la_mas_cercana(self):
+        indice = IndiceEspacial(radio_km=11.0)
+        indice.resolver(40.4, -3.7, (40.4, -3.7))
+        indice.resolver(40.6, -3.7, (40.6, -3.7))
+        self.assertEqual(indice.resolver(40.52, -3.7, (40.5, -3.7)), (40.6, -3.7))
+        indice.anadir((40.5, -3.7))
+        self.assertEqual(indice.resolver(40.52, -3.7, (40.5, -3.7)), (40.5, -3.7))
+
+    def test_cerca_de_los_polos_y_del_antimeridiano(self):
+        indice = IndiceEspacial(radio_km=11.0)
+        indice.anadir((89.9, 10.0))
+        indice.anadir((0.0, -179.98))
+        # Cerca del polo, un grado de longitud son unos pocos metros
+        self.assertEqual(indice.cercana(89.95, 60.0), (89.9, 10.0))
+        self.assertEqual(indice.cercana(0.0, 179.98), (0.0, -179.98))
+        self.assertIsNone(indice.cercana(0.0, 179.8))
+
+    def test_descarta_las_celdas_menos_usadas(self):
+        indice = IndiceEspacial(radio_km=11.0, max_celdas=2)
+        for centro in ((10.0, 10.0), (20.0, 20.0), (30.0, 30.0)):
+            indice.anadir(centro)
+        self.assertEqual(len(indice), 2)
+        self.assertIsNone(indice.cercana(10.0, 10.0))
+        self.assertEqual(indice.cercana(30.01, 30.0), (30.0, 30.0))
+
+
+class TestFachadaConIndice(unittest.TestCase):
+
+    def _respuesta(self, url, params=None, **kwargs):
+        datos = {"current_weather": {"temperature": params["latitude"]}}
+        return Mock(status_code=200, content=json.dumps(datos).encode(), **{"json.return_value": datos})
+
+    def test_ubicaciones_cercanas_comparten_celda(self):
+        facade = AireYClimaFacade()
+        with patch.object(facade.session, 'get', side_effect=self._respuesta) as mock_session_get:
+            primero = facade.recoger_ultimo_dato(40.449, -3.7)
+            segundo = facade.recoger_ultimo_dato(40.451, -3.7)
+        
+        # La segunda consulta cae en otra celda de la rejilla pero reutiliza la primera
+        self.assertEqual(mock_session_get.call_count, 2)
+        self.assertEqual(segundo["celda"], {"latitude": 40.4, "longitude": -3.7})
+        self.assertEqual(segundo["weather"], primero["weather"])
+
+    def test_sin_indice(self):
+        facade = AireYClimaFacade(radio_celdas_km=0)
+        with patch.object(facade.session, 'get', side_effect=self._respuesta) as mock_session_get:
+            facade.recoger_ultimo_dato(40.449, -3.7)
+            segundo = facade.recoger_ultimo_dato(40.451, -3.7)
+        self.assertEqual(mock_session_get.call_count, 4)
+        self.assertEqual(segundo["celda"], {"latitude": 40.5, "longitude": -3.7})
+
+if __name__ == '__main__':
+    unittest.main()
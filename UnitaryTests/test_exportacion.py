@@ -0,0 +1,161 @@
+import unittest
+from unittest.mock import patch, Mock
+import csv
+import io
+import json
+from datetime import date
+import numpy as np
+from app.facade.aireYClimaFacade import AireYClimaFacade
+from app.facade import exportacion
+from app.facade.exportacion import COLUMNAS, exportar, formatos_disponibles, iterar_grupos, pa
+from app.servicios import fachada
+from main import create_app
+
+def respuesta_api(url, params=None, timeout=None):
+    """Respuesta de Open-Meteo con los días de start_date a end_date de los parámetros"""
+    dias = np.arange(np.datetime64(params["start_date"]), np.datetime64(params["end_date"]) + 1)
+    fechas = np.datetime_as_string(dias, unit="D").tolist()
+    if "daily" in params:
+        datos = {"daily": {
+            "time": fechas,
+            "temperature_2m_max": [20.0 + i for i in range(len(fechas))],
+            "temperature_2m_min": [10.0 + i for i in range(len(fechas))]
+        }}
+    else:
+        datos = {"hourly": {
+            "time": [f"{fecha}T{h:02d}:00" for fecha in fechas for h in range(24)],
+            "pm10": [float(h) for _ in fechas for h in range(24)],
+            "pm2_5": [None if h == 3 else h / 2 for _ in fechas for h in range(24)]
+        }}
+    return Mock(status_code=200, headers={}, content=json.dumps(datos).encode(), **{"json.return_value": datos})
+
+def leer_csv(fragmentos):
+    return list(csv.DictReader(io.StringIO(b"".join(fragmentos).decode("utf-8"))))
+
+class TestExportacion(unittest.TestCase):
+
+    def setUp(self):
+        self.facade = AireYClimaFacade()
+        patcher = patch.object(self.facade.session, 'get', side_effect=respuesta_api)
+        self.mock_get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_csv_una_fila_por_hora(self):
+        ubicaciones = [(40.41, -3.69), (43.26, -2.93)]
+        filas = leer_csv(exportar(self.facade, ubicaciones, date(2024, 1, 30), date(2024, 2, 2), dias_por_bloque=3))
+
+        self.assertEqual(len(filas), 2 * 4 * 24)
+        self.assertEqual(tuple(filas[0]), COLUMNAS)
+        # En el orden de las ubicaciones y las fechas, aunque se descarguen en paralelo
+        self.assertEqual([float(fila["latitude"]) for fila in filas[::96]], [40.41, 43.26])
+        self.assertEqual([fila["time"] for fila in filas[:2]], ["2024-01-30T00:00", "2024-01-30T01:00"])
+        self.assertEqual(filas[95]["time"], "2024-02-02T23:00")
+        # Las temperaturas diarias se repiten en las horas de su día (el 1 de febrero
+        # es el primer día del segundo bloque)
+        self.assertEqual(float(filas[50]["temperature_2m_max"]), 22.0)
+        self.assertEqual(float(filas[72]["temperature_2m_min"]), 10.0)
+        self.assertEqual((filas[3]["pm10"], filas[3]["pm2_5"]), ("3.0", ""))
+        # Un par de peticiones por ubicación y bloque de días
+        self.assertEqual(self.mock_get.call_count, 2 * 2 * 2)
+
+    def test_no_llena_la_cache_de_respuestas(self):
+        # Una consulta interactiva del mismo rango sí queda en caché y la exportación la aprovecha
+        self.facade.obtener_datos_rango(40.4, -3.7, date(2024, 1, 1), date(2024, 1, 2))
+        self.assertEqual(self.facade.cache.estadisticas()["entradas"], 2)
+        leer_csv(exportar(self.facade, [(40.4, -3.7), (43.3, -2.9)], date(2024, 1, 1), date(2024, 1, 2)))
+        self.assertEqual(self.mock_get.call_count, 4)
+
+        estadisticas = self.facade.cache.estadisticas()
+        self.assertEqual((estadisticas["entradas"], estadisticas["aciertos"]), (2, 0))
+
+    def test_grupos_acotados(self):
+        ubicaciones = [(40.0 + i, -3.0) for i in range(5)]
+        grupos = list(iterar_grupos(self.facade, ubicaciones, date(2024, 1, 1), date(2024, 1, 2),
+                                    paralelo=2, dias_por_bloque=1, filas_por_grupo=48))
+        self.assertEqual([len(grupo["time"]) for grupo in grupos], [48] * 5)
+        self.assertEqual(grupos[4]["latitude"][0], 44.0)
+
+        fragmentos = list(exportar(self.facade, ubicaciones, date(2024, 1, 1), date(2024, 1, 2), filas_por_grupo=48))
+        self.assertGreater(len(fragmentos), 5)
+        self.assertEqual(len(leer_csv(fragmentos)), 5 * 48)
+
+    def test_sin_calidad_del_aire_una_fila_por_dia(self):
+        def solo_clima(url, params=None, timeout=None):
+            return respuesta_api(url, params) if "daily" in params else Mock(status_code=500, headers={}, content=b"")
+
+        with patch.object(self.facade.session, 'get', side_effect=solo_clima):
+            filas = leer_csv(exportar(self.facade, [(40.4, -3.7)], date(2024, 1, 1), date(2024, 1, 3)))
+        self.assertEqual([fila["time"] for fila in filas], ["2024-01-01T00:00", "2024-01-02T00:00", "2024-01-03T00:00"])
+        self.assertEqual([fila["pm10"] for fila in filas], ["", "", ""])
+
+    def test_formatos_sin_pyarrow(self):
+        with patch.object(exportacion, "pa", None):
+            self.assertEqual(formatos_disponibles(), ("csv",))
+            self.assertEqual(exportacion.formato_por_defecto(), "csv")
+            with self.assertRaises(ValueError):
+                next(exportar(self.facade, [(40.4, -3.7)], date(2024, 1, 1), date(2024, 1, 1), "parquet"))
+
+    @unittest.skipIf(pa is None, "pyarrow no está instalado")
+    def test_parquet_y_arrow(self):
+        import pyarrow.parquet as pq
+        ubicaciones = [(40.4, -3.7), (43.3, -2.9)]
+        datos = b"".join(exportar(self.facade, ubicaciones, date(2024, 1, 1), date(2024, 1, 2), "parquet",
+                                  filas_por_grupo=48))
+        fichero = pq.ParquetFile(io.BytesIO(datos))
+        self.assertEqual(fichero.metadata.num_row_groups, 2)
+        tabla = fichero.read()
+        self.assertEqual(tabla.column_names, list(COLUMNAS))
+        self.assertEqual(tabla.num_rows, 96)
+        self.assertIsNone(tabla.column("pm2_5")[3].as_py())
+
+        datos = b"".join(exportar(self.facade, ubicaciones, date(2024, 1, 1), date(2024, 1, 2), "arrow"))
+        self.assertEqual(pa.ipc.open_stream(datos).read_all().num_rows, 96)
+
+
+class TestExportacionEndpointYComando(unittest.TestCase):
+
+    def setUp(self):
+        fachada.cache.limpiar()
+        self.app = create_app({"PRECALENTAR": False})
+        patcher = patch.object(fachada.session, 'get', side_effect=respuesta_api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_endpoint_csv(self):
+        respuesta = self.app.test_client().post('/api/aire-clima/exportar', json={
+            "ubicaciones": [{"latitude": 40.4, "longitude": -3.7}],
+            "inicio": "2024-01-01", "fin": "2024-01-02", "formato": "csv"
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.mimetype, "text/csv")
+        self.assertIn('filename="aire-clima-2024-01-01-2024-01-02.csv"', respuesta.headers["Content-Disposition"])
+        self.assertEqual(len(leer_csv([respuesta.data])), 48)
+
+    def test_endpoint_peticiones_no_validas(self):
+        client = self.app.test_client()
+        ubicaciones = [{"latitude": 40.4, "longitude": -3.7}]
+        for cuerpo in (
+            {"inicio": "2024-01-01", "fin": "2024-01-02"},
+            {"ubicaciones": [{"latitude": "norte"}], "inicio": "2024-01-01", "fin": "2024-01-02"},
+            {"ubicaciones": ubicaciones, "inicio": "2024-01-02", "fin": "2024-01-01"},
+            {"ubicaciones": ubicaciones, "inicio": "2023-01-01", "fin": "2024-06-01"},
+            {"ubicaciones": ubicaciones, "inicio": "ayer", "fin": "2024-01-01"},
+            {"ubicaciones": ubicaciones, "inicio": "2024-01-01", "fin": "2024-01-02", "formato": "xlsx"}
+        ):
+            self.assertEqual(client.post('/api/aire-clima/exportar', json=cuerpo).status_code, 400, cuerpo)
+
+    def test_comando(self):
+        runner = self.app.test_cli_runner()
+        resultado = runner.invoke(args=["exportar", "--ubicacion", "40.4", "-3.7", "--desde", "2024-01-01",
+                                        "--hasta", "2024-01-01", "--formato", "csv"])
+        self.assertEqual(resultado.exit_code, 0, resultado.output)
+        self.assertEqual(len(leer_csv([resultado.stdout_bytes])), 24)
+
+        resultado = runner.invoke(args=["exportar", "--desde", "2024-01-01", "--hasta", "2024-01-01"])
+        self.assertNotEqual(resultado.exit_code, 0)
+        resultado = runner.invoke(args=["exportar", "--ubicacion", "nan", "-3.7", "--desde", "2024-01-01",
+                                        "--hasta", "2024-01-01"])
+        self.assertNotEqual(resultado.exit_code, 0)
+
+if __name__ == '__main__':
+    unittest.main()
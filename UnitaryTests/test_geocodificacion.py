@@ -0,0 +1,155 @@
+import unittest
+import requests
+from unittest.mock import patch, Mock
+import json
+import os
+import tempfile
+from app.facade.geocodificacion import Geocodificador, Nomenclator, normalizar
+
+class TestGeocodificacion(unittest.TestCase):
+    
+    def setUp(self):
+        self.mock_geocoding_data = [
+            {
+                "lat": "40.4",
+                "lon": "-3.7",
+                "display_name": "Madrid"
+            }
+        ]
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ruta_db = os.path.join(self.directorio.name, "geocodificacion.sqlite")
+    
+    def tearDown(self):
+        self.directorio.cleanup()
+    
+    def _respuesta_nominatim(self, datos):
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.text = json.dumps(datos)
+        mock_response.content = mock_response.text.encode()
+        mock_response.json.return_value = datos
+        return mock_response
+    
+    def test_normalizar(self):
+        self.assertEqual(normalizar("  Donostia   San Sebastián "), "donostia san sebastian")
+        self.assertEqual(normalizar("CÁDIZ"), "cadiz")
+    
+    def test_nomenclator_busqueda_exacta_y_prefijo(self):
+        nomenclator = Nomenclator([
+            ("Vitoria-Gasteiz", 42.85, -2.67, 250000),
+            ("Vitoria", 42.85, -2.67, 250000),
+            ("Valencia", 39.47, -0.38, 800000),
+            ("Valencia", 10.16, -68.0, 1400000),
+            ("Valladolid", 41.65, -4.72, 300000)
+        ])
+        
+        self.assertEqual(len(nomenclator), 4)
+        self.assertEqual(nomenclator.buscar("vitoria"), (42.85, -2.67))
+        # Ante nombres repetidos se conserva la ciudad más poblada
+        self.assertEqual(nomenclator.buscar("Valencia"), (10.16, -68.0))
+        self.assertIsNone(nomenclator.buscar("Bilbao"))
+        self.assertEqual([n for n, _, _ in nomenclator.por_prefijo("val")], ["valencia", "valladolid"])
+        self.assertEqual(len(nomenclator.por_prefijo("v", limite=2)), 2)
+    
+    def test_nomenclator_desde_geonames(self):
+        ruta = os.path.join(self.directorio.name, "cities.txt")
+        columnas = ["3104499", "Vitoria-Gasteiz", "Vitoria-Gasteiz", "Gasteiz,Vitoria", "42.84998", "-2.67268"]
+        columnas += [""] * 8 + ["253996"] + [""] * 4
+        with open(ruta, "w", encoding="utf-8") as fichero:
+            fichero.write("\t".join(columnas) + "\n")
+        
+        nomenclator = Nomenclator.desde_geonames(ruta)
+        self.assertEqual(nomenclator.buscar("Gasteiz"), (42.84998, -2.67268))
+        self.assertEqual(nomenclator.buscar("Vitoria"), (42.84998, -2.67268))
+        self.assertIsNone(Nomenclator.desde_geonames(ruta, alternativos=False).buscar("Gasteiz"))
+    
+    def test_resolver_con_nomenclator_sin_red(self):
+        geocodificador = Geocodificador(nomenclator=Nomenclator([("Vitoria", 42.85, -2.67, 1)]))
+        with patch.object(geocodificador.session, 'get') as mock_get:
+            self.assertEqual(geocodificador.resolver("Vitoria"), (42.85, -2.67))
+        mock_get.assert_not_called()
+    
+    def test_cache_persistente_entre_instancias(self):
+        geocodificador = Geocodificador(ruta_db=self.ruta_db, intervalo_minimo=0)
+        with patch.object(geocodificador.session, 'get', return_value=self._respuesta_nominatim(self.mock_geocoding_data)) as mock_get:
+            self.assertEqual(geocodificador.resolver("Madrid"), (40.4, -3.7))
+            # La segunda consulta (con otra grafía) se sirve de la caché en memoria
+            self.assertEqual(geocodificador.resolver(" MADRID "), (40.4, -3.7))
+        self.assertEqual(mock_get.call_count, 1)
+        
+        # Una nueva instancia (otro proceso o reinicio) lee la caché en disco
+        otro = Geocodificador(ruta_db=self.ruta_db)
+        with patch.object(otro.session, 'get') as mock_get:
+            self.assertEqual(otro.resolver("madrid"), (40.4, -3.7))
+        mock_get.assert_not_called()
+    
+    def test_ttl_cache_persistente(self):
+        geocodificador = Geocodificador(ruta_db=self.ruta_db, ttl=60, intervalo_minimo=0)
+        geocodificador._guardar_disco("madrid", (40.4, -3.7))
+        with patch('app.facade.geocodificacion.time.time', return_value=10 ** 11):
+            self.assertIsNone(geocodificador._leer_disco("madrid"))
+    
+    def test_nominatim_caido(self):
+        geocodificador = Geocodificador(ruta_db=self.ruta_db, ttl=60, intervalo_minimo=0)
+        geocodificador._guardar_disco("madrid", (40.4, -3.7))
+        with patch.object(geocodificador.session, 'get', side_effect=requests.ConnectionError("caída")) as mock_get, \
+                patch('app.facade.geocodificacion.time.time', return_value=10 ** 11):
+            # Sin respuesta de Nominatim se usan las coordenadas caducadas
+            self.assertEqual(geocodificador.resolver("Madrid"), (40.4, -3.7))
+            for i in range(5):
+                self.assertEqual(geocodificador.resolver(f"Ciudad {i}"), (None, None))
+            # Con el circuito abierto ya no se consulta Nominatim
+            self.assertEqual(geocodificador.resolver("Bilbao"), (None, None))
+        self.assertEqual(mock_get.call_count, 5)
+        self.assertEqual(geocodificador.disyuntor.estado, "abierto")
+    
+    def test_resolver_ciudad_inexistente(self):
+        geocodificador = Geocodificador(intervalo_minimo=0)
+        with patch.object(geocodificador.session, 'get', return_value=self._respuesta_nominatim([])):
+            self.assertEqual(geocodificador.resolver("CiudadInexistente"), (None, None))
+        self.assertEqual(geocodificador.resolver(""), (None, None))
+    
+    def test_ciudad_inexistente_no_se_vuelve_a_consultar(self):
+        geocodificador = Geocodificador(ruta_db=self.ruta_db, intervalo_minimo=0, ttl_no_encontradas=60)
+        with patch.object(geocodificador.session, 'get', return_value=self._respuesta_nominatim([])) as mock_get:
+            resultados = geocodificador.resolver_lote(["Atlántida", "Utopía", "atlantida"])
+            self.assertEqual(set(resultados.values()), {(None, None)})
+            self.assertEqual(mock_get.call_count, 2)
+            geocodificador.resolver_lote(["Atlántida", "Utopía"])
+            self.assertEqual(mock_get.call_count, 2)
+            
+            # También entre procesos, desde la caché persistente, hasta que caduca
+            otro = Geocodificador(ruta_db=self.ruta_db, intervalo_minimo=0, ttl_no_encontradas=60)
+            self.assertEqual(otro.resolver("Utopía"), (None, None))
+            self.assertEqual(mock_get.call_count, 2)
+        with patch.object(otro.session, 'get', return_value=self._respuesta_nominatim(self.mock_geocoding_data)), \
+                patch('app.facade.geocodificacion.time.time', return_value=10 ** 11):
+            self.assertFalse(otro._no_encontrada("atlantida"))
+            self.assertEqual(otro.resolver("Atlántida"), (40.4, -3.7))
+    
+    def test_error_de_nominatim_no_cuenta_como_no_encontrada(self):
+        geocodificador = Geocodificador(intervalo_minimo=0)
+        with patch.object(geocodificador.session, 'get', side_effect=requests.ConnectionError("caída")):
+            self.assertEqual(geocodificador.resolver("Madrid"), (None, None))
+        with patch.object(geocodificador.session, 'get', return_value=self._respuesta_nominatim(self.mock_geocoding_data)):
+            self.assertEqual(geocodificador.resolver("Madrid"), (40.4, -3.7))
+    
+    @patch('app.facade.geocodificacion.time.sleep')
+    def test_limite_de_peticiones_nominatim(self, mock_sleep):
+        geocodificador = Geocodificador(intervalo_minimo=1.0)
+        with patch.object(geocodificador.session, 'get', return_value=self._respuesta_nominatim(self.mock_geocoding_data)):
+            geocodificador.resolver("Madrid")
+            geocodificador.resolver("Bilbao")
+        # La segunda petición espera para no superar 1 petición por segundo
+        self.assertEqual(mock_sleep.call_count, 1)
+        self.assertGreater(mock_sleep.call_args[0][0], 0.9)
+    
+    def test_resolver_lote(self):
+        geocodificador = Geocodificador(intervalo_minimo=0)
+        with patch.object(geocodificador.session, 'get', return_value=self._respuesta_nominatim(self.mock_geocoding_data)) as mock_get:
+            resultados = geocodificador.resolver_lote(["Madrid", "madrid", "MADRID"])
+        self.assertEqual(resultados, {"Madrid": (40.4, -3.7), "madrid": (40.4, -3.7), "MADRID": (40.4, -3.7)})
+        self.assertEqual(mock_get.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,7 @@ from flask import Flask
 from app.api.routes import api
 from app.ui.interfaz import ui
 from app.facade.aireYClimaFacade import AireYClimaFacade
+from app.servicios import fachada, geocodificador
 
 class TestIntegration(unittest.TestCase):
     
@@ -15,8 +16,15 @@ class TestIntegration(unittest.TestCase):
         self.app.register_blueprint(ui)
         self.client = self.app.test_client()
         
-        # Crear instancia real de la fachada
-        self.fachada = AireYClimaFacade()
+        # Usar la instancia compartida de la fachada, con la caché vacía
+        self.fachada = fachada
+        self.fachada.cache.limpiar()
+        self.fachada.almacen.limpiar()
+        geocodificador.limpiar()
+        # Sin espera entre peticiones simuladas a la API de geocodificación
+        patcher = patch.object(geocodificador, 'intervalo_minimo', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
         
         # Datos simulados para respuestas de API externas
         self.mock_weather_data = {
@@ -42,101 +50,85 @@ class TestIntegration(unittest.TestCase):
             }
         ]
     
-    @patch('app.ui.interfaz.requests.get')
+    def _mock_geocodificacion(self, *args, **kwargs):
+        """Respuesta simulada de la API de geocodificación"""
+        mock_geocoding_response = Mock()
+        mock_geocoding_response.status_code = 200
+        mock_geocoding_response.text = json.dumps(self.mock_geocoding_data)
+        mock_geocoding_response.content = mock_geocoding_response.text.encode()
+        mock_geocoding_response.json.return_value = self.mock_geocoding_data
+        return mock_geocoding_response
+    
+    def _mock_apis_externas(self, respuestas):
+        """Devuelve un side_effect que responde según la API externa consultada"""
+        def responder(url, *args, **kwargs):
+            mock_response = Mock()
+            mock_response.status_code = 200
+            mock_response.json.return_value = respuestas[url]
+            mock_response.content = json.dumps(respuestas[url]).encode()
+            return mock_response
+        return responder
+    
+    @patch.object(geocodificador.session, 'get')
     def test_flujo_completo_consulta_actual(self, mock_requests):
         """Prueba de integración para el flujo completo de consulta de datos actuales"""
         
-        # Configurar mock para todas las respuestas HTTP
-        def mock_response_generator(*args, **kwargs):
-            url = args[0] if args else kwargs.get('url', '')
-            
-            # Crear respuesta para la API de geocodificación
-            if 'nominatim.openstreetmap.org' in url:
-                mock_geocoding_response = Mock()
-                mock_geocoding_response.status_code = 200
-                mock_geocoding_response.text = json.dumps(self.mock_geocoding_data)
-                mock_geocoding_response.json.return_value = self.mock_geocoding_data
-                return mock_geocoding_response
-            
-            # Crear respuesta para la API interna de aire-clima
-            elif '/api/aire-clima/actual' in url:
-                mock_api_response = Mock()
-                mock_api_response.status_code = 200
-                mock_api_response.json.return_value = {
-                    "weather": self.mock_weather_data,
-                    "air_quality": self.mock_air_quality_data
-                }
-                return mock_api_response
-            
-            # Respuesta predeterminada para cualquier otra URL
-            default_response = Mock()
-            default_response.status_code = 404
-            return default_response
-        
-        # Configurar el comportamiento del mock para responder según la URL
-        mock_requests.side_effect = mock_response_generator
+        # La interfaz geocodifica y consulta la fachada compartida en el mismo proceso
+        mock_requests.side_effect = self._mock_geocodificacion
+        respuestas = {
+            self.fachada.weather_api_url: self.mock_weather_data,
+            self.fachada.air_quality_api_url: self.mock_air_quality_data
+        }
         
-        # Realizar la solicitud a través de la interfaz web
-        response = self.client.get('/?ciudad=Madrid')
+        with patch.object(self.fachada.session, 'get', side_effect=self._mock_apis_externas(respuestas)):
+            # Realizar la solicitud a través de la interfaz web
+            response = self.client.get('/?ciudad=Madrid')
         
         # Verificar la respuesta
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'Temperatura: 23.5', response.data)
         self.assertIn(b'PM10: 15.2', response.data)
         self.assertIn(b'PM2.5: 8.4', response.data)
+        
+        # Solo se consulta la geocodificación: no hay llamada HTTP a la propia API
+        self.assertEqual(mock_requests.call_count, 1)
+        
+        # La API expone los mismos datos, ya en caché
+        response = self.client.get('/api/aire-clima/actual?latitude=40.4&longitude=-3.7')
+        self.assertEqual(json.loads(response.data)["weather"], self.mock_weather_data)
     
-    @patch('app.ui.interfaz.requests.get')
+    @patch.object(geocodificador.session, 'get')
     def test_flujo_completo_datos_historicos(self, mock_requests):
         """Prueba de integración para el flujo completo de consulta de datos históricos"""
         
-        # Configurar mock para todas las respuestas HTTP
-        def mock_response_generator(*args, **kwargs):
-            url = args[0] if args else kwargs.get('url', '')
-            
-            # Crear respuesta para la API de geocodificación
-            if 'nominatim.openstreetmap.org' in url:
-                mock_geocoding_response = Mock()
-                mock_geocoding_response.status_code = 200
-                mock_geocoding_response.text = json.dumps(self.mock_geocoding_data)
-                mock_geocoding_response.json.return_value = self.mock_geocoding_data
-                return mock_geocoding_response
-            
-            # Crear respuesta para la API interna de datos históricos
-            elif '/api/aire-clima/historico' in url:
-                mock_api_response = Mock()
-                mock_api_response.status_code = 200
-                mock_api_response.json.return_value = {
-                    "informe": {
-                        "temperatura": {
-                            "max_promedio": 25.4,
-                            "min_promedio": 15.4
-                        },
-                        "calidad_aire": {
-                            "pm10_promedio": 20.1,
-                            "pm25_promedio": 12.3
-                        },
-                        "tendencias": {},
-                        "recomendaciones": ["Recomendación de prueba"]
-                    }
+        mock_requests.side_effect = self._mock_geocodificacion
+        respuestas = {
+            self.fachada.weather_api_url: {
+                "daily": {
+                    "time": ["2023-05-15", "2023-05-16", "2023-05-17", "2023-05-18"],
+                    "temperature_2m_max": [31.0, 24.8, 26.2, 27.0],
+                    "temperature_2m_min": [15.1, 14.9, 16.2, 15.5]
                 }
-                return mock_api_response
-            
-            # Respuesta predeterminada para cualquier otra URL
-            default_response = Mock()
-            default_response.status_code = 404
-            return default_response
-        
-        # Configurar el comportamiento del mock para responder según la URL
-        mock_requests.side_effect = mock_response_generator
+            },
+            self.fachada.air_quality_api_url: {
+                "hourly": {
+                    "pm10": [20.1] * 96,
+                    "pm2_5": [12.3] * 96
+                }
+            }
+        }
         
-        # Realizar la solicitud a través de la interfaz web
-        response = self.client.get('/historico?ciudad=Madrid&dias=7')
+        with patch.object(self.fachada.session, 'get', side_effect=self._mock_apis_externas(respuestas)):
+            # Realizar la solicitud a través de la interfaz web
+            response = self.client.get('/historico?ciudad=Madrid&dias=7')
         
         # Verificar la respuesta
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'Madrid', response.data)
-        # Verificamos solo que contenga el texto "recomendación" en lugar de "informe" ya que sabemos que las recomendaciones se muestran en la página
-        self.assertIn('recomendación', response.data.decode('utf-8').lower())
+        # El informe se calcula con los datos reales de la fachada: la máxima de 31°C genera su recomendación
+        self.assertIn('recomendaciones', response.data.decode('utf-8').lower())
+        self.assertIn('temperaturas altas', response.data.decode('utf-8'))
+        self.assertEqual(mock_requests.call_count, 1)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
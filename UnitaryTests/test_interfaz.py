@@ -3,7 +3,8 @@ from unittest.mock import patch, Mock
 from flask import Flask, template_rendered
 import json
 from contextlib import contextmanager
-from app.ui.interfaz import ui, calcular_calidad_aire, obtener_coordenadas
+from app.ui.interfaz import ui, calcular_calidad_aire, obtener_coordenadas, fragmentos
+from app.servicios import geocodificador
 
 @contextmanager
 def captured_templates(app):
@@ -24,6 +25,8 @@ class TestInterfaz(unittest.TestCase):
         self.app = Flask(__name__)
         self.app.register_blueprint(ui)
         self.client = self.app.test_client()
+        geocodificador.limpiar()
+        fragmentos.limpiar()
         
         # Datos simulados para las respuestas
         self.mock_clima_response = {
@@ -82,12 +85,32 @@ class TestInterfaz(unittest.TestCase):
             # Verificar que se llamó al método con la ciudad correcta
             mock_obtener_datos_clima.assert_called_once_with('Madrid')
     
-    @patch('app.ui.interfaz.requests.get')
+    @patch('app.ui.interfaz.obtener_datos_clima')
+    def test_interfaz_reutiliza_pagina(self, mock_obtener_datos_clima):
+        mock_obtener_datos_clima.return_value = dict(self.mock_clima_response, frescura={
+            "weather": {"edad": 5, "obsoleto": False, "actualizado": 1684584000.0},
+            "air_quality": {"edad": 5, "obsoleto": False, "actualizado": 1684584000.0}
+        })
+        
+        with captured_templates(self.app) as templates:
+            primera = self.client.get('/?ciudad=Madrid')
+            segunda = self.client.get('/?ciudad=Madrid')
+            # Mismos datos: la segunda petición no vuelve a renderizar la plantilla
+            self.assertEqual(len(templates), 1)
+        self.assertEqual(primera.data, segunda.data)
+        self.assertIn("max-age=60", segunda.headers["Cache-Control"])
+        
+        response = self.client.get('/?ciudad=Madrid', headers={"If-None-Match": primera.headers["ETag"]})
+        self.assertEqual(response.status_code, 304)
+    
+    @patch.object(geocodificador, 'intervalo_minimo', 0)
+    @patch.object(geocodificador.session, 'get')
     def test_obtener_coordenadas(self, mock_requests_get):
         # Configurar la respuesta simulada
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.text = json.dumps(self.mock_geocoding_data)
+        mock_response.content = mock_response.text.encode()
         mock_response.json.return_value = self.mock_geocoding_data
         mock_requests_get.return_value = mock_response
         
@@ -103,24 +126,24 @@ class TestInterfaz(unittest.TestCase):
         lat, lon = obtener_coordenadas("CiudadInexistente")
         self.assertIsNone(lat)
         self.assertIsNone(lon)
+        
+        # Una ciudad ya resuelta no vuelve a consultar la API de geocodificación
+        self.assertEqual(obtener_coordenadas("madrid"), (40.4, -3.7))
+        self.assertEqual(mock_requests_get.call_count, 2)
     
     @patch('app.ui.interfaz.obtener_coordenadas')
-    @patch('app.ui.interfaz.requests.get')
-    def test_mostrar_historico(self, mock_requests_get, mock_obtener_coordenadas):
+    @patch('app.ui.interfaz.fachada.analizar_tendencias')
+    @patch('app.ui.interfaz.fachada.obtener_datos_historicos')
+    def test_mostrar_historico(self, mock_obtener_datos_historicos, mock_analizar_tendencias, mock_obtener_coordenadas):
         # Configurar los mocks
         mock_obtener_coordenadas.return_value = (40.4, -3.7)
-        
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "informe": {
-                "temperatura": {"max_promedio": 25.4},
-                "calidad_aire": {"pm10_promedio": 20.1},
-                "tendencias": {},
-                "recomendaciones": ["Recomendación de prueba"]
-            }
+        mock_obtener_datos_historicos.return_value = {"weather_historical": {}, "air_quality_historical": {}}
+        mock_analizar_tendencias.return_value = {
+            "temperatura": {"max_promedio": 25.4},
+            "calidad_aire": {"pm10_promedio": 20.1},
+            "tendencias": {},
+            "recomendaciones": ["Recomendación de prueba"]
         }
-        mock_requests_get.return_value = mock_response
         
         # Capturar la plantilla renderizada
         with captured_templates(self.app) as templates:
@@ -136,6 +159,10 @@ class TestInterfaz(unittest.TestCase):
             self.assertEqual(context['ciudad'], 'Madrid')
             self.assertEqual(context['dias'], 7)
             self.assertIn('informe', context)
+            
+            # La interfaz llama a la fachada en el mismo proceso, sin petición HTTP interna
+            mock_obtener_datos_historicos.assert_called_once_with(40.4, -3.7, 7)
+            mock_analizar_tendencias.assert_called_once_with(mock_obtener_datos_historicos.return_value)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
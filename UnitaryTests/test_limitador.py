@@ -0,0 +1,148 @@
+import unittest
+from unittest.mock import patch, Mock
+import asyncio
+import json
+import threading
+import time
+from app.facade.aireYClimaFacade import AireYClimaFacade
+from app.facade.limitador import (FONDO, INTERACTIVA, LOTE, CuotaAgotada, LimiteSuperado, Limitador,
+                                  PlanificadorSalida, con_prioridad, prioridad_actual)
+
+class TestLimitador(unittest.TestCase):
+
+    def test_rafaga_y_ritmo(self):
+        limitador = Limitador("prueba", por_segundo=20, rafaga=2)
+        inicio = time.monotonic()
+        for _ in range(4):
+            limitador.adquirir()
+        # Las dos primeras salen de la ráfaga; las otras dos esperan su ficha
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.09)
+        self.assertEqual(limitador.estadisticas()["enviadas"], 4)
+
+    def test_prioridad_en_la_cola(self):
+        limitador = Limitador("prueba", por_segundo=10, rafaga=1)
+        limitador.adquirir()
+        orden = []
+
+        def esperar(prioridad):
+            limitador.adquirir(prioridad)
+            orden.append(prioridad)
+
+        hilos = [threading.Thread(target=esperar, args=(FONDO,))]
+        hilos[0].start()
+        while limitador.estadisticas()["en_cola"] < 1:
+            time.sleep(0.001)
+        # La consulta interactiva llega después pero se atiende antes
+        hilos.append(threading.Thread(target=esperar, args=(INTERACTIVA,)))
+        hilos[1].start()
+        for hilo in hilos:
+            hilo.join(5)
+        self.assertEqual(orden, [INTERACTIVA, FONDO])
+
+    def test_plazo_y_cola_acotada(self):
+        limitador = Limitador("prueba", por_segundo=1, rafaga=1)
+        limitador.adquirir()
+        # La siguiente ficha no llegaría dentro del plazo: se rechaza sin esperar
+        inicio = time.monotonic()
+        with self.assertRaises(LimiteSuperado) as contexto:
+            limitador.adquirir(plazo=0.1)
+        self.assertLess(time.monotonic() - inicio, 0.1)
+        self.assertGreater(contexto.exception.reintentar_en, 0.9)
+        
+        # Con la cola llena ni siquiera se espera turno
+        sin_cola = Limitador("prueba", por_segundo=1, rafaga=1, max_cola=0)
+        sin_cola.adquirir()
+        self.assertRaises(LimiteSuperado, sin_cola.adquirir)
+        self.assertEqual(sin_cola.estadisticas(), {"enviadas": 1, "rechazadas": 1, "en_cola": 0, "cuota_usada": 1})
+
+    def test_cuota_diaria_reservada_a_los_usuarios(self):
+        limitador = Limitador("prueba", cuota_diaria=10, reserva_interactiva=0.2)
+        for _ in range(8):
+            limitador.adquirir(LOTE)
+        # El último 20 % de la cuota queda para las peticiones interactivas
+        self.assertRaises(CuotaAgotada, limitador.adquirir, FONDO)
+        limitador.adquirir(INTERACTIVA)
+        limitador.devolver()
+        limitador.adquirir(INTERACTIVA)
+        limitador.adquirir(INTERACTIVA)
+        with self.assertRaises(CuotaAgotada) as contexto:
+            limitador.adquirir(INTERACTIVA)
+        self.assertLessEqual(contexto.exception.reintentar_en, 24 * 60 * 60)
+        self.assertEqual(limitador.estadisticas()["cuota_restante"], 0)
+
+    def test_frenar_tras_429(self):
+        limitador = Limitador("prueba", por_segundo=100, rafaga=5)
+        limitador.frenar(2)
+        self.assertRaises(LimiteSuperado, limitador.adquirir, plazo=1)
+
+    def test_adquirir_async_y_contexto(self):
+        limitador = Limitador("prueba", por_segundo=20, rafaga=1)
+
+        async def principal():
+            with con_prioridad(LOTE):
+                self.assertEqual(prioridad_actual(), LOTE)
+                await asyncio.gather(*(limitador.adquirir_async() for _ in range(3)))
+            return prioridad_actual()
+
+        inicio = time.monotonic()
+        self.assertEqual(asyncio.run(principal()), INTERACTIVA)
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.09)
+        self.assertEqual(limitador.estadisticas()["en_cola"], 0)
+
+
+class TestFachadaConLimites(unittest.TestCase):
+
+    def setUp(self):
+        limites = {host: {"cuota_diaria": 2, "reserva_interactiva": 0.5}
+                   for host in ("api.open-meteo.com", "air-quality-api.open-meteo.com")}
+        self.facade = AireYClimaFacade(planificador=PlanificadorSalida(limites))
+        datos = {"hourly": {"pm10": [10.0], "pm2_5": [5.0]}}
+        respuesta = Mock(status_code=200, content=json.dumps(datos).encode(), **{"json.return_value": datos})
+        patcher = patch.object(self.facade.session, 'get', return_value=respuesta)
+        self.mock_get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_precalentamiento_no_gasta_la_cuota_de_los_usuarios(self):
+        self.assertEqual(self.facade.precalentar(40.4, -3.7), 2)
+        # La mitad de la cuota que queda es solo para consultas interactivas
+        self.assertRaises(CuotaAgotada, self.facade.precalentar, 43.3, -2.9)
+        self.facade.recoger_ultimo_dato(41.6, -0.9)
+        self.assertEqual(self.mock_get.call_count, 4)
+
+        # Agotada la cuota, se sigue respondiendo desde la caché
+        self.assertEqual(self.facade.recoger_ultimo_dato(40.4, -3.7)["air_quality"]["hourly"]["pm10"], [10.0])
+        self.assertRaises(CuotaAgotada, self.facade.recoger_ultimo_dato, 39.5, -0.4)
+        lote = self.facade.recoger_ultimos_datos_lote([(40.4, -3.7), (37.4, -6.0)])
+        self.assertEqual(lote[0]["weather"]["hourly"]["pm10"], [10.0])
+        self.assertEqual(lote[1]["weather"], {})
+        self.assertEqual(self.mock_get.call_count, 4)
+
+    def test_429_pasa_por_el_limitador(self):
+        facade = AireYClimaFacade(plazo=1)
+        # urllib3 no reintenta por su cuenta las respuestas de sobrecarga
+        retry = facade.session.get_adapter("https://").max_retries
+        self.assertNotIn(429, retry.status_forcelist)
+        self.assertNotIn(503, retry.status_forcelist)
+
+        datos = {"current_weather": {"temperature": 20.0}}
+        sobrecarga = Mock(status_code=429, content=b"", headers={"Retry-After": "0.1"})
+        correcta = Mock(status_code=200, content=json.dumps(datos).encode(), headers={}, **{"json.return_value": datos})
+        limitador = facade.planificador.para(facade.weather_api_url)
+        with patch.object(facade.session, 'get', side_effect=[sobrecarga, correcta]) as mock_get:
+            inicio = time.monotonic()
+            self.assertEqual(facade._obtener_json(facade.weather_api_url, {}), datos)
+        # El reintento espera la pausa y gasta otra ficha y otra petición de la cuota
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.09)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(limitador.estadisticas()["cuota_usada"], 2)
+
+        # Una pausa más larga que el plazo no se espera: se rechaza enseguida
+        sobrecarga.headers = {"Retry-After": "120"}
+        with patch.object(facade.session, 'get', return_value=sobrecarga) as mock_get:
+            with self.assertRaises(LimiteSuperado) as contexto:
+                facade._obtener_json(facade.weather_api_url, {})
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertGreater(contexto.exception.reintentar_en, 100)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import patch, Mock
+import base64
+import json
+import struct
+import zlib
+import numpy as np
+from app.facade.aireYClimaFacade import AireYClimaFacade
+from app.facade.malla import CATEGORIAS_CALIDAD, Malla, clasificar_calidad, codificar_png, leer_bbox
+from app.servicios import fachada
+from app.ui.interfaz import calcular_calidad_aire
+from main import create_app
+
+MADRID = (-3.9, 40.3, -3.5, 40.5)
+
+def responder(url, params=None, **kwargs):
+    """Open-Meteo multi-coordenada: PM10 crece hacia el este y la fila de 40.3 no tiene calidad del aire"""
+    coordenadas = list(zip(params["latitude"].split(","), params["longitude"].split(",")))
+    if "current_weather" in params:
+        datos = [{"current_weather": {"temperature": float(lat)}} for lat, _ in coordenadas]
+    else:
+        datos = [{"hourly": {"pm10": [None if lat == "40.3" else (float(lon) + 4) * 400], "pm2_5": [1.0]}}
+                 for lat, lon in coordenadas]
+    datos = datos if len(datos) > 1 else datos[0]
+    return Mock(status_code=200, headers={}, content=json.dumps(datos).encode(), **{"json.return_value": datos})
+
+class TestClasificacion(unittest.TestCase):
+
+    def test_mismos_umbrales_que_la_interfaz(self):
+        valores = [0, 10, 15, 16, 25, 26, 50, 51, 75, 76, 100, 101, 150, 151, 300]
+        pm10, pm2_5 = np.meshgrid(np.array(valores, dtype=float), np.array(valores, dtype=float))
+        calidad = clasificar_calidad(pm10, pm2_5)
+        for codigo, a, b in zip(calidad.ravel(), pm10.ravel(), pm2_5.ravel()):
+            self.assertEqual(CATEGORIAS_CALIDAD[codigo], calcular_calidad_aire(a, b), (a, b))
+        self.assertEqual(clasificar_calidad([np.nan, 10.0], [1.0, np.nan]).tolist(), [0, 0])
+
+    def test_leer_bbox(self):
+        self.assertEqual(leer_bbox("-3.9,40.3,-3.5,40.5"), MADRID)
+        for valor in ("", "-3.9,40.3,-3.5", "a,b,c,d", "-3.5,40.3,-3.9,40.5", "0,-91,1,0"):
+            self.assertRaises(ValueError, leer_bbox, valor)
+
+    def test_png(self):
+        indices = np.array([[0, 1, 2], [3, 4, 5]], dtype=np.uint8)
+        png = codificar_png(indices, [(i, i, i, 255) for i in range(6)])
+        self.assertTrue(png.startswith(b"\x89PNG\r\n\x1a\n"))
+        self.assertEqual(struct.unpack(">II", png[16:24]), (3, 2))
+        inicio = png.index(b"IDAT") + 4
+        longitud = struct.unpack(">I", png[inicio - 8:inicio - 4])[0]
+        crudo = zlib.decompress(png[inicio:inicio + longitud])
+        self.assertEqual(crudo, b"\x00\x00\x01\x02\x00\x03\x04\x05")
+
+
+class TestMalla(unittest.TestCase):
+
+    def setUp(self):
+        self.facade = AireYClimaFacade()
+
+    def test_una_peticion_en_lote_por_api(self):
+        malla = Malla(MADRID, 0.05, self.facade.cache.ajustar)
+        self.assertEqual((malla.filas, malla.columnas), (5, 9))
+        self.assertEqual(malla.latitudes[0], 40.5)
+        with patch.object(self.facade.session, 'get', side_effect=responder) as mock_get:
+            malla.rellenar(self.facade.recoger_datos_celdas(malla.celdas))
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(malla.calidad.shape, (5, 9))
+
+        # Cada nodo tiene los datos y la calidad de su celda de la caché
+        ajustar = self.facade.cache.ajustar
+        for i, latitude in enumerate(malla.latitudes.tolist()):
+            for j, longitude in enumerate(malla.longitudes.tolist()):
+                celda = (ajustar(latitude), ajustar(longitude))
+                self.assertEqual(malla.temperatura[i, j], celda[0])
+                esperada = "Datos no disponibles" if celda[0] == 40.3 else calcular_calidad_aire((celda[1] + 4) * 400, 1.0)
+                self.assertEqual(CATEGORIAS_CALIDAD[malla.calidad[i, j]], esperada)
+
+        # Con la caché caliente no se sale a la red
+        with patch.object(self.facade.session, 'get') as mock_get:
+            otra = Malla(MADRID, 0.02, self.facade.cache.ajustar)
+            otra.rellenar(self.facade.recoger_datos_celdas(otra.celdas))
+        mock_get.assert_not_called()
+        self.assertEqual(otra.calidad.shape, (11, 21))
+
+
+class TestEndpointMalla(unittest.TestCase):
+
+    def setUp(self):
+        fachada.cache.limpiar()
+        self.client = create_app({"PRECALENTAR": False}).test_client()
+        patcher = patch.object(fachada.session, 'get', side_effect=responder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_json(self):
+        respuesta = self.client.get('/api/aire-clima/malla?bbox=-3.9,40.3,-3.5,40.5&resolucion=0.1')
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.get_json()
+        self.assertEqual((datos["filas"], datos["columnas"], datos["norte"], datos["oeste"]), (3, 5, 40.5, -3.9))
+        calidad = np.frombuffer(base64.b64decode(datos["calidad"]), dtype=datos["tipos"]["calidad"]).reshape(3, 5)
+        self.assertEqual([datos["categorias"][codigo] for codigo in calidad[0]],
+                         ["Buena", "Media", "Algo mala", "Mala calidad", "Mala calidad"])
+        self.assertEqual(calidad[2].tolist(), [0] * 5)
+        temperatura = np.frombuffer(base64.b64decode(datos["temperatura"]), dtype="<f4").reshape(3, 5)
+        self.assertAlmostEqual(temperatura[1, 0], 40.4, places=4)
+
+    def test_png(self):
+        respuesta = self.client.get('/api/aire-clima/malla?bbox=-3.9,40.3,-3.5,40.5&formato=png')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.mimetype, "image/png")
+        self.assertEqual(struct.unpack(">II", respuesta.data[16:24]), (5, 3))
+        self.assertIn("ETag", respuesta.headers)
+
+    def test_parametros_no_validos(self):
+        for query in ("", "bbox=norte", "bbox=-3.9,40.3,-3.5,40.5&resolucion=0",
+                      "bbox=-3.9,40.3,-3.5,40.5&formato=gif", "bbox=-10,35,5,45&resolucion=0.001",
+                      "bbox=-180,-90,180,90&resolucion=1"):
+            self.assertEqual(self.client.get('/api/aire-clima/malla?' + query).status_code, 400, query)
+
+if __name__ == '__main__':
+    unittest.main()
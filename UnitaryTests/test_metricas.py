@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import patch, Mock
+import json
+from app.metricas import LIMITES_BYTES, RegistroMetricas
+from app.servicios import fachada
+from main import create_app
+
+class TestMetricas(unittest.TestCase):
+
+    def test_histograma_acumulado(self):
+        registro = RegistroMetricas()
+        for valor in (0.002, 0.02, 0.02, 30):
+            registro.observar("latencia_segundos", valor, api="clima")
+        registro.incrementar("respuestas_total", api="clima", codigo=200)
+
+        texto = registro.exportar()
+        self.assertIn("# TYPE latencia_segundos histogram", texto)
+        self.assertIn('latencia_segundos_bucket{api="clima",le="0.0025"} 1', texto)
+        self.assertIn('latencia_segundos_bucket{api="clima",le="0.025"} 3', texto)
+        self.assertIn('latencia_segundos_bucket{api="clima",le="10.0"} 3', texto)
+        self.assertIn('latencia_segundos_bucket{api="clima",le="+Inf"} 4', texto)
+        self.assertIn('latencia_segundos_count{api="clima"} 4', texto)
+        self.assertIn('respuestas_total{api="clima",codigo="200"} 1', texto)
+
+    def test_fuentes_y_en_curso(self):
+        registro = RegistroMetricas()
+        registro.registrar_fuente("cache", lambda: {"aciertos": 3, "fallos": 1}, cache="prueba")
+        registro.registrar_fuente("disyuntor", lambda: {"estado": "abierto"}, api="clima")
+        with registro.en_curso("llamadas_en_curso"):
+            self.assertIn("llamadas_en_curso 1", registro.exportar())
+
+        texto = registro.exportar()
+        self.assertIn("llamadas_en_curso 0", texto)
+        self.assertIn('aire_clima_cache_ratio_aciertos{cache="prueba"} 0.75', texto)
+        self.assertIn('aire_clima_disyuntor_estado{api="clima",estado="abierto"} 1', texto)
+
+
+class TestEndpointMetricas(unittest.TestCase):
+
+    def setUp(self):
+        fachada.cache.limpiar()
+        self.app = create_app({"PRECALENTAR": False, "SERVER_TIMING": True})
+        self.client = self.app.test_client()
+
+    def _respuesta(self, url, *args, **kwargs):
+        datos = {"current_weather": {"temperature": 20.0}} if url == fachada.weather_api_url else \
+            {"hourly": {"pm10": [10.0], "pm2_5": [5.0]}}
+        return Mock(status_code=200, content=json.dumps(datos).encode(), **{"json.return_value": datos})
+
+    def test_server_timing_y_metrics(self):
+        with patch.object(fachada.session, 'get', side_effect=self._respuesta):
+            respuesta = self.client.get('/api/aire-clima/actual?latitude=12.3&longitude=45.6')
+
+        self.assertEqual(respuesta.status_code, 200)
+        etapas = [etapa.split(";")[0] for etapa in respuesta.headers["Server-Timing"].split(", ")]
+        self.assertEqual(etapas, ["apis", "serializacion", "total"])
+
+        texto = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('aire_clima_upstream_segundos_count{api="clima"}', texto)
+        self.assertIn('aire_clima_upstream_bytes_bucket{api="calidad_aire",le="%s"}' % LIMITES_BYTES[0], texto)
+        self.assertIn('aire_clima_tramo_segundos_count{tramo="apis"}', texto)
+        self.assertIn('aire_clima_peticiones_total{codigo="200",endpoint="api.obtener_dato_actual"}', texto)
+        self.assertIn('aire_clima_cache_aciertos_total{cache="respuestas"}', texto)
+        self.assertIn('aire_clima_disyuntor_estado{api="nominatim",estado="cerrado"} 1', texto)
+
+    def test_familias_contiguas_en_metrics(self):
+        texto = self.client.get('/metrics').get_data(as_text=True)
+        tipos, vistas, actual = {}, [], None
+        for linea in texto.splitlines():
+            if linea.startswith("# TYPE "):
+                _, _, nombre, tipo = linea.split(" ")
+                self.assertNotIn(nombre, tipos, "TYPE repetido")
+                tipos[nombre], actual = tipo, nombre
+                vistas.append(nombre)
+            elif linea and not linea.startswith("#"):
+                muestra = linea.split("{")[0].split(" ")[0]
+                familia = actual if tipos[actual] != "histogram" else muestra.rsplit("_", 1)[0]
+                # Cada muestra pertenece a la familia de la última línea TYPE
+                self.assertEqual(familia, actual, linea)
+
+        # Las tres cachés registradas van en una sola familia, como contador
+        self.assertEqual(tipos["aire_clima_cache_aciertos_total"], "counter")
+        self.assertEqual(tipos["aire_clima_cache_ratio_aciertos"], "gauge")
+        self.assertEqual(tipos["aire_clima_limitador_enviadas_total"], "counter")
+        self.assertEqual(tipos["aire_clima_coalescencia_coalescidas_total"], "counter")
+        self.assertEqual(tipos["aire_clima_disyuntor_fallos"], "gauge")
+        for cache in ("respuestas", "geocodificacion", "paginas"):
+            self.assertIn('aire_clima_cache_aciertos_total{cache="%s"}' % cache, texto)
+
+    def test_sin_server_timing_por_defecto(self):
+        self.app.config["SERVER_TIMING"] = False
+        self.assertNotIn("Server-Timing", self.client.get('/metrics').headers)
+
+if __name__ == '__main__':
+    unittest.main()
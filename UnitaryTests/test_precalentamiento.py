@@ -0,0 +1,85 @@
+import unittest
+from unittest.mock import patch, Mock
+import threading
+from app.facade.aireYClimaFacade import AireYClimaFacade
+from app.facade.precalentamiento import ContadorFrecuentes, Precalentador
+
+class TestContadorFrecuentes(unittest.TestCase):
+    
+    def test_frecuentes_sobreviven_a_consultas_puntuales(self):
+        contador = ContadorFrecuentes(capacidad=5)
+        for i in range(200):
+            contador.registrar("madrid")
+            if i % 2 == 0:
+                contador.registrar("vitoria")
+            # Muchas consultas distintas que solo aparecen una vez
+            contador.registrar(f"puntual-{i}")
+        
+        self.assertEqual(contador.mas_frecuentes(2), ["madrid", "vitoria"])
+        self.assertEqual(len(contador.mas_frecuentes(10)), 5)
+
+class TestPrecalentador(unittest.TestCase):
+    
+    def setUp(self):
+        self.fachada = AireYClimaFacade()
+        respuesta = Mock(status_code=200, content=b'{"datos": [1.0]}')
+        respuesta.json.return_value = {"datos": [1.0]}
+        patcher = patch.object(self.fachada.session, 'get', return_value=respuesta)
+        self.mock_get = patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_ubicaciones_fijas(self):
+        precalentador = Precalentador(self.fachada, ubicaciones_fijas=[(40.4, -3.7)], antelacion=60)
+        
+        # Datos actuales e históricos: dos peticiones de cada tipo
+        self.assertEqual(precalentador.ciclo(), 4)
+        # Las entradas siguen vigentes: no se vuelve a pedir nada
+        self.assertEqual(precalentador.ciclo(), 0)
+        self.assertEqual(self.mock_get.call_count, 4)
+        
+        # Una consulta de usuario ya no sale a la red
+        self.fachada.recoger_ultimo_dato(40.4, -3.7)
+        self.assertEqual(self.mock_get.call_count, 4)
+    
+    def test_refresca_antes_de_caducar(self):
+        precalentador = Precalentador(self.fachada, ubicaciones_fijas=[(40.4, -3.7)], antelacion=60)
+        precalentador.ciclo()
+        
+        # Con una antelación mayor que el TTL del tiempo actual (15 min) y menor que el
+        # de las series horarias (1 h) solo se renueva el tiempo actual
+        precalentador.antelacion = 20 * 60
+        self.assertEqual(precalentador.ciclo(), 1)
+        self.assertEqual(precalentador.peticiones, 5)
+    
+    def test_consultas_frecuentes(self):
+        with patch.object(self.fachada, '_obtener_en_paralelo', return_value=[{}, {}]):
+            for _ in range(3):
+                self.fachada.recoger_ultimo_dato(43.26, -2.93)
+            self.fachada.obtener_datos_historicos(42.85, -2.67, 30)
+        
+        precalentador = Precalentador(self.fachada, ubicaciones_fijas=[(40.4, -3.7)], dias=7)
+        self.assertEqual(precalentador.consultas(), [
+            ("actual", 40.4, -3.7),
+            ("historico", 40.4, -3.7, 7),
+            ("actual", 43.3, -2.9),
+            ("historico", 42.8, -2.7, 30)
+        ])
+    
+    def test_presupuesto_de_peticiones(self):
+        # 2 peticiones por minuto en ciclos de un minuto: solo cabe la primera ubicación
+        precalentador = Precalentador(self.fachada, ubicaciones_fijas=[(40.4, -3.7), (43.26, -2.93)],
+                                      peticiones_minuto=2, intervalo=60)
+        self.assertEqual(precalentador.ciclo(), 2)
+        self.assertEqual(self.mock_get.call_count, 2)
+    
+    def test_iniciar_y_detener(self):
+        precalentador = Precalentador(self.fachada, intervalo=3600)
+        ejecutado = threading.Event()
+        with patch.object(precalentador, 'ciclo', side_effect=lambda: ejecutado.set()):
+            precalentador.iniciar()
+            self.assertTrue(ejecutado.wait(5))
+            precalentador.detener()
+        self.assertIsNone(precalentador._hilo)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import patch
+from app.facade.resiliencia import CircuitoAbierto, Disyuntor
+
+class TestDisyuntor(unittest.TestCase):
+    
+    def setUp(self):
+        self.disyuntor = Disyuntor("API de prueba", umbral_fallos=3, tiempo_apertura=30)
+    
+    def test_se_abre_tras_fallos_consecutivos(self):
+        for _ in range(2):
+            self.disyuntor.permitir()
+            self.disyuntor.fallo()
+        # Un éxito reinicia la cuenta de fallos
+        self.disyuntor.exito()
+        for _ in range(2):
+            self.disyuntor.fallo()
+        self.assertEqual(self.disyuntor.estado, Disyuntor.CERRADO)
+        
+        self.disyuntor.fallo()
+        self.assertEqual(self.disyuntor.estado, Disyuntor.ABIERTO)
+        self.assertRaises(CircuitoAbierto, self.disyuntor.permitir)
+    
+    def test_registrar_estado_http(self):
+        for estado in (500, 503, 429):
+            self.disyuntor.registrar(estado)
+        self.assertEqual(self.disyuntor.estado, Disyuntor.ABIERTO)
+        
+        # Los errores del cliente (4xx) no son fallos del servicio
+        disyuntor = Disyuntor("API de prueba", umbral_fallos=1)
+        disyuntor.registrar(400)
+        disyuntor.registrar(404)
+        self.assertEqual(disyuntor.estado, Disyuntor.CERRADO)
+    
+    @patch('app.facade.resiliencia.time.monotonic')
+    def test_semiabierto_tras_tiempo_apertura(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        for _ in range(3):
+            self.disyuntor.fallo()
+        
+        # Pasado el tiempo de apertura se deja pasar una sola petición de prueba
+        mock_monotonic.return_value = 131.0
+        self.disyuntor.permitir()
+        self.assertEqual(self.disyuntor.estado, Disyuntor.SEMIABIERTO)
+        self.assertRaises(CircuitoAbierto, self.disyuntor.permitir)
+        
+        # Si la prueba falla se abre de nuevo; si funciona, se cierra
+        self.disyuntor.fallo()
+        self.assertEqual(self.disyuntor.estado, Disyuntor.ABIERTO)
+        mock_monotonic.return_value = 162.0
+        self.disyuntor.permitir()
+        self.disyuntor.exito()
+        self.assertEqual(self.disyuntor.estadisticas(), {"estado": "cerrado", "fallos": 0, "aperturas": 2})
+
+if __name__ == '__main__':
+    unittest.main()
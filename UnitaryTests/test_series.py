@@ -0,0 +1,71 @@
+import unittest
+import numpy as np
+from app.facade.series import Serie, a_json, compactar
+
+def bloque_horario(dias, inicio="2024-01-01"):
+    """Bloque "hourly" de Open-Meteo con `dias` días consecutivos"""
+    fechas = np.datetime_as_string(np.datetime64(inicio) + np.arange(dias), unit="D").tolist()
+    return {
+        "time": [f"{fecha}T{h:02d}:00" for fecha in fechas for h in range(24)],
+        "pm10": [float(h) for _ in fechas for h in range(24)],
+        "pm2_5": [None if h == 3 else h / 2 for _ in fechas for h in range(24)]
+    }
+
+class TestSerie(unittest.TestCase):
+    
+    def test_ida_y_vuelta_json(self):
+        horario = bloque_horario(3)
+        diario = {"time": ["2024-01-01", "2024-01-02"], "temperature_2m_max": [20.5, None]}
+        self.assertEqual(Serie.desde_json(horario).a_json(), horario)
+        self.assertEqual(Serie.desde_json(diario).a_json(), diario)
+    
+    def test_columnas_compactas(self):
+        serie = Serie.desde_json(bloque_horario(2))
+        self.assertEqual(len(serie), 48)
+        self.assertEqual(serie["pm10"].dtype, np.float64)
+        self.assertTrue(np.isnan(serie["pm2_5"][3]))
+        self.assertEqual(serie.tiempo[1] - serie.tiempo[0], 3600)
+        self.assertEqual(serie.fechas()[24], "2024-01-02")
+        self.assertEqual(serie.lista("pm2_5", 2, 4), [1.0, None])
+        # Las series se comparten desde la caché: no se pueden modificar
+        with self.assertRaises(ValueError):
+            serie["pm10"][0] = 1.0
+    
+    def test_concatenar(self):
+        primera = Serie.desde_json(bloque_horario(1))
+        segunda = Serie.desde_json({"time": bloque_horario(1, "2024-01-02")["time"], "pm10": [1.0] * 24})
+        serie = Serie.concatenar([primera, Serie(), segunda])
+        self.assertEqual(len(serie), 48)
+        self.assertEqual(serie.fechas()[-1], "2024-01-02")
+        self.assertTrue(np.isnan(serie["pm2_5"][24:]).all())
+    
+    def test_agregar_desde_la_medianoche(self):
+        def inicios(serie):
+            return np.datetime_as_string(serie.tiempo.astype("datetime64[s]"), unit="m").tolist()
+
+        serie = Serie.desde_json(bloque_horario(2))
+        # 5 horas no dividen el día: los tramos empiezan a medianoche del primer día y siguen de 5 en 5
+        cada_cinco = serie.agregar(5)
+        self.assertEqual(inicios(cada_cinco)[:2], ["2024-01-01T00:00", "2024-01-01T05:00"])
+        self.assertEqual(inicios(cada_cinco)[-1], "2024-01-02T21:00")
+        self.assertEqual(cada_cinco.lista("pm10")[:2], [2.0, 7.0])
+        self.assertEqual(len(cada_cinco), 10)
+
+        diaria = serie.agregar(24)
+        self.assertEqual(inicios(diaria), ["2024-01-01T00:00", "2024-01-02T00:00"])
+        self.assertEqual(diaria.lista("pm10"), [11.5, 11.5])
+
+        # Una semana que empieza un miércoles queda en un solo tramo con la fecha de ese miércoles
+        semanal = Serie.desde_json(bloque_horario(7, "2024-01-03")).agregar(168)
+        self.assertEqual(inicios(semanal), ["2024-01-03T00:00"])
+
+    def test_compactar_y_a_json(self):
+        respuesta = {"timezone": "Europe/Madrid", "hourly": bloque_horario(1)}
+        compacta = compactar(respuesta)
+        self.assertIsInstance(compacta["hourly"], Serie)
+        self.assertEqual(a_json({"datos": compacta}), {"datos": respuesta})
+        # 24 instantes con dos variables: 3 arrays de 8 bytes por valor
+        self.assertEqual(compacta["hourly"].nbytes, 24 * 3 * 8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+# app/api/asgi.py
+"""
+Variante asíncrona de la API de aire y clima para servidores ASGI:
+
+    uvicorn app.api.asgi:aplicacion
+
+Expone /api/aire-clima/actual y /api/aire-clima/historico con las mismas
+respuestas que el blueprint síncrono, pero cada petición en espera de las
+APIs externas es una corrutina en lugar de un hilo del servidor. Usa los
+servicios compartidos de app.servicios (caché, almacén, límites). El canal
+de eventos /api/aire-clima/stream se sirve también aquí: cada panel
+suscrito es una corrutina en espera, no un hilo.
+"""
+import asyncio
+import inspect
+import json
+from urllib.parse import parse_qs
+
+import requests
+
+from app.api.routes import MAX_HORAS_ACTUAL, MAX_UBICACIONES_STREAM, cabecera_retry_after, componer_historico, \
+    leer_parametros_historico
+from app.facade.aireYClimaFacade import HORAS_ACTUAL
+from app.facade.aireYClimaFacadeAsync import AireYClimaFacadeAsync
+from app.facade.difusion import LATIDO_SEGUNDOS, REINTENTO_MS, formatear_evento, leer_ubicaciones
+from app.facade.espacial import comprobar_coordenadas
+from app.facade.series import a_json
+from app.metricas import metricas
+from app.servicios import difusor
+from app.servicios import fachada as fachada_sincrona
+
+# Misma caché, almacén y límites que la API síncrona; solo cambia el cliente HTTP
+fachada = AireYClimaFacadeAsync.compartiendo(fachada_sincrona)
+
+def _parametro(query, nombre, tipo, defecto=None):
+    """Lee un parámetro de la query string con el mismo criterio que request.args.get(type=...)."""
+    try:
+        return tipo(query[nombre][0])
+    except (KeyError, ValueError):
+        return defecto
+
+async def obtener_dato_actual(query):
+    latitude = _parametro(query, "latitude", float)
+    longitude = _parametro(query, "longitude", float)
+    horas = _parametro(query, "horas", int, HORAS_ACTUAL)
+    if latitude is None or longitude is None:
+        return 400, {"error": "Faltan parámetros de latitud o longitud"}
+    try:
+        latitude, longitude = comprobar_coordenadas(latitude, longitude)
+    except ValueError:
+        return 400, {"error": "Latitud o longitud no válida"}
+    if not 1 <= horas <= MAX_HORAS_ACTUAL:
+        return 400, {"error": f"horas debe estar entre 1 y {MAX_HORAS_ACTUAL}"}
+    return 200, await fachada.recoger_ultimo_dato(latitude, longitude, horas)
+
+async def obtener_datos_historicos(query):
+    parametros, error = leer_parametros_historico(
+        lambda nombre, tipo, defecto: _parametro(query, nombre, tipo, defecto))
+    if error is not None:
+        return 400, {"error": error}
+    latitude, longitude, dias = parametros["latitude"], parametros["longitude"], parametros["dias"]
+    if parametros["formato"] == "ndjson":
+        return 200, _registros_historicos(latitude, longitude, dias)
+
+    # Obtener datos históricos y combinarlos con el informe
+    datos_historicos = await fachada.obtener_datos_historicos(latitude, longitude, dias)
+    return 200, componer_historico(fachada, datos_historicos, parametros)
+
+async def _registros_historicos(latitude, longitude, dias):
+    """Registros de ?formato=ndjson: los bloques de días se piden en un hilo, uno cada vez."""
+    registros = fachada_sincrona.iterar_datos_historicos(latitude, longitude, dias)
+    while True:
+        registro = await asyncio.to_thread(next, registros, None)
+        if registro is None:
+            return
+        yield registro
+
+RUTAS = {
+    "/api/aire-clima/actual": obtener_dato_actual,
+    "/api/aire-clima/historico": obtener_datos_historicos
+}
+
+async def _ciclo_de_vida(receive, send):
+    """Atiende los eventos de arranque y parada del servidor ASGI."""
+    while True:
+        mensaje = await receive()
+        if mensaje["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif mensaje["type"] == "lifespan.shutdown":
+            await fachada.cerrar()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def aplicacion(scope, receive, send):
+    """Aplicación ASGI."""
+    if scope["type"] == "lifespan":
+        await _ciclo_de_vida(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    if scope["path"] == "/api/aire-clima/stream" and scope["method"] == "GET":
+        await _transmitir(scope, receive, send)
+        return
+
+    if scope["path"] == "/metrics":
+        # Métricas de este proceso, en el formato de texto de Prometheus
+        await _responder(send, 200, b"text/plain; version=0.0.4; charset=utf-8", metricas.exportar().encode("utf-8"))
+        return
+
+    ruta = RUTAS.get(scope["path"])
+    cabeceras = []
+    if ruta is None:
+        estado, cuerpo = 404, {"error": "Ruta no encontrada"}
+    elif scope["method"] != "GET":
+        estado, cuerpo = 405, {"error": "Método no permitido"}
+    else:
+        try:
+            estado, cuerpo = await ruta(parse_qs(scope["query_string"].decode("latin-1")))
+        except requests.RequestException as e:
+            # Como el manejador de errores del blueprint: sin cuota o sin turno, cuándo reintentar
+            estado, cuerpo = 503, {"error": f"Servicio externo no disponible: {e}"}
+            reintentar = cabecera_retry_after(e)
+            if reintentar is not None:
+                cabeceras.append((b"retry-after", reintentar.encode()))
+
+    if inspect.isasyncgen(cuerpo):
+        await _responder_ndjson(send, cuerpo)
+        return
+    await _responder(send, estado, b"application/json", json.dumps(a_json(cuerpo)).encode("utf-8"), cabeceras)
+
+async def _responder_ndjson(send, registros):
+    """Envía un registro JSON por línea a medida que se generan."""
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"application/x-ndjson")]
+    })
+    try:
+        async for registro in registros:
+            await send({"type": "http.response.body", "body": (json.dumps(registro) + "\n").encode("utf-8"),
+                        "more_body": True})
+    except requests.RequestException as e:
+        # La respuesta ya ha empezado: se corta aquí, como en el blueprint síncrono
+        print("Error al generar el histórico:", e)
+    await send({"type": "http.response.body", "body": b""})
+
+async def _transmitir(scope, receive, send):
+    """Canal Server-Sent Events: envía los datos de las ubicaciones suscritas cada vez que cambian."""
+    query = parse_qs(scope["query_string"].decode("latin-1"))
+    try:
+        coordenadas = leer_ubicaciones(query.get("ubicacion", []))
+    except ValueError:
+        coordenadas = None
+    if not coordenadas or len(coordenadas) > MAX_UBICACIONES_STREAM:
+        error = {"error": f"Se esperan entre 1 y {MAX_UBICACIONES_STREAM} ubicaciones (ubicacion=latitud,longitud)"}
+        await _responder(send, 400, b"application/json", json.dumps(error).encode("utf-8"))
+        return
+    suscripcion = difusor.suscribir(coordenadas, asyncio.get_running_loop())
+    if suscripcion is None:
+        error = {"error": "Demasiadas suscripciones abiertas"}
+        await _responder(send, 503, b"application/json", json.dumps(error).encode("utf-8"))
+        return
+
+    async def esperar_desconexion():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    desconexion = asyncio.ensure_future(esperar_desconexion())
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+                        (b"x-accel-buffering", b"no")]
+        })
+        await send({"type": "http.response.body", "body": f"retry: {REINTENTO_MS}\n\n".encode(), "more_body": True})
+        while True:
+            espera = asyncio.ensure_future(suscripcion.esperar_async(LATIDO_SEGUNDOS))
+            await asyncio.wait((espera, desconexion), return_when=asyncio.FIRST_COMPLETED)
+            if desconexion.done():
+                espera.cancel()
+                return
+            pendientes = espera.result()
+            texto = "".join(formatear_evento(suscripcion, *pendiente) for pendiente in pendientes) or ": latido\n\n"
+            await send({"type": "http.response.body", "body": texto.encode("utf-8"), "more_body": True})
+    finally:
+        desconexion.cancel()
+        difusor.cancelar(suscripcion)
+
+async def _responder(send, estado, tipo, datos, cabeceras=()):
+    await send({
+        "type": "http.response.start",
+        "status": estado,
+        "headers": [(b"content-type", tipo), (b"content-length", str(len(datos)).encode())] + list(cabeceras)
+    })
+    await send({"type": "http.response.body", "body": datos})
@@ -1,37 +1,319 @@
-from flask import Blueprint, jsonify, request
-from app.facade.aireYClimaFacade import AireYClimaFacade
+import json
+from datetime import date
+import requests
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from app.cache_http import respuesta_condicional
+from app.facade.series import Serie, UNIDAD_HORARIA, a_json
+from app.facade.aireYClimaFacade import HORAS_ACTUAL, MAX_DIAS_HISTORICO
+from app.facade.difusion import LATIDO_SEGUNDOS, REINTENTO_MS, formatear_evento, leer_ubicaciones
+from app.facade.espacial import comprobar_coordenadas
+from app.facade.exportacion import FORMATOS, exportar, formato_por_defecto, formatos_disponibles
+from app.facade.malla import Malla, dimensiones_malla, leer_bbox
+from app.metricas import metricas
+from app.servicios import difusor, fachada, geocodificador
 
 api = Blueprint('api', __name__)
-fachada = AireYClimaFacade()
+
+# Número máximo de ciudades por petición de geocodificación en lote
+MAX_CIUDADES_LOTE = 100
+# Número máximo de ubicaciones por petición de datos actuales en lote
+MAX_UBICACIONES_LOTE = 500
+# Segundos que navegadores y proxies pueden reutilizar cada tipo de respuesta
+MAX_AGE_ACTUAL = 60
+MAX_AGE_HISTORICO = 10 * 60
+MAX_AGE_GEOCODIFICACION = 24 * 60 * 60
+# Número máximo de ubicaciones por suscripción al canal de eventos
+MAX_UBICACIONES_STREAM = 50
+# Número máximo de ubicaciones y de días por exportación del histórico
+MAX_UBICACIONES_EXPORTACION = 500
+MAX_DIAS_EXPORTACION = 366
+# Nodos máximos de una malla y celdas de la caché que puede abarcar (50 peticiones en lote por API)
+MAX_NODOS_MALLA = 512 * 512
+MAX_CELDAS_MALLA = 2500
+# Horas de calidad del aire que se pueden pedir con los datos actuales
+MAX_HORAS_ACTUAL = 48
+# Series que se pueden pedir por separado en ?campos= del histórico
+SERIES_HISTORICAS = ("temperature_2m_max", "temperature_2m_min", "pm10", "pm2_5")
+# Tamaño máximo (en horas) de los tramos en que se agregan las series horarias
+MAX_HORAS_AGREGACION = 7 * 24
+
+def cabecera_retry_after(error):
+    """Valor de Retry-After (segundos enteros) para un error con `reintentar_en`, o None."""
+    reintentar_en = getattr(error, "reintentar_en", None)
+    if reintentar_en is None:
+        return None
+    return str(max(1, round(reintentar_en)))
+
+@api.errorhandler(requests.RequestException)
+def servicio_externo_no_disponible(error):
+    # APIs externas caídas, con el circuito abierto, fuera de plazo o sin cuota, y sin copia en caché
+    respuesta = jsonify({"error": f"Servicio externo no disponible: {error}"})
+    reintentar = cabecera_retry_after(error)
+    if reintentar is not None:
+        respuesta.headers["Retry-After"] = reintentar
+    return respuesta, 503
 
 @api.route('/api/aire-clima/actual', methods=['GET'])
 def obtener_dato_actual():
     latitude = request.args.get("latitude", type=float)
     longitude = request.args.get("longitude", type=float)
+    # ?horas=N devuelve la calidad del aire de las N horas desde la hora en curso
+    horas = request.args.get("horas", default=HORAS_ACTUAL, type=int)
     if latitude is None or longitude is None:
         return jsonify({"error": "Faltan parámetros de latitud o longitud"}), 400
-    datos = fachada.recoger_ultimo_dato(latitude, longitude)
-    return jsonify(datos)
+    try:
+        latitude, longitude = comprobar_coordenadas(latitude, longitude)
+    except ValueError:
+        return jsonify({"error": "Latitud o longitud no válida"}), 400
+    if not 1 <= horas <= MAX_HORAS_ACTUAL:
+        return jsonify({"error": f"horas debe estar entre 1 y {MAX_HORAS_ACTUAL}"}), 400
+    datos = fachada.recoger_ultimo_dato(latitude, longitude, horas)
+    with metricas.tramo("serializacion"):
+        return respuesta_condicional(jsonify(datos), datos.get("frescura"), MAX_AGE_ACTUAL)
+
+@api.route('/api/aire-clima/stream', methods=['GET'])
+def suscribir_datos_actuales():
+    # ?ubicacion=lat,lon (repetible): Server-Sent Events con los datos de cada ubicación
+    # cada vez que cambian. Cada cliente ocupa un hilo del servidor; para miles de
+    # paneles abiertos, el mismo canal está en app.api.asgi.
+    try:
+        coordenadas = leer_ubicaciones(request.args.getlist("ubicacion"))
+    except ValueError:
+        return jsonify({"error": "Ubicación no válida (se espera ubicacion=latitud,longitud)"}), 400
+    if not coordenadas:
+        return jsonify({"error": "Falta al menos una ubicación"}), 400
+    if len(coordenadas) > MAX_UBICACIONES_STREAM:
+        return jsonify({"error": f"Se admiten como máximo {MAX_UBICACIONES_STREAM} ubicaciones por suscripción"}), 400
+    suscripcion = difusor.suscribir(coordenadas)
+    if suscripcion is None:
+        return jsonify({"error": "Demasiadas suscripciones abiertas"}), 503
+    
+    def eventos():
+        try:
+            yield f"retry: {REINTENTO_MS}\n\n"
+            while True:
+                pendientes = suscripcion.esperar(LATIDO_SEGUNDOS)
+                if not pendientes:
+                    yield ": latido\n\n"
+                for celda, huella, datos in pendientes:
+                    yield formatear_evento(suscripcion, celda, huella, datos)
+        finally:
+            # El servidor cierra el generador cuando el cliente se desconecta
+            difusor.cancelar(suscripcion)
+    
+    return Response(eventos(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@api.route('/api/aire-clima/malla', methods=['GET'])
+def obtener_malla():
+    # ?bbox=oeste,sur,este,norte&resolucion=grados: calidad del aire y temperatura
+    # actuales en una malla regular, para superponerla en un mapa
+    try:
+        bbox = leer_bbox(request.args.get("bbox", ""))
+    except ValueError:
+        return jsonify({"error": "bbox no válido (se espera bbox=oeste,sur,este,norte)"}), 400
+    resolucion = request.args.get("resolucion", default=fachada.cache.resolucion, type=float)
+    formato = request.args.get("formato", "json")
+    if not resolucion > 0:
+        return jsonify({"error": "La resolución debe ser un número de grados positivo"}), 400
+    if formato not in ("json", "png"):
+        return jsonify({"error": "Formato no soportado (json o png)"}), 400
+    filas, columnas = dimensiones_malla(bbox, resolucion)
+    if filas * columnas > MAX_NODOS_MALLA:
+        return jsonify({"error": f"La malla no puede tener más de {MAX_NODOS_MALLA} nodos"}), 400
+    malla = Malla(bbox, resolucion, fachada.cache.ajustar)
+    if len(malla.celdas) > MAX_CELDAS_MALLA:
+        return jsonify({"error": f"El rectángulo abarca más de {MAX_CELDAS_MALLA} celdas"}), 400
+    
+    # Todas las celdas sin caché se piden en lote, con muchas coordenadas por petición
+    malla.rellenar(fachada.recoger_datos_celdas(malla.celdas))
+    with metricas.tramo("serializacion"):
+        if formato == "png":
+            return respuesta_condicional(Response(malla.a_png(), mimetype="image/png"), max_age=MAX_AGE_ACTUAL)
+        return respuesta_condicional(jsonify(malla.a_json()), max_age=MAX_AGE_ACTUAL)
+
+def _leer_coordenadas(ubicaciones):
+    """Lista de tuplas (latitud, longitud) de las ubicaciones {"latitude": ..., "longitude": ...} de un cuerpo JSON."""
+    return [comprobar_coordenadas(u["latitude"], u["longitude"]) for u in ubicaciones]
+
+@api.route('/api/aire-clima/lote', methods=['POST'])
+def obtener_datos_actuales_lote():
+    # Cuerpo esperado: {"ubicaciones": [{"latitude": ..., "longitude": ...}, ...]}
+    ubicaciones = (request.get_json(silent=True) or {}).get("ubicaciones")
+    if not ubicaciones or not isinstance(ubicaciones, list):
+        return jsonify({"error": "Falta la lista de ubicaciones"}), 400
+    if len(ubicaciones) > MAX_UBICACIONES_LOTE:
+        return jsonify({"error": f"Se admiten como máximo {MAX_UBICACIONES_LOTE} ubicaciones por petición"}), 400
+    
+    try:
+        coordenadas = _leer_coordenadas(ubicaciones)
+    except (TypeError, KeyError, ValueError):
+        return jsonify({"error": "Ubicación con latitud o longitud no válida"}), 400
+    
+    datos = fachada.recoger_ultimos_datos_lote(coordenadas)
+    resultados = [
+        dict(latitude=latitude, longitude=longitude, **dato)
+        for (latitude, longitude), dato in zip(coordenadas, datos)
+    ]
+    return respuesta_condicional(jsonify({"resultados": resultados}), max_age=MAX_AGE_ACTUAL)
+
+@api.route('/api/aire-clima/exportar', methods=['POST'])
+def exportar_historico():
+    # Cuerpo esperado: {"ubicaciones": [{"latitude": ..., "longitude": ...}, ...],
+    # "inicio": "AAAA-MM-DD", "fin": "AAAA-MM-DD", "formato": "parquet" | "arrow" | "csv"}
+    cuerpo = request.get_json(silent=True) or {}
+    ubicaciones = cuerpo.get("ubicaciones")
+    formato = cuerpo.get("formato") or formato_por_defecto()
+    if not ubicaciones or not isinstance(ubicaciones, list):
+        return jsonify({"error": "Falta la lista de ubicaciones"}), 400
+    if len(ubicaciones) > MAX_UBICACIONES_EXPORTACION:
+        return jsonify({"error": f"Se admiten como máximo {MAX_UBICACIONES_EXPORTACION} ubicaciones por exportación"}), 400
+    try:
+        coordenadas = _leer_coordenadas(ubicaciones)
+    except (TypeError, KeyError, ValueError):
+        return jsonify({"error": "Ubicación con latitud o longitud no válida"}), 400
+    try:
+        inicio = date.fromisoformat(cuerpo["inicio"])
+        fin = date.fromisoformat(cuerpo["fin"])
+    except (TypeError, KeyError, ValueError):
+        return jsonify({"error": "Fechas de inicio y fin no válidas (se espera AAAA-MM-DD)"}), 400
+    if not 0 <= (fin - inicio).days < MAX_DIAS_EXPORTACION:
+        return jsonify({"error": f"El fin debe ser posterior al inicio, con {MAX_DIAS_EXPORTACION} días como máximo"}), 400
+    if formato not in formatos_disponibles():
+        return jsonify({"error": "Formato no disponible: " + ", ".join(formatos_disponibles())}), 400
+    
+    # El fichero se genera y se envía por grupos de filas, sin tenerlo entero en memoria
+    tipo, extension = FORMATOS[formato]
+    return Response(
+        exportar(fachada, coordenadas, inicio, fin, formato),
+        mimetype=tipo,
+        headers={"Content-Disposition": f'attachment; filename="aire-clima-{inicio}-{fin}.{extension}"'}
+    )
+
+def _proyectar(datos_historicos, series, horas):
+    """
+    Copia de los datos históricos con solo las series pedidas (None para todas) y
+    las series horarias agregadas en tramos de `horas` horas (None para no agregar).
+    """
+    resultado = {}
+    for campo, valor in datos_historicos.items():
+        if isinstance(valor, dict):
+            valor = dict(valor)
+            for clave, serie in valor.items():
+                if not isinstance(serie, Serie):
+                    continue
+                if series is not None:
+                    serie = serie.seleccionar(series)
+                if horas is not None and serie.unidad == UNIDAD_HORARIA:
+                    serie = serie.agregar(horas)
+                valor[clave] = serie
+        resultado[campo] = valor
+    return resultado
+
+def leer_parametros_historico(obtener):
+    """
+    Lee y valida los parámetros de /api/aire-clima/historico. Los usan tanto este
+    blueprint como la aplicación ASGI, para que respondan igual a la misma URL.
+    
+    Args:
+        obtener: Función (nombre, tipo, defecto) que lee un parámetro de la query string
+            (None o el defecto si falta o no es del tipo)
+    
+    Returns:
+        Tupla (parámetros, error): diccionario con latitude, longitude, dias, formato,
+        campos (conjunto) y horas, o None y el mensaje de error
+    """
+    latitude = obtener("latitude", float, None)
+    longitude = obtener("longitude", float, None)
+    dias = obtener("dias", int, 7)
+    formato = obtener("formato", str, "json")
+    # ?campos=informe, ?campos=datos_historicos o nombres de series (p. ej. informe,pm10)
+    campos = obtener("campos", str, None)
+    # ?horas=N agrega las series horarias en tramos de N horas (24: medias diarias)
+    horas = obtener("horas", int, None)
+    
+    if latitude is None or longitude is None:
+        return None, "Faltan parámetros de latitud o longitud"
+    try:
+        latitude, longitude = comprobar_coordenadas(latitude, longitude)
+    except ValueError:
+        return None, "Latitud o longitud no válida"
+    if formato not in ("json", "ndjson"):
+        return None, "Formato no soportado (json o ndjson)"
+    if not 1 <= dias <= MAX_DIAS_HISTORICO:
+        return None, f"dias debe estar entre 1 y {MAX_DIAS_HISTORICO}"
+    if horas is not None and not 1 <= horas <= MAX_HORAS_AGREGACION:
+        return None, f"horas debe estar entre 1 y {MAX_HORAS_AGREGACION}"
+    if campos is None:
+        campos = {"informe", "datos_historicos"}
+    else:
+        campos = {campo.strip() for campo in campos.split(",") if campo.strip()}
+        desconocidos = campos - {"informe", "datos_historicos"} - set(SERIES_HISTORICAS)
+        if not campos or desconocidos:
+            return None, "Campos no válidos: informe, datos_historicos o " + ", ".join(SERIES_HISTORICAS)
+    return {"latitude": latitude, "longitude": longitude, "dias": dias, "formato": formato,
+            "campos": campos, "horas": horas}, None
+
+def componer_historico(fachada, datos_historicos, parametros):
+    """Combina los datos históricos pedidos en ?campos= con el informe de tendencias."""
+    campos, horas = parametros["campos"], parametros["horas"]
+    resultado = {}
+    series = campos & set(SERIES_HISTORICAS)
+    if "datos_historicos" in campos or series:
+        resultado["datos_historicos"] = _proyectar(
+            datos_historicos, None if "datos_historicos" in campos else series, horas)
+    else:
+        # Sin las series, se mantienen la ubicación y la edad de los datos
+        resultado["celda"] = datos_historicos.get("celda")
+        resultado["frescura"] = datos_historicos.get("frescura")
+    if "informe" in campos:
+        # Analizar tendencias (siempre sobre los datos completos, sin agregar)
+        resultado["informe"] = fachada.analizar_tendencias(datos_historicos)
+    return resultado
 
 @api.route('/api/aire-clima/historico', methods=['GET'])
 def obtener_datos_historicos():
-    latitude = request.args.get("latitude", type=float)
-    longitude = request.args.get("longitude", type=float)
-    dias = request.args.get("dias", default=7, type=int)
+    parametros, error = leer_parametros_historico(
+        lambda nombre, tipo, defecto: request.args.get(nombre, default=defecto, type=tipo))
+    if error is not None:
+        return jsonify({"error": error}), 400
+    latitude, longitude, dias = parametros["latitude"], parametros["longitude"], parametros["dias"]
     
-    if latitude is None or longitude is None:
-        return jsonify({"error": "Faltan parámetros de latitud o longitud"}), 400
+    if parametros["formato"] == "ndjson":
+        # Un registro JSON por línea y día; el informe llega en el último registro
+        registros = fachada.iterar_datos_historicos(latitude, longitude, dias)
+        return Response(
+            stream_with_context(json.dumps(registro) + "\n" for registro in registros),
+            mimetype="application/x-ndjson"
+        )
     
-    # Obtener datos históricos
+    # Obtener datos históricos y combinarlos con el informe
     datos_historicos = fachada.obtener_datos_historicos(latitude, longitude, dias)
+    resultado = componer_historico(fachada, datos_historicos, parametros)
     
-    # Analizar tendencias
-    informe = fachada.analizar_tendencias(datos_historicos)
+    with metricas.tramo("serializacion"):
+        return respuesta_condicional(jsonify(a_json(resultado)), datos_historicos.get("frescura"), MAX_AGE_HISTORICO)
+
+@api.route('/api/geocode', methods=['GET', 'POST'])
+def geocodificar():
+    # Las ciudades llegan como JSON {"ciudades": [...]} o como ?ciudad=...&ciudad=...
+    if request.method == 'POST':
+        ciudades = (request.get_json(silent=True) or {}).get("ciudades")
+    else:
+        ciudades = request.args.getlist("ciudad")
+    
+    if not ciudades or not isinstance(ciudades, list) or not all(isinstance(c, str) for c in ciudades):
+        return jsonify({"error": "Falta la lista de ciudades"}), 400
+    if len(ciudades) > MAX_CIUDADES_LOTE:
+        return jsonify({"error": f"Se admiten como máximo {MAX_CIUDADES_LOTE} ciudades por petición"}), 400
     
-    # Combinar los datos históricos con el informe
-    resultado = {
-        "datos_historicos": datos_historicos,
-        "informe": informe
-    }
+    resultados = {}
+    for ciudad, (latitude, longitude) in geocodificador.resolver_lote(ciudades).items():
+        resultados[ciudad] = None if latitude is None else {"latitude": latitude, "longitude": longitude}
     
-    return jsonify(resultado)
\ No newline at end of file
+    return respuesta_condicional(jsonify({"resultados": resultados}), max_age=MAX_AGE_GEOCODIFICACION)
+
+@api.route('/metrics', methods=['GET'])
+def exportar_metricas():
+    # Formato de texto de Prometheus
+    return Response(metricas.exportar(), mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,96 @@
+# app/cache_http.py
+import gzip
+import hashlib
+from datetime import datetime, timezone
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se ofrece gzip
+    brotli = None
+
+# Las respuestas más pequeñas no compensan el coste de comprimir
+TAMANO_MINIMO_COMPRIMIR = 1024
+TIPOS_COMPRIMIBLES = ("application/json", "text/html", "text/plain")
+# Niveles rápidos: la mayor parte de la reducción por una fracción del tiempo
+NIVEL_GZIP = 5
+CALIDAD_BROTLI = 4
+
+def version_datos(frescura):
+    """
+    Versión de unos datos a partir de su bloque "frescura": las fechas de
+    actualización de cada fuente (o de su alineación con la hora en curso, si es
+    posterior). None si alguna fuente no tiene versión.
+    """
+    fuentes = list((frescura or {}).values())
+    fechas = tuple(f.get("actualizado") for f in fuentes)
+    if not fechas or None in fechas:
+        return None
+    # Las series alineadas con la hora en curso cambian con la hora aunque los datos no cambien
+    return tuple(max(fecha, f.get("alineado") or 0) for fecha, f in zip(fechas, fuentes))
+
+def respuesta_condicional(respuesta, frescura=None, max_age=60):
+    """
+    Añade a una respuesta ETag, Last-Modified y Cache-Control, y la convierte en
+    un 304 sin cuerpo si el cliente ya tiene esa versión (If-None-Match o
+    If-Modified-Since).
+
+    Con versión de datos el ETag es débil y se deriva de ella, porque el cuerpo
+    incluye la edad de los datos, que cambia aunque los datos no cambien. Sin
+    ella, el ETag es el hash del cuerpo.
+
+    Args:
+        respuesta: Respuesta de Flask ya generada
+        frescura: Bloque "frescura" de la fachada con la edad y versión de los datos
+        max_age: Segundos que el navegador o el proxy pueden reutilizar la respuesta
+    """
+    version = version_datos(frescura)
+    if version is None:
+        respuesta.add_etag()
+    else:
+        respuesta.set_etag(hashlib.sha1(repr(version).encode()).hexdigest(), weak=True)
+        respuesta.last_modified = datetime.fromtimestamp(max(version), timezone.utc)
+
+    # Los datos caducados se están refrescando: que el cliente vuelva a preguntar
+    obsoleto = any(f.get("obsoleto") for f in (frescura or {}).values())
+    respuesta.cache_control.public = True
+    respuesta.cache_control.max_age = 0 if obsoleto else max_age
+    return respuesta.make_conditional(request)
+
+def _codificacion_aceptada():
+    """Mejor codificación que acepta el cliente según Accept-Encoding, o None."""
+    aceptadas = request.accept_encodings
+    if brotli is not None and aceptadas["br"]:
+        return "br"
+    if aceptadas["gzip"]:
+        return "gzip"
+    return None
+
+def comprimir_respuesta(respuesta):
+    """
+    Comprime con brotli o gzip, según Accept-Encoding, las respuestas JSON y HTML
+    de cierto tamaño. Pensada para registrarse con app.after_request.
+    """
+    if (respuesta.status_code != 200 or respuesta.direct_passthrough or respuesta.is_streamed
+            or "Content-Encoding" in respuesta.headers or respuesta.mimetype not in TIPOS_COMPRIMIBLES):
+        return respuesta
+    datos = respuesta.get_data()
+    if len(datos) < TAMANO_MINIMO_COMPRIMIR:
+        return respuesta
+    # La respuesta depende de Accept-Encoding aunque esta vez no se comprima
+    respuesta.vary.add("Accept-Encoding")
+    codificacion = _codificacion_aceptada()
+    if codificacion is None:
+        return respuesta
+
+    if codificacion == "br":
+        respuesta.set_data(brotli.compress(datos, quality=CALIDAD_BROTLI))
+    else:
+        respuesta.set_data(gzip.compress(datos, compresslevel=NIVEL_GZIP, mtime=0))
+    respuesta.headers["Content-Encoding"] = codificacion
+    # El cuerpo ya no es byte a byte el del ETag fuerte: pasa a ser débil
+    etag, debil = respuesta.get_etag()
+    if etag and not debil:
+        respuesta.set_etag(etag, weak=True)
+    return respuesta
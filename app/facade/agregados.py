@@ -0,0 +1,266 @@
+# app/facade/agregados.py
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from fractions import Fraction
+
+import numpy as np
+
+from app.facade.analisis import UMBRAL_PM10_DIARIO, UMBRAL_PM25_DIARIO
+from app.facade.series import Serie
+
+SEGUNDOS_DIA = 24 * 60 * 60
+
+def _tabla_dispersa(valores, funcion):
+    """Niveles de una sparse table: el nivel k guarda funcion() de cada tramo de 2**k días."""
+    niveles = [valores]
+    paso = 1
+    while 2 * paso <= len(valores):
+        anterior = niveles[-1]
+        niveles.append(funcion(anterior[:-paso], anterior[paso:]))
+        paso *= 2
+    return niveles
+
+def _consultar_tabla(niveles, funcion, i, j):
+    """funcion() de los días [i, j] en O(1), combinando dos tramos solapados."""
+    k = (j - i + 1).bit_length() - 1
+    return funcion(niveles[k][i], niveles[k][j - (1 << k) + 1])
+
+
+class TablaDiaria:
+    """
+    Agregados diarios de una variable en una ubicación: suma exacta, número de
+    valores, máximo y mínimo de cada día. Responde a cualquier ventana de días
+    combinando sumas prefijas y sparse tables, sin recorrer los valores.
+    """
+
+    def __init__(self):
+        self.dias = {}  # día (desde 1970-01-01) -> (suma, cuenta, maximo, minimo)
+        self._indice = None
+
+    def presentes(self, dias):
+        """Indica, para cada día del array, si ya tiene agregados."""
+        resultado = np.zeros(len(dias), dtype=bool)
+        if not self.dias:
+            return resultado
+        indice = self._obtener_indice()
+        posiciones = dias - indice["base"]
+        dentro = (posiciones >= 0) & (posiciones < indice["n"])
+        resultado[dentro] = indice["presente"][posiciones[dentro]]
+        return resultado
+
+    def actualizar(self, dia, valores):
+        """Recalcula los agregados de un día a partir de sus valores (NaN en los huecos)."""
+        validos = valores[~np.isnan(valores)]
+        parcial = (
+            sum(map(Fraction, validos.tolist()), Fraction(0)),
+            len(validos),
+            float(validos.max()) if len(validos) else None,
+            float(validos.min()) if len(validos) else None
+        )
+        if self.dias.get(dia) != parcial:
+            self.dias[dia] = parcial
+            self._indice = None
+
+    def media(self, dia):
+        """Media exacta de un día (como la de statistics.mean) o None si no tiene valores."""
+        suma, cuenta = self.dias[dia][:2]
+        return float(suma / cuenta) if cuenta else None
+
+    def _obtener_indice(self):
+        if self._indice is None:
+            self._construir_indice()
+        return self._indice
+
+    def _construir_indice(self):
+        base = min(self.dias)
+        n = max(self.dias) - base + 1
+        vacio = (Fraction(0), 0, None, None)
+        parciales = [self.dias.get(base + i, vacio) for i in range(n)]
+
+        prefijo_suma = [Fraction(0)]
+        for suma, _, _, _ in parciales:
+            prefijo_suma.append(prefijo_suma[-1] + suma)
+        cuentas = np.array([cuenta for _, cuenta, _, _ in parciales])
+        maximos = np.array([np.nan if p[2] is None else p[2] for p in parciales])
+        minimos = np.array([np.nan if p[3] is None else p[3] for p in parciales])
+        medias = np.array([float(s / c) if c else np.nan for s, c, _, _ in parciales])
+
+        # Primer día con datos a partir de cada día y último hasta cada día
+        posiciones = np.arange(n)
+        validos = ~np.isnan(medias)
+        siguiente = np.minimum.accumulate(np.where(validos, posiciones, n)[::-1])[::-1]
+        anterior = np.maximum.accumulate(np.where(validos, posiciones, -1))
+
+        self._indice = {
+            "base": base,
+            "n": n,
+            "presente": np.array([base + i in self.dias for i in range(n)]),
+            "suma": prefijo_suma,
+            "cuenta": np.concatenate(([0], np.cumsum(cuentas))),
+            "maximo": _tabla_dispersa(maximos, np.fmax),
+            "minimo": _tabla_dispersa(minimos, np.fmin),
+            "medias": medias,
+            "siguiente": siguiente,
+            "anterior": anterior
+        }
+
+    def ventana(self, inicio, fin):
+        """
+        Agregados de los días [inicio, fin]: suma, cuenta, máximo, mínimo y las medias
+        del primer y el último día con datos. Los días sin agregados cuentan como vacíos.
+        """
+        resultado = {"suma": Fraction(0), "cuenta": 0, "maximo": np.nan, "minimo": np.nan,
+                     "primera": None, "ultima": None}
+        if not self.dias:
+            return resultado
+        indice = self._obtener_indice()
+        i, j = max(inicio - indice["base"], 0), min(fin - indice["base"], indice["n"] - 1)
+        if i > j:
+            return resultado
+
+        resultado["suma"] = indice["suma"][j + 1] - indice["suma"][i]
+        resultado["cuenta"] = int(indice["cuenta"][j + 1] - indice["cuenta"][i])
+        resultado["maximo"] = _consultar_tabla(indice["maximo"], np.fmax, i, j)
+        resultado["minimo"] = _consultar_tabla(indice["minimo"], np.fmin, i, j)
+        primero, ultimo = indice["siguiente"][i], indice["anterior"][j]
+        if primero <= j:
+            resultado["primera"] = float(indice["medias"][primero])
+            resultado["ultima"] = float(indice["medias"][ultimo])
+        return resultado
+
+
+class AnaliticaIncremental:
+    """
+    Informe de tendencias incremental por ubicación.
+
+    Guarda los agregados diarios de temperatura, PM10 y PM2.5 de cada celda y
+    calcula el informe de cualquier ventana de días combinándolos, en lugar de
+    recorrer todas las horas. Al ampliar la ventana o avanzar un día solo se
+    calculan los días nuevos y los aún abiertos, que pueden cambiar. El informe
+    es idéntico al del motor "numpy".
+    """
+    VARIABLES = ("temperature_2m_max", "temperature_2m_min", "pm10", "pm2_5", "dias_malos")
+
+    def __init__(self, max_ubicaciones=500, margen_dias=2):
+        """
+        Args:
+            max_ubicaciones: Celdas cuyos agregados se conservan (las menos usadas se descartan)
+            margen_dias: Los días más recientes que este margen se recalculan en cada consulta
+        """
+        self.max_ubicaciones = max_ubicaciones
+        self.margen_dias = margen_dias
+        self._ubicaciones = OrderedDict()  # celda -> {variable: TablaDiaria}
+        self._lock = threading.Lock()
+        self.dias_calculados = 0  # días de las series diarias y horarias agregados hasta ahora
+
+    def _tablas(self, celda):
+        tablas = self._ubicaciones.get(celda)
+        if tablas is None:
+            tablas = self._ubicaciones[celda] = {variable: TablaDiaria() for variable in self.VARIABLES}
+            if len(self._ubicaciones) > self.max_ubicaciones:
+                self._ubicaciones.popitem(last=False)
+        self._ubicaciones.move_to_end(celda)
+        return tablas
+
+    def _actualizar(self, tablas, serie, variables, cerrado):
+        """Actualiza los días de la serie que faltan o siguen abiertos. Devuelve los días de la serie."""
+        dias = serie.tiempo // SEGUNDOS_DIA
+        cortes = np.flatnonzero(np.diff(dias)) + 1
+        inicios = np.concatenate(([0], cortes))
+        fines = np.concatenate((cortes, [len(dias)]))
+        # Las variables de una serie se actualizan juntas: basta con mirar la primera
+        unicos = dias[inicios]
+        pendientes = np.flatnonzero((unicos > cerrado) | ~tablas[variables[0]].presentes(unicos))
+        actualizados = []
+        for dia, desde, hasta in zip(unicos[pendientes].tolist(), inicios[pendientes].tolist(),
+                                     fines[pendientes].tolist()):
+            for variable in variables:
+                columna = serie.get(variable)
+                tablas[variable].actualizar(dia, columna[desde:hasta] if columna is not None else np.empty(0))
+            actualizados.append(dia)
+        self.dias_calculados += len(actualizados)
+        return int(dias[0]), int(dias[-1]), actualizados
+
+    def informe(self, celda, datos_historicos):
+        """
+        Devuelve el informe (sin recomendaciones) de los datos históricos de una celda,
+        o None si sus series no tienen eje de tiempos y hay que usar el motor completo.
+        """
+        daily = datos_historicos.get("weather_historical", {}).get("daily")
+        hourly = datos_historicos.get("air_quality_historical", {}).get("hourly")
+        series = [serie for serie in (daily, hourly) if serie is not None]
+        if not all(isinstance(serie, Serie) and serie.tiempo is not None for serie in series):
+            return None
+
+        informe = {
+            "temperatura": {},
+            "calidad_aire": {},
+            "tendencias": {},
+            "recomendaciones": []
+        }
+        cerrado = (date.today() - timedelta(days=self.margen_dias) - date(1970, 1, 1)).days
+        with self._lock:
+            tablas = self._tablas(celda)
+            if daily is not None and len(daily):
+                inicio, fin, _ = self._actualizar(tablas, daily, self.VARIABLES[:2], cerrado)
+                self._informe_clima(informe, tablas, inicio, fin)
+            if hourly is not None and len(hourly):
+                inicio, fin, actualizados = self._actualizar(tablas, hourly, self.VARIABLES[2:4], cerrado)
+                for dia in actualizados:
+                    pm10, pm25 = tablas["pm10"].media(dia), tablas["pm2_5"].media(dia)
+                    malo = (pm10 is not None and pm10 > UMBRAL_PM10_DIARIO) or \
+                        (pm25 is not None and pm25 > UMBRAL_PM25_DIARIO)
+                    tablas["dias_malos"].actualizar(dia, np.array([float(malo)]))
+                self._informe_calidad_aire(informe, tablas, inicio, fin)
+        return informe
+
+    def _informe_clima(self, informe, tablas, inicio, fin):
+        temps_max = tablas["temperature_2m_max"].ventana(inicio, fin)
+        temps_min = tablas["temperature_2m_min"].ventana(inicio, fin)
+        if not temps_max["cuenta"] or not temps_min["cuenta"]:
+            return
+        max_registrada, min_registrada = temps_max["maximo"], temps_min["minimo"]
+        informe["temperatura"] = {
+            "max_promedio": round(float(temps_max["suma"] / temps_max["cuenta"]), 1),
+            "min_promedio": round(float(temps_min["suma"] / temps_min["cuenta"]), 1),
+            "max_registrada": round(float(max_registrada), 1),
+            "min_registrada": round(float(min_registrada), 1),
+            "variacion": round(float(max_registrada - min_registrada), 1)
+        }
+
+        # Detectar tendencia de temperatura
+        if fin - inicio + 1 > 3:
+            tendencia_temp = "estable"
+            if temps_max["ultima"] > temps_max["primera"] + 2:
+                tendencia_temp = "al alza"
+            elif temps_max["ultima"] < temps_max["primera"] - 2:
+                tendencia_temp = "a la baja"
+            informe["tendencias"]["temperatura"] = tendencia_temp
+
+    def _informe_calidad_aire(self, informe, tablas, inicio, fin):
+        pm10 = tablas["pm10"].ventana(inicio, fin)
+        pm25 = tablas["pm2_5"].ventana(inicio, fin)
+        if not pm10["cuenta"] or not pm25["cuenta"]:
+            return
+        informe["calidad_aire"] = {
+            "pm10_promedio": round(float(pm10["suma"] / pm10["cuenta"]), 2),
+            "pm25_promedio": round(float(pm25["suma"] / pm25["cuenta"]), 2),
+            "pm10_max": round(float(pm10["maximo"]), 2),
+            "pm25_max": round(float(pm25["maximo"]), 2),
+            "dias_calidad_mala": int(tablas["dias_malos"].ventana(inicio, fin)["suma"])
+        }
+
+        # Detectar tendencia de calidad del aire
+        if fin - inicio + 1 > 3:
+            tendencia_aire = "estable"
+            if pm10["ultima"] > pm10["primera"] * 1.2:
+                tendencia_aire = "empeorando"
+            elif pm10["ultima"] < pm10["primera"] * 0.8:
+                tendencia_aire = "mejorando"
+            informe["tendencias"]["calidad_aire"] = tendencia_aire
+
+    def limpiar(self):
+        with self._lock:
+            self._ubicaciones.clear()
+            self.dias_calculados = 0
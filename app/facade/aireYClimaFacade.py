@@ -1,10 +1,70 @@
 # app/facade/aireYClimaFacade.py
 import requests
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TiempoAgotado
+from datetime import date, datetime, timedelta, timezone
 import statistics
+import time
+import numpy as np
+from app.facade.cache import CacheRespuestas
+from app.facade.coalescencia import Coalescedor
+from app.facade.espacial import RESOLUCION_MODELO_KM, IndiceEspacial
+from app.facade.limitador import FONDO, INTERACTIVA, LOTE, PlanificadorSalida, con_prioridad, prioridad_actual, \
+    segundos_retry_after
+from app.facade.precalentamiento import ContadorFrecuentes
+from app.facade.resiliencia import CircuitoAbierto, Disyuntor, PlazoAgotado
+from app.facade.series import SEGUNDOS_DIA, Serie, como_serie, compactar, valores
+from app.facade.agregados import AnaliticaIncremental
+from app.facade.analisis import AgregadorInforme, analizar_tendencias_numpy
+from app.metricas import LIMITES_BYTES, metricas
+
+# Horas de calidad del aire, desde la hora en curso, que devuelven por defecto los datos actuales
+HORAS_ACTUAL = 1
+# Días máximos de histórico por consulta: cada 31 días son dos peticiones a las APIs
+MAX_DIAS_HISTORICO = 366
+# Respuestas de sobrecarga: no las reintenta urllib3 sino _obtener_json, tras pausar
+# el limitador del host, de modo que cada intento gasta su ficha y su cuota
+ESTADOS_SOBRECARGA = (429, 503)
+
+def _hora_en_curso():
+    """Inicio de la hora actual (UTC, la zona de las series de los datos actuales)."""
+    return datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+def alinear_hora_actual(datos, horas, hora=None):
+    """
+    Copia de una respuesta de calidad del aire con sus series horarias recortadas a
+    `horas` horas desde la hora en curso. Si la copia en caché ya no llega a la hora
+    en curso (datos obsoletos), se conservan sus últimas horas.
+    """
+    hourly = datos.get("hourly") if datos else None
+    if not hourly or not hourly.get("time"):
+        return datos
+    hora = (hora or _hora_en_curso()).strftime("%Y-%m-%dT%H:%M")
+    inicio = min(bisect_left(hourly["time"], hora), max(len(hourly["time"]) - horas, 0))
+    return dict(datos, hourly={nombre: valores[inicio:inicio + horas] for nombre, valores in hourly.items()})
 
 class AireYClimaFacade:
-    def __init__(self):
+    def __init__(self, pool_size=10, timeout=(3.05, 10), reintentos=3, backoff=0.5, cache=None,
+                 motor_analisis="numpy", almacen=None, plazo=8.0, radio_celdas_km=RESOLUCION_MODELO_KM,
+                 planificador=None):
+        """
+        Args:
+            pool_size: Hilos de cada ejecutor (interactivo y de lotes) y conexiones
+                keep-alive por host en el pool compartido de cada uno
+            timeout: Timeout (conexión, lectura) en segundos para cada petición
+            reintentos: Número máximo de reintentos ante errores transitorios
+            backoff: Factor de espera exponencial entre reintentos
+            cache: CacheRespuestas a usar (por defecto se crea una nueva)
+            motor_analisis: "numpy" (vectorizado) o "python" para analizar_tendencias
+            almacen: AlmacenSeries para conservar los días históricos ya descargados (opcional)
+            plazo: Segundos máximos que una llamada espera a las APIs externas
+            radio_celdas_km: Distancia a la que una ubicación reutiliza una celda ya consultada
+                (0 para usar siempre la celda de la rejilla de la caché)
+            planificador: PlanificadorSalida con los límites de ritmo y cuota de cada API
+                (por defecto se crea uno nuevo)
+        """
         self.weather_api_url = "https://api.open-meteo.com/v1/forecast"
         self.air_quality_api_url = "https://air-quality-api.open-meteo.com/v1/air-quality"
         self.weather_params = {
@@ -17,33 +77,338 @@ class AireYClimaFacade:
             "longitude": -3.7,
             "hourly": "pm10,pm2_5"
         }
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.backoff = backoff
+        self.plazo = plazo
+        self.motor_analisis = motor_analisis
+        self.almacen = almacen
+
+        # Sesión compartida: reutiliza conexiones entre peticiones y hilos
+        retry = Retry(
+            total=reintentos,
+            backoff_factor=backoff,
+            status_forcelist=(500, 502, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+            respect_retry_after_header=False
+        )
+        # Caben las conexiones de los dos ejecutores, sin descartar ninguna al devolverla
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=2 * pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Ejecutores para lanzar en paralelo las peticiones a las APIs externas. Las de
+        # lotes y de fondo (precalentamiento, exportaciones, refresco de suscripciones)
+        # esperan turno en el limitador dentro de sus hilos: van a un ejecutor propio para
+        # que no ocupen los hilos de las interactivas, que llegarían al limitador (y a su
+        # prioridad) después de que se liberasen
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="aire-clima")
+        self.executor_lote = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="aire-clima-lote")
+
+        # Caché de respuestas por celda de coordenadas
+        self.cache = cache if cache is not None else CacheRespuestas()
+
+        # Las peticiones idénticas simultáneas comparten una sola llamada a la API
+        self.coalescedor = Coalescedor()
+
+        # Consultas más frecuentes, para precalentar su caché en segundo plano
+        self.frecuentes = ContadorFrecuentes()
+
+        # Agregados diarios por ubicación para no recalcular el informe de ventanas solapadas
+        self.analitica = AnaliticaIncremental()
+
+        # Celdas ya consultadas: las ubicaciones cercanas reutilizan sus datos
+        self.celdas = IndiceEspacial(self.cache.resolucion, radio_celdas_km) if radio_celdas_km else None
+
+        # Ritmo, prioridad y cuota diaria de las peticiones a cada host externo
+        self.planificador = planificador if planificador is not None else PlanificadorSalida()
+
+        # Un disyuntor por API externa: si una falla, se deja de esperar por ella
+        self.disyuntores = {
+            "clima": Disyuntor("API de clima"),
+            "calidad_aire": Disyuntor("API de calidad del aire")
+        }
+
+    def resolver_celda(self, latitude, longitude):
+        """
+        Devuelve la celda (latitud, longitud de su centro) cuyos datos se usan para
+        una ubicación: la celda ya consultada más cercana dentro del radio o, si no
+        hay ninguna, la celda de la rejilla de la caché que contiene la ubicación.
+        """
+        centro = (self.cache.ajustar(latitude), self.cache.ajustar(longitude))
+        if self.celdas is None:
+            return centro
+        return self.celdas.resolver(latitude, longitude, centro)
+
+    def _ejecutor(self, prioridad):
+        """Ejecutor de las peticiones de esta prioridad: las de lotes y de fondo van aparte."""
+        return self.executor if prioridad == INTERACTIVA else self.executor_lote
+
+    def _api(self, url):
+        return "clima" if url == self.weather_api_url else "calidad_aire"
+
+    def _disyuntor(self, url):
+        return self.disyuntores[self._api(url)]
+
+    def _medir_respuesta(self, api, inicio, response):
+        """Anota la latencia, el tamaño y el código de una respuesta de la API externa."""
+        metricas.observar("aire_clima_upstream_segundos", time.perf_counter() - inicio, api=api)
+        metricas.observar("aire_clima_upstream_bytes", len(response.content), LIMITES_BYTES, api=api)
+        metricas.incrementar("aire_clima_upstream_respuestas_total", api=api, codigo=response.status_code)
+
+    def _obtener_json(self, url, params, prioridad=None):
+        """Realiza una petición GET con la sesión compartida y devuelve el JSON o {}."""
+        api = self._api(url)
+        disyuntor = self.disyuntores[api]
+        limitador = self.planificador.para(url)
+        for intento in range(self.reintentos + 1):
+            # Esperar turno en el limitador del host antes de consultar el disyuntor
+            limitador.adquirir(prioridad, self.plazo)
+            try:
+                disyuntor.permitir()
+            except CircuitoAbierto:
+                limitador.devolver()
+                raise
+            inicio = time.perf_counter()
+            try:
+                with metricas.en_curso("aire_clima_upstream_en_curso", api=api):
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+            except requests.RequestException:
+                disyuntor.fallo()
+                metricas.incrementar("aire_clima_upstream_errores_total", api=api)
+                raise
+            disyuntor.registrar(response.status_code)
+            self._medir_respuesta(api, inicio, response)
+            if response.status_code not in ESTADOS_SOBRECARGA:
+                break
+            # Todas las peticiones al host esperan lo que pida Retry-After; el reintento
+            # vuelve a pasar por el limitador y se rechaza si la pausa supera el plazo
+            limitador.frenar(segundos_retry_after(response.headers.get("Retry-After"), self.backoff * 2 ** intento))
+        return response.json() if response.status_code == 200 else {}
+
+    def _obtener_y_guardar(self, clave, url, params, prioridad=None, cachear=True):
+        """Obtiene una respuesta de la API y, con `cachear`, la guarda en caché si no está vacía."""
+        datos = self._obtener_json(url, params, prioridad)
+        # Los rangos históricos se guardan como series en columnas
+        if datos and "start_date" in params:
+            datos = compactar(datos)
+        # Las respuestas vacías (errores) no se guardan en caché
+        if datos and cachear:
+            self.cache.guardar(clave, datos)
+        return datos
+
+    def _obtener_en_paralelo(self, *peticiones, antelacion=None, cachear=True):
+        """
+        Resuelve varias peticiones (clave, url, params) consultando primero la caché.
+        Las que no están en caché se lanzan a la vez contra las APIs externas; si
+        otra llamada ya tiene en curso la misma clave, se espera su resultado.
+        Si hay una copia caducada se devuelve sin esperar y se refresca en segundo plano.
+        Con `antelacion`, también se relanzan las que caducan en menos de esos segundos.
+        Sin `cachear`, solo se aprovechan las copias vigentes (sin contar aciertos ni
+        cambiar el orden LRU) y las respuestas nuevas no se guardan en la caché.
+        
+        Raises:
+            PlazoAgotado: Si alguna respuesta sin copia en caché no llega en `plazo` segundos
+        """
+        if antelacion is None and cachear:
+            resultados = [self.cache.obtener(clave) for clave, _, _ in peticiones]
+        else:
+            resultados = [self.cache.vigente(clave, antelacion or 0) for clave, _, _ in peticiones]
+        futuros = {}
+        # Los hilos del executor no heredan el contexto: la prioridad se pasa explícitamente
+        prioridad = prioridad_actual()
+        for i, (clave, url, params) in enumerate(peticiones):
+            if resultados[i] is not None:
+                continue
+            # Las descargas sin caché no se comparten con las que sí la rellenan
+            en_curso = clave if cachear else ("sin_cache", clave)
+            futuro = self.coalescedor.enviar(en_curso, self._ejecutor(prioridad), self._obtener_y_guardar,
+                                             clave, url, params, prioridad, cachear)
+            if antelacion is None and cachear:
+                resultados[i] = self.cache.obtener_obsoleto(clave)
+            if resultados[i] is None:
+                futuros[i] = futuro
+        
+        if not futuros:
+            return resultados
+        limite = time.monotonic() + self.plazo
+        with metricas.tramo("apis"):
+            for i, futuro in futuros.items():
+                try:
+                    resultados[i] = futuro.result(timeout=max(0, limite - time.monotonic()))
+                except TiempoAgotado:
+                    raise PlazoAgotado(f"Sin respuesta de {peticiones[i][1]} en {self.plazo} s") from None
+        return resultados
+
+    def _frescura(self, peticiones):
+        """
+        Edad en segundos de los datos de clima y de calidad del aire servidos desde la
+        caché (la de su petición más antigua), si alguno estaba ya caducado y cuándo se
+        actualizó por última vez (timestamp Unix, sirve como versión de los datos).
+        Edad y actualización son None si ninguna respuesta está en caché (error o
+        datos del almacén local).
+        """
+        frescura = {}
+        for campo, propias in (("weather", peticiones[0::2]), ("air_quality", peticiones[1::2])):
+            edades = [edad for edad in (self.cache.edad(clave) for clave, _, _ in propias) if edad is not None]
+            frescura[campo] = {
+                "edad": round(max(segundos for segundos, _, _ in edades)) if edades else None,
+                "obsoleto": any(caducado for _, caducado, _ in edades),
+                "actualizado": round(max(fecha for _, _, fecha in edades), 3) if edades else None
+            }
+        return frescura
+
+    def recoger_ultimo_dato(self, latitude, longitude, horas=HORAS_ACTUAL):
+        """
+        Obtiene el clima actual y la calidad del aire de las próximas `horas` horas,
+        empezando por la hora en curso (el primer valor de cada serie horaria).
+        """
+        latitude, longitude = self.resolver_celda(latitude, longitude)
+        self.frecuentes.registrar(self.cache.clave("actual", latitude, longitude))
+        
+        # Obtener datos del clima actual y de calidad del aire en paralelo
+        peticiones = self._peticiones_actual(latitude, longitude, horas)
+        weather_data, air_quality_data = self._obtener_en_paralelo(*peticiones)
+        return self._combinar_actual(latitude, longitude, horas, peticiones, weather_data, air_quality_data)
+
+    def _combinar_actual(self, latitude, longitude, horas, peticiones, weather_data, air_quality_data):
+        hora = _hora_en_curso()
+        frescura = self._frescura(peticiones)
+        # La respuesta cambia al cambiar la hora aunque la copia en caché sea la misma
+        frescura["air_quality"]["alineado"] = hora.timestamp()
+        return {
+            "weather": weather_data,
+            "air_quality": alinear_hora_actual(air_quality_data, horas, hora),
+            "frescura": frescura,
+            "celda": {"latitude": latitude, "longitude": longitude}
+        }
 
-    def recoger_ultimo_dato(self, latitude, longitude):
+    def _peticiones_actual(self, latitude, longitude, horas=HORAS_ACTUAL):
+        """Construye las peticiones (clave, url, params) de clima actual y calidad del aire."""
         # Parámetros dinámicos basados en las coordenadas
         weather_params = {
             "latitude": latitude,
             "longitude": longitude,
             "current_weather": True
         }
+        # Solo las horas pedidas desde la hora en curso, en lugar de toda la previsión
+        # horaria; una más para que la copia en caché siga cubriendo la hora siguiente
         air_quality_params = {
             "latitude": latitude,
             "longitude": longitude,
-            "hourly": "pm10,pm2_5"
+            "hourly": "pm10,pm2_5",
+            "forecast_hours": horas + 1
         }
+        return (
+            (self.cache.clave("actual", latitude, longitude), self.weather_api_url, weather_params),
+            (self.cache.clave("horario", latitude, longitude, horas), self.air_quality_api_url, air_quality_params)
+        )
 
-        # Obtener datos del clima actual
-        weather_response = requests.get(self.weather_api_url, params=weather_params)
-        weather_data = weather_response.json() if weather_response.status_code == 200 else {}
+    def recoger_ultimos_datos_lote(self, coordenadas, tam_lote=50):
+        """
+        Obtiene los datos actuales de varias ubicaciones agrupándolas en peticiones
+        multi-coordenada de Open-Meteo (latitudes y longitudes separadas por comas).
+        
+        Args:
+            coordenadas: Lista de tuplas (latitud, longitud)
+            tam_lote: Número máximo de ubicaciones por petición a cada API
+        
+        Returns:
+            Lista con un diccionario {"weather", "air_quality"} por ubicación, en el mismo orden
+        """
+        # Eliminar duplicados: las ubicaciones de la misma celda comparten datos
+        resueltas = [self.resolver_celda(latitude, longitude) for latitude, longitude in coordenadas]
+        datos = self.recoger_datos_celdas(dict.fromkeys(resueltas), tam_lote)
+        
+        hora = _hora_en_curso()
+        return [
+            {
+                "weather": datos[celda]["weather"],
+                "air_quality": alinear_hora_actual(datos[celda]["air_quality"], HORAS_ACTUAL, hora),
+                "celda": {"latitude": celda[0], "longitude": celda[1]}
+            }
+            for celda in resueltas
+        ]
 
-        # Obtener datos de calidad del aire
-        air_quality_response = requests.get(self.air_quality_api_url, params=air_quality_params)
-        air_quality_data = air_quality_response.json() if air_quality_response.status_code == 200 else {}
+    def recoger_datos_celdas(self, celdas, tam_lote=50):
+        """
+        Obtiene el clima actual y la calidad del aire de varias celdas de la rejilla
+        de la caché, sin pasar por el índice de celdas cercanas. Las celdas sin copia
+        vigente en caché se piden en grupos de hasta `tam_lote` por petición; como en
+        _obtener_en_paralelo, las que tienen una copia caducada la devuelven sin
+        esperar y se refrescan en segundo plano.
+        
+        Args:
+            celdas: Celdas (latitud, longitud) distintas, ya ajustadas a la rejilla
+            tam_lote: Número máximo de ubicaciones por petición a cada API
+        
+        Returns:
+            Diccionario celda -> {"weather", "air_quality"}, con las series horarias sin alinear
+        """
+        datos = {celda: {} for celda in celdas}
+        
+        consultas = (
+            ("weather", ("actual",), (), self.weather_api_url, {"current_weather": True}),
+            ("air_quality", ("horario",), (HORAS_ACTUAL,), self.air_quality_api_url,
+             {"hourly": "pm10,pm2_5", "forecast_hours": HORAS_ACTUAL + 1})
+        )
+        futuros = []
+        for campo, tipo, extra, url, params_base in consultas:
+            pendientes = []
+            for celda in datos:
+                valor = self.cache.obtener(tipo + celda + extra)
+                if valor is None:
+                    pendientes.append(celda)
+                    valor = self.cache.obtener_obsoleto(tipo + celda + extra)
+                if valor is not None:
+                    datos[celda][campo] = valor
+            # Una petición por grupo de hasta tam_lote ubicaciones sin copia vigente
+            for inicio in range(0, len(pendientes), tam_lote):
+                grupo = pendientes[inicio:inicio + tam_lote]
+                params = dict(
+                    params_base,
+                    latitude=",".join(str(celda[0]) for celda in grupo),
+                    longitude=",".join(str(celda[1]) for celda in grupo)
+                )
+                futuro = self.coalescedor.enviar((tipo[0], url) + tuple(grupo), self.executor_lote,
+                                                 self._obtener_lote, url, params, grupo, tipo, extra)
+                # Si todas las celdas del grupo tienen copia caducada, no se espera al refresco
+                if any(campo not in datos[celda] for celda in grupo):
+                    futuros.append((campo, tipo, extra, url, grupo, futuro))
+        
+        # Repartir las respuestas entre sus ubicaciones, sin esperar más del plazo
+        limite = time.monotonic() + self.plazo
+        for campo, tipo, extra, url, grupo, futuro in futuros:
+            try:
+                respuestas = futuro.result(timeout=max(0, limite - time.monotonic()))
+            except (requests.RequestException, TiempoAgotado) as e:
+                # Sin turno, sin cuota, con el disyuntor abierto, con error de red o fuera de
+                # plazo: se sirven las copias caducadas que queden (la respuesta que llegue
+                # tarde se guarda igualmente en la caché)
+                copias = [datos[celda].get(campo) for celda in grupo]
+                if isinstance(e, TiempoAgotado) and None in copias:
+                    raise PlazoAgotado(f"Sin respuesta de {url} en {self.plazo} s") from None
+                respuestas = [copia or {} for copia in copias]
+            for celda, valor in zip(grupo, respuestas):
+                datos[celda][campo] = valor
+        return datos
 
-        # Combinar los datos
-        return {
-            "weather": weather_data,
-            "air_quality": air_quality_data
-        }
+    def _obtener_lote(self, url, params, grupo, tipo, extra):
+        """
+        Hace una petición multi-coordenada y guarda en caché la respuesta de cada
+        celda del grupo. Devuelve la lista de respuestas, en el orden del grupo.
+        """
+        respuesta = self._obtener_json(url, params, LOTE)
+        # Open-Meteo devuelve una lista con una respuesta por coordenada (un objeto si es solo una)
+        respuestas = respuesta if isinstance(respuesta, list) else [respuesta]
+        if len(respuestas) != len(grupo):
+            respuestas = [{}] * len(grupo)
+        for celda, valor in zip(grupo, respuestas):
+            if valor:
+                self.cache.guardar(tipo + celda + extra, valor)
+        return respuestas
 
     def obtener_datos_historicos(self, latitude, longitude, dias=7):
         """
@@ -54,13 +419,64 @@ class AireYClimaFacade:
             longitude: Longitud de la ubicación
             dias: Número de días hacia atrás para obtener datos (por defecto 7)
         """
+        latitude, longitude = self.resolver_celda(latitude, longitude)
+        self.frecuentes.registrar(self.cache.clave("historico", latitude, longitude, dias))
+        peticiones, completar = self._planificar_rango(latitude, longitude, *self._rango_fechas(dias))
+        weather_data, air_quality_data = completar(self._obtener_en_paralelo(*peticiones))
+        
+        return {
+            "weather_historical": weather_data,
+            "air_quality_historical": air_quality_data,
+            "frescura": self._frescura(peticiones),
+            "celda": {"latitude": latitude, "longitude": longitude}
+        }
+    
+    def obtener_datos_rango(self, latitude, longitude, desde, hasta, cachear=True):
+        """
+        Obtiene el clima diario y la calidad del aire horaria entre dos fechas.
+        
+        Args:
+            latitude: Latitud de la ubicación
+            longitude: Longitud de la ubicación
+            desde: Primer día (date)
+            hasta: Último día (date), incluido
+            cachear: Si es False, las respuestas descargadas no se guardan en la caché
+                de respuestas (los días cerrados sí van al almacén, si lo hay), para que
+                las descargas masivas no desalojen los datos de las consultas interactivas
+        
+        Returns:
+            Tupla (celda, weather_data, air_quality_data), con la celda como (latitud, longitud)
+        """
+        celda = self.resolver_celda(latitude, longitude)
+        weather_data, air_quality_data = self._obtener_rango_historico(
+            *celda, desde.isoformat(), hasta.isoformat(), cachear)
+        return celda, weather_data, air_quality_data
+    
+    def _rango_fechas(self, dias):
+        """Devuelve las fechas de inicio y fin (YYYY-MM-DD) de los últimos `dias` días."""
         end_date = datetime.now()
         start_date = end_date - timedelta(days=dias)
         
         # Formato de fechas para la API
-        start_date_str = start_date.strftime("%Y-%m-%d")
-        end_date_str = end_date.strftime("%Y-%m-%d")
-        
+        return start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+    
+    def _obtener_rango_historico(self, latitude, longitude, start_date_str, end_date_str, cachear=True):
+        """Obtiene en paralelo el clima diario y la calidad del aire horaria de un rango de fechas."""
+        peticiones, completar = self._planificar_rango(latitude, longitude, start_date_str, end_date_str)
+        return completar(self._obtener_en_paralelo(*peticiones, cachear=cachear))
+    
+    def _planificar_rango(self, latitude, longitude, start_date_str, end_date_str):
+        """
+        Decide qué peticiones hacen falta para un rango de fechas. Devuelve la lista de
+        peticiones (clave, url, params) y una función que, con sus respuestas, construye
+        la tupla (weather_data, air_quality_data) del rango completo.
+        """
+        if self.almacen is not None:
+            return self._planificar_rango_almacenado(latitude, longitude, start_date_str, end_date_str)
+        return self._peticiones_rango(latitude, longitude, start_date_str, end_date_str), tuple
+    
+    def _peticiones_rango(self, latitude, longitude, start_date_str, end_date_str):
+        """Construye las peticiones (clave, url, params) históricas de clima y calidad del aire."""
         # Parámetros para datos históricos de clima
         weather_params = {
             "latitude": latitude,
@@ -81,23 +497,148 @@ class AireYClimaFacade:
             "timezone": "auto"
         }
         
-        # Obtener datos históricos del clima
-        weather_response = requests.get(self.weather_api_url, params=weather_params)
-        weather_data = weather_response.json() if weather_response.status_code == 200 else {}
+        rango = (start_date_str, end_date_str)
+        return (
+            (self.cache.clave("diario", latitude, longitude, *rango), self.weather_api_url, weather_params),
+            (self.cache.clave("horario", latitude, longitude, *rango), self.air_quality_api_url, air_quality_params)
+        )
+    
+    def _planificar_rango_almacenado(self, latitude, longitude, start_date_str, end_date_str):
+        """
+        Los días cerrados se sirven desde el almacén local: solo se piden a las APIs,
+        en una sola tanda de peticiones paralelas, los rangos que faltan y los días recientes.
+        """
+        inicio, fin = date.fromisoformat(start_date_str), date.fromisoformat(end_date_str)
+        celda = (self.cache.ajustar(latitude), self.cache.ajustar(longitude))
+        cerrado = min(fin, self.almacen.ultimo_dia_cerrado())
+        rangos = self.almacen.rangos_faltantes(celda, inicio, cerrado)
+        recientes = (max(inicio, cerrado + timedelta(days=1)), fin) if fin > cerrado else None
         
-        # Obtener datos históricos de calidad del aire
-        air_quality_response = requests.get(self.air_quality_api_url, params=air_quality_params)
-        air_quality_data = air_quality_response.json() if air_quality_response.status_code == 200 else {}
+        peticiones = []
+        for desde, hasta in rangos + ([recientes] if recientes else []):
+            peticiones.extend(self._peticiones_rango(latitude, longitude, desde.isoformat(), hasta.isoformat()))
         
-        return {
-            "weather_historical": weather_data,
-            "air_quality_historical": air_quality_data
-        }
+        def completar(respuestas):
+            # Guardar los días cerrados recién descargados y leer el rango completo del almacén
+            for i, (desde, hasta) in enumerate(rangos):
+                self.almacen.guardar(celda, respuestas[2 * i], respuestas[2 * i + 1], desde, hasta)
+            weather_data, air_quality_data = self.almacen.leer(celda, inicio, cerrado)
+            
+            # Añadir los días recientes, que no se almacenan porque aún pueden cambiar
+            if recientes:
+                weather_reciente, aire_reciente = respuestas[-2:]
+                # Conservar los metadatos (zona horaria, unidades...) de las respuestas
+                weather_data = dict(weather_reciente, daily=Serie.concatenar(
+                    [weather_data["daily"], como_serie(weather_reciente.get("daily"))]))
+                air_quality_data = dict(aire_reciente, hourly=Serie.concatenar(
+                    [air_quality_data["hourly"], como_serie(aire_reciente.get("hourly"))]))
+            return weather_data, air_quality_data
+        
+        return peticiones, completar
+    
+    def precalentar(self, latitude, longitude, dias=None, antelacion=0):
+        """
+        Vuelve a pedir a las APIs los datos de una ubicación cuyas entradas de caché
+        faltan o caducan en menos de `antelacion` segundos.
+        
+        Args:
+            latitude: Latitud de la ubicación
+            longitude: Longitud de la ubicación
+            dias: Días de histórico a refrescar; sin indicar, se refrescan los datos actuales
+            antelacion: Margen en segundos antes de la caducidad
+        
+        Returns:
+            Número de peticiones lanzadas a las APIs externas
+        """
+        latitude, longitude = self.resolver_celda(latitude, longitude)
+        if dias is None:
+            peticiones, completar = self._peticiones_actual(latitude, longitude), tuple
+        else:
+            peticiones, completar = self._planificar_rango(latitude, longitude, *self._rango_fechas(dias))
+        caducadas = sum(self.cache.vigente(clave, antelacion) is None for clave, _, _ in peticiones)
+        if caducadas:
+            # Trabajo de fondo: cede el turno a las consultas de los usuarios
+            with con_prioridad(FONDO):
+                completar(self._obtener_en_paralelo(*peticiones, antelacion=antelacion))
+        return caducadas
+    
+    def iterar_datos_historicos(self, latitude, longitude, dias=7, dias_por_bloque=31):
+        """
+        Versión en streaming de obtener_datos_historicos: genera un registro por día
+        y, al final, un registro con el informe calculado de forma incremental.
+        Las APIs se consultan por bloques de como máximo `dias_por_bloque` días,
+        por lo que la memoria usada no depende de la longitud del periodo.
+        
+        Yields:
+            {"tipo": "dia", "fecha", "temperature_2m_max", "temperature_2m_min", "pm10", "pm2_5"}
+            y, como último registro, {"tipo": "informe", "informe": {...}, "celda": {...}}
+        """
+        latitude, longitude = self.resolver_celda(latitude, longitude)
+        end_date = datetime.now().date()
+        inicio = end_date - timedelta(days=dias)
+        agregador = AgregadorInforme()
+        
+        while inicio <= end_date:
+            fin = min(inicio + timedelta(days=dias_por_bloque - 1), end_date)
+            weather_data, air_quality_data = self._obtener_rango_historico(
+                latitude, longitude, inicio.strftime("%Y-%m-%d"), fin.strftime("%Y-%m-%d"))
+            daily = como_serie(weather_data.get("daily"))
+            hourly = como_serie(air_quality_data.get("hourly"))
+            temps_max = daily.lista("temperature_2m_max")
+            temps_min = daily.lista("temperature_2m_min")
+            
+            # Cada día se busca por su medianoche en el eje de tiempos, no por su
+            # posición: un hueco o un día incompleto no desplaza los siguientes
+            dias_bloque = (fin - inicio).days + 1
+            medianoches = np.datetime64(inicio, "s").astype(np.int64) + np.arange(dias_bloque + 1) * SEGUNDOS_DIA
+            horas = hourly.posiciones(medianoches)
+            diarios = daily.posiciones(medianoches[:-1])
+            for i in range(dias_bloque):
+                j = diarios[i]
+                propio = daily.tiempo is not None and j < len(daily.tiempo) and daily.tiempo[j] == medianoches[i]
+                dia = {
+                    "tipo": "dia",
+                    "fecha": (inicio + timedelta(days=i)).strftime("%Y-%m-%d"),
+                    "temperature_2m_max": temps_max[j] if propio and j < len(temps_max) else None,
+                    "temperature_2m_min": temps_min[j] if propio and j < len(temps_min) else None,
+                    "pm10": hourly.lista("pm10", horas[i], horas[i + 1]),
+                    "pm2_5": hourly.lista("pm2_5", horas[i], horas[i + 1])
+                }
+                agregador.agregar_dia(dia["temperature_2m_max"], dia["temperature_2m_min"], dia["pm10"], dia["pm2_5"])
+                yield dia
+            inicio = fin + timedelta(days=1)
+        
+        informe = agregador.informe()
+        self._generar_recomendaciones(informe)
+        yield {"tipo": "informe", "informe": informe, "celda": {"latitude": latitude, "longitude": longitude}}
     
     def analizar_tendencias(self, datos_historicos):
         """
         Analiza tendencias en los datos históricos para generar un informe.
+        
+        Args:
+            datos_historicos: Resultado de obtener_datos_historicos; con el motor "numpy",
+                su "celda" (ya resuelta al obtenerlos) permite reutilizar los agregados
+                diarios de consultas anteriores de la misma celda
         """
+        with metricas.tramo("analisis"):
+            if self.motor_analisis == "numpy":
+                informe = None
+                celda = datos_historicos.get("celda")
+                if celda is not None:
+                    informe = self.analitica.informe((celda["latitude"], celda["longitude"]), datos_historicos)
+                if informe is None:
+                    informe = analizar_tendencias_numpy(datos_historicos)
+            else:
+                informe = self._analizar_tendencias_python(datos_historicos)
+            
+            # Generar recomendaciones
+            self._generar_recomendaciones(informe)
+        
+        return informe
+    
+    def _analizar_tendencias_python(self, datos_historicos):
+        """Motor de análisis original, basado en listas y statistics.mean."""
         informe = {
             "temperatura": {},
             "calidad_aire": {},
@@ -108,9 +649,9 @@ class AireYClimaFacade:
         # Analizar datos del clima
         try:
             if "weather_historical" in datos_historicos and "daily" in datos_historicos["weather_historical"]:
-                temps_max = datos_historicos["weather_historical"]["daily"].get("temperature_2m_max", [])
-                temps_min = datos_historicos["weather_historical"]["daily"].get("temperature_2m_min", [])
-                fechas = datos_historicos["weather_historical"]["daily"].get("time", [])
+                daily = datos_historicos["weather_historical"]["daily"]
+                temps_max = valores(daily, "temperature_2m_max")
+                temps_min = valores(daily, "temperature_2m_min")
                 
                 if temps_max and temps_min:
                     informe["temperatura"] = {
@@ -135,8 +676,9 @@ class AireYClimaFacade:
         # Analizar datos de calidad del aire
         try:
             if "air_quality_historical" in datos_historicos and "hourly" in datos_historicos["air_quality_historical"]:
-                pm10_values = datos_historicos["air_quality_historical"]["hourly"].get("pm10", [])
-                pm25_values = datos_historicos["air_quality_historical"]["hourly"].get("pm2_5", [])
+                hourly = datos_historicos["air_quality_historical"]["hourly"]
+                pm10_values = valores(hourly, "pm10")
+                pm25_values = valores(hourly, "pm2_5")
                 
                 if pm10_values and pm25_values:
                     # Agrupar por día para tener valores diarios
@@ -166,9 +708,6 @@ class AireYClimaFacade:
         except Exception as e:
             informe["errores"] = informe.get("errores", []) + [f"Error analizando calidad del aire: {str(e)}"]
         
-        # Generar recomendaciones
-        self._generar_recomendaciones(informe)
-        
         return informe
     
     def _generar_recomendaciones(self, informe):
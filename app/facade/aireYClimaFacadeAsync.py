@@ -0,0 +1,198 @@
+# app/facade/aireYClimaFacadeAsync.py
+import asyncio
+import itertools
+import time
+
+import httpx
+import requests
+
+from app.facade.aireYClimaFacade import ESTADOS_SOBRECARGA, HORAS_ACTUAL, AireYClimaFacade
+from app.facade.limitador import segundos_retry_after
+from app.facade.resiliencia import CircuitoAbierto, PlazoAgotado
+from app.facade.series import compactar
+from app.metricas import metricas
+
+# Códigos de estado ante los que se reintenta la petición
+ESTADOS_REINTENTABLES = (429, 500, 502, 503, 504)
+
+# Conexiones de cada cliente httpx en que se reparte el pool
+CONEXIONES_POR_CLIENTE = 10
+
+class AireYClimaFacadeAsync(AireYClimaFacade):
+    """
+    Variante asíncrona de AireYClimaFacade para servir la API bajo ASGI.
+
+    Comparte con la fachada síncrona la caché, el almacén, la construcción de
+    peticiones y el análisis, pero consulta las APIs externas con
+    httpx.AsyncClient: una petición en espera no ocupa un hilo, por lo que un
+    solo proceso puede atender miles de peticiones simultáneas.
+    recoger_ultimo_dato y obtener_datos_historicos son aquí corrutinas.
+    """
+
+    def __init__(self, pool_size=100, timeout=(3.05, 10), reintentos=3, backoff=0.5, transport=None, **kwargs):
+        """
+        Args:
+            pool_size: Conexiones simultáneas máximas con las APIs externas
+            timeout: Timeout (conexión, lectura) en segundos para cada petición
+            reintentos: Reintentos ante errores de conexión o estados 429/5xx
+            backoff: Factor de espera exponencial entre reintentos
+            transport: Transporte httpx alternativo (p. ej. httpx.MockTransport en pruebas)
+            **kwargs: Resto de argumentos de AireYClimaFacade (cache, almacen, motor_analisis)
+        """
+        super().__init__(pool_size=pool_size, timeout=timeout, reintentos=reintentos, backoff=backoff, **kwargs)
+        self.pool_size = pool_size
+        self._transport = transport
+        self._clientes = None
+        self._limite = None
+
+    @classmethod
+    def compartiendo(cls, fachada, **kwargs):
+        """
+        Crea una fachada asíncrona que comparte con la fachada síncrona `fachada` la
+        caché, el almacén, los límites de salida, los disyuntores, el índice de
+        celdas, los agregados y el contador de ubicaciones frecuentes, de modo que
+        ambas sirven los mismos datos sin duplicar memoria ni cuota.
+        
+        Args:
+            fachada: AireYClimaFacade del proceso (app.servicios.fachada)
+            **kwargs: Argumentos propios de la fachada asíncrona (pool_size, transport...)
+        """
+        asincrona = cls(cache=fachada.cache, almacen=fachada.almacen, planificador=fachada.planificador,
+                        plazo=fachada.plazo, motor_analisis=fachada.motor_analisis, **kwargs)
+        for atributo in ("session", "executor", "executor_lote", "coalescedor", "disyuntores", "celdas",
+                         "analitica", "frecuentes"):
+            setattr(asincrona, atributo, getattr(fachada, atributo))
+        return asincrona
+
+    def _cliente_http(self):
+        """
+        Devuelve uno de los clientes del reparto. El pool de httpcore recorre
+        todas sus conexiones por cada petición en curso, así que en lugar de un
+        único pool grande se reparten las conexiones entre varios clientes de
+        CONEXIONES_POR_CLIENTE conexiones.
+        """
+        # Los clientes se crean en el bucle de eventos que los usa, no al importar el módulo
+        if self._clientes is None:
+            num_clientes = 1 if self._transport else -(-self.pool_size // CONEXIONES_POR_CLIENTE)
+            por_cliente = -(-self.pool_size // num_clientes)
+            limites = httpx.Limits(max_connections=por_cliente, max_keepalive_connections=por_cliente)
+            timeout = httpx.Timeout(self.timeout[1], connect=self.timeout[0])
+            self._clientes = [
+                httpx.AsyncClient(
+                    transport=self._transport or httpx.AsyncHTTPTransport(retries=self.reintentos, limits=limites),
+                    timeout=timeout
+                )
+                for _ in range(num_clientes)
+            ]
+            self._turno = itertools.cycle(self._clientes)
+            # Las peticiones que superan el total de conexiones esperan aquí y no
+            # en la cola de httpcore
+            self._limite = asyncio.Semaphore(self.pool_size)
+        return next(self._turno)
+
+    async def cerrar(self):
+        """Cierra las conexiones de los clientes asíncronos."""
+        if self._clientes is not None:
+            for cliente in self._clientes:
+                await cliente.aclose()
+            self._clientes = self._limite = None
+
+    async def _obtener_json_async(self, url, params):
+        """
+        Realiza una petición GET asíncrona y devuelve el JSON o {}. Los errores de
+        httpx se traducen a las excepciones de requests que lanza la fachada síncrona.
+        """
+        api = self._api(url)
+        disyuntor = self.disyuntores[api]
+        limitador = self.planificador.para(url)
+        cliente = self._cliente_http()
+        for intento in range(self.reintentos + 1):
+            # Cada intento espera su turno; la prioridad llega con el contexto, que
+            # las tareas de asyncio sí heredan
+            await limitador.adquirir_async(plazo=self.plazo)
+            try:
+                disyuntor.permitir()
+            except CircuitoAbierto:
+                limitador.devolver()
+                raise
+            inicio = time.perf_counter()
+            try:
+                with metricas.en_curso("aire_clima_upstream_en_curso", api=api):
+                    async with self._limite:
+                        response = await cliente.get(url, params=params)
+            except httpx.TimeoutException as e:
+                disyuntor.fallo()
+                metricas.incrementar("aire_clima_upstream_errores_total", api=api)
+                raise requests.Timeout(str(e)) from e
+            except httpx.HTTPError as e:
+                disyuntor.fallo()
+                metricas.incrementar("aire_clima_upstream_errores_total", api=api)
+                raise requests.ConnectionError(str(e)) from e
+            disyuntor.registrar(response.status_code)
+            self._medir_respuesta(api, inicio, response)
+            if response.status_code not in ESTADOS_REINTENTABLES or intento == self.reintentos:
+                break
+            espera = self.backoff * 2 ** intento
+            if response.status_code in ESTADOS_SOBRECARGA:
+                # Todo el host espera lo que pida Retry-After, no solo este reintento
+                limitador.frenar(segundos_retry_after(response.headers.get("Retry-After"), espera))
+            else:
+                await asyncio.sleep(espera)
+        return response.json() if response.status_code == 200 else {}
+
+    async def _obtener_y_guardar_async(self, clave, url, params):
+        datos = await self._obtener_json_async(url, params)
+        # Los rangos históricos se guardan como series en columnas
+        if datos and "start_date" in params:
+            datos = compactar(datos)
+        # Las respuestas vacías (errores) no se guardan en caché
+        if datos:
+            self.cache.guardar(clave, datos)
+        return datos
+
+    async def _obtener_en_paralelo_async(self, *peticiones):
+        """
+        Equivalente asíncrono de _obtener_en_paralelo: caché primero, las copias
+        caducadas se sirven mientras se refrescan y el resto se piden a la vez.
+        """
+        resultados = [self.cache.obtener(clave) for clave, _, _ in peticiones]
+        tareas = {}
+        for i, peticion in enumerate(peticiones):
+            if resultados[i] is not None:
+                continue
+            tarea = self.coalescedor.lanzar_async(peticion[0], lambda p=peticion: self._obtener_y_guardar_async(*p))
+            resultados[i] = self.cache.obtener_obsoleto(peticion[0])
+            if resultados[i] is None:
+                tareas[i] = tarea
+        
+        if not tareas:
+            return resultados
+        try:
+            # shield: al agotarse el plazo se deja de esperar, pero las peticiones siguen
+            with metricas.tramo("apis"):
+                respuestas = await asyncio.wait_for(
+                    asyncio.gather(*map(asyncio.shield, tareas.values())), self.plazo)
+        except asyncio.TimeoutError:
+            raise PlazoAgotado(f"Sin respuesta de las APIs externas en {self.plazo} s") from None
+        for i, datos in zip(tareas, respuestas):
+            resultados[i] = datos
+        return resultados
+
+    async def recoger_ultimo_dato(self, latitude, longitude, horas=HORAS_ACTUAL):
+        latitude, longitude = self.resolver_celda(latitude, longitude)
+        self.frecuentes.registrar(self.cache.clave("actual", latitude, longitude))
+        peticiones = self._peticiones_actual(latitude, longitude, horas)
+        weather_data, air_quality_data = await self._obtener_en_paralelo_async(*peticiones)
+        return self._combinar_actual(latitude, longitude, horas, peticiones, weather_data, air_quality_data)
+
+    async def obtener_datos_historicos(self, latitude, longitude, dias=7):
+        latitude, longitude = self.resolver_celda(latitude, longitude)
+        self.frecuentes.registrar(self.cache.clave("historico", latitude, longitude, dias))
+        peticiones, completar = self._planificar_rango(latitude, longitude, *self._rango_fechas(dias))
+        weather_data, air_quality_data = completar(await self._obtener_en_paralelo_async(*peticiones))
+        return {
+            "weather_historical": weather_data,
+            "air_quality_historical": air_quality_data,
+            "frescura": self._frescura(peticiones),
+            "celda": {"latitude": latitude, "longitude": longitude}
+        }
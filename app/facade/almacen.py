@@ -0,0 +1,146 @@
+# app/facade/almacen.py
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.facade.series import UNIDAD_DIARIA, Serie, como_serie
+
+HORAS_DIA = 24
+SIN_VALORES = np.empty(0)
+
+def _dias(inicio, fin):
+    return [inicio + timedelta(days=d) for d in range((fin - inicio).days + 1)]
+
+
+class AlmacenSeries:
+    """
+    Almacén local (SQLite) de series históricas por celda de coordenadas.
+
+    Guarda la temperatura diaria y los valores horarios de PM10/PM2.5 de los
+    días ya cerrados, que no cambian, para que las consultas históricas solo
+    tengan que pedir a las APIs los días que faltan y los más recientes.
+    """
+
+    def __init__(self, ruta=":memory:", margen_dias=2):
+        """
+        Args:
+            ruta: Fichero SQLite del almacén
+            margen_dias: Los días más recientes que este margen (respecto a hoy) se
+                consideran aún abiertos y no se guardan
+        """
+        self.margen_dias = margen_dias
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(ruta, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS clima_diario ("
+                "latitud REAL, longitud REAL, fecha TEXT, temp_max REAL, temp_min REAL, "
+                "PRIMARY KEY (latitud, longitud, fecha))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS calidad_aire_horaria ("
+                "latitud REAL, longitud REAL, fecha TEXT, pm10 BLOB, pm2_5 BLOB, "
+                "PRIMARY KEY (latitud, longitud, fecha))"
+            )
+
+    def ultimo_dia_cerrado(self):
+        """Último día cuyos datos se consideran definitivos."""
+        return date.today() - timedelta(days=self.margen_dias)
+
+    def rangos_faltantes(self, celda, inicio, fin):
+        """
+        Devuelve los rangos contiguos (inicio, fin) de días de [inicio, fin] que no
+        están completos en el almacén (falta el clima o la calidad del aire).
+        """
+        if fin < inicio:
+            return []
+        completos = set()
+        with self._lock:
+            filas = self._db.execute(
+                "SELECT c.fecha FROM clima_diario c JOIN calidad_aire_horaria a "
+                "ON a.latitud = c.latitud AND a.longitud = c.longitud AND a.fecha = c.fecha "
+                "WHERE c.latitud = ? AND c.longitud = ? AND c.fecha BETWEEN ? AND ?",
+                (celda[0], celda[1], inicio.isoformat(), fin.isoformat())
+            ).fetchall()
+        completos.update(fila[0] for fila in filas)
+
+        rangos = []
+        for dia in _dias(inicio, fin):
+            if dia.isoformat() in completos:
+                continue
+            if rangos and rangos[-1][1] == dia - timedelta(days=1):
+                rangos[-1] = (rangos[-1][0], dia)
+            else:
+                rangos.append((dia, dia))
+        return rangos
+
+    def guardar(self, celda, weather_data, air_quality_data, inicio, fin):
+        """Guarda los días de [inicio, fin] presentes en las respuestas de las APIs."""
+        inicio_str, fin_str = inicio.isoformat(), fin.isoformat()
+        daily = como_serie(weather_data.get("daily"))
+        filas_clima = [
+            (celda[0], celda[1], fecha, temp_max, temp_min)
+            for fecha, temp_max, temp_min in zip(
+                daily.fechas(), daily.lista("temperature_2m_max"), daily.lista("temperature_2m_min"))
+            if inicio_str <= fecha <= fin_str
+        ]
+
+        # Los 24 valores horarios de cada día se guardan como dobles (los huecos, como NaN)
+        hourly = como_serie(air_quality_data.get("hourly"))
+        fechas, pm10, pm25 = hourly.fechas(), hourly.get("pm10", SIN_VALORES), hourly.get("pm2_5", SIN_VALORES)
+        filas_aire = []
+        for i in range(0, min(len(fechas), len(pm10), len(pm25)), HORAS_DIA):
+            # Solo se guardan días completos
+            if inicio_str <= fechas[i] <= fin_str and len(pm10[i:i + HORAS_DIA]) == HORAS_DIA:
+                filas_aire.append((celda[0], celda[1], fechas[i],
+                                   pm10[i:i + HORAS_DIA].tobytes(), pm25[i:i + HORAS_DIA].tobytes()))
+
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO clima_diario VALUES (?, ?, ?, ?, ?)", filas_clima)
+            self._db.executemany("INSERT OR REPLACE INTO calidad_aire_horaria VALUES (?, ?, ?, ?, ?)", filas_aire)
+
+    def leer(self, celda, inicio, fin):
+        """
+        Devuelve (weather_data, air_quality_data) de [inicio, fin] con el mismo
+        formato que las respuestas de Open-Meteo, con las series como Serie.
+        """
+        parametros = (celda[0], celda[1], inicio.isoformat(), fin.isoformat())
+        with self._lock:
+            filas_clima = self._db.execute(
+                "SELECT fecha, temp_max, temp_min FROM clima_diario "
+                "WHERE latitud = ? AND longitud = ? AND fecha BETWEEN ? AND ? ORDER BY fecha", parametros
+            ).fetchall()
+            filas_aire = self._db.execute(
+                "SELECT fecha, pm10, pm2_5 FROM calidad_aire_horaria "
+                "WHERE latitud = ? AND longitud = ? AND fecha BETWEEN ? AND ? ORDER BY fecha", parametros
+            ).fetchall()
+
+        fechas, temps_max, temps_min = zip(*filas_clima) if filas_clima else ((), (), ())
+        daily = Serie.desde_json({
+            "time": list(fechas),
+            "temperature_2m_max": temps_max,
+            "temperature_2m_min": temps_min
+        })
+        daily.unidad = UNIDAD_DIARIA
+
+        # Los días se leen en bloque, sin pasar por listas de floats
+        dias = np.array([fila[0] for fila in filas_aire], dtype="datetime64[s]").astype(np.int64)
+        horas = np.arange(HORAS_DIA, dtype=np.int64) * 3600
+        hourly = Serie(
+            (dias[:, None] + horas).ravel(),
+            {
+                "pm10": np.frombuffer(b"".join(fila[1] for fila in filas_aire)),
+                "pm2_5": np.frombuffer(b"".join(fila[2] for fila in filas_aire))
+            }
+        )
+
+        return {"daily": daily}, {"hourly": hourly}
+
+    def limpiar(self):
+        """Elimina todas las series almacenadas."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM clima_diario")
+            self._db.execute("DELETE FROM calidad_aire_horaria")
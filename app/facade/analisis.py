@@ -0,0 +1,289 @@
+# app/facade/analisis.py
+import statistics
+import warnings
+from fractions import Fraction
+
+import numpy as np
+
+# Umbrales diarios (µg/m³) a partir de los cuales un día cuenta como de mala calidad del aire
+UMBRAL_PM10_DIARIO = 50
+UMBRAL_PM25_DIARIO = 25
+
+# Umbrales de PM10 y PM2.5 (µg/m³) de cada calidad del aire, de peor a mejor: se
+# aplica la primera que supera cualquiera de los dos. Por debajo de todas, "Muy buena".
+UMBRALES_CALIDAD = (
+    (150, 75, "Mala calidad"),
+    (100, 50, "Algo mala"),
+    (50, 25, "Media"),
+    (25, 15, "Buena")
+)
+
+# Distancia a un empate de redondeo o a un umbral por debajo de la cual la media
+# vectorizada se recalcula con aritmética exacta, como hace statistics.mean
+TOLERANCIA = 1e-6
+
+def _a_array(valores):
+    """Convierte una lista de la API (con posibles None) en un array float con NaN."""
+    return np.asarray(valores if valores is not None else [], dtype=float)
+
+def _extremos_validos(valores):
+    """Devuelve el primer y el último valor no NaN del array."""
+    validos = np.flatnonzero(~np.isnan(valores))
+    return valores[validos[0]], valores[validos[-1]]
+
+def _media_exacta(valores):
+    """Media de los valores no NaN, idéntica a la de statistics.mean (o NaN si no hay)."""
+    validos = valores[~np.isnan(valores)]
+    return statistics.mean(validos.tolist()) if validos.size else np.nan
+
+def _media_redondeada(valores, decimales):
+    """
+    Equivale a round(statistics.mean(valores), decimales) ignorando NaN. La media
+    se calcula vectorizada y solo cerca de un empate de redondeo se recurre a la
+    media exacta, para que ambos motores den siempre el mismo resultado.
+    """
+    media = float(np.nanmean(valores))
+    escalada = media * 10 ** decimales
+    if abs(escalada - np.floor(escalada) - 0.5) < TOLERANCIA:
+        media = _media_exacta(valores)
+    return round(media, decimales)
+
+def promedios_diarios(valores_horarios):
+    """
+    Agrupa una serie horaria en bloques de 24 horas y devuelve la media de cada día.
+    El último bloque puede estar incompleto; los huecos (NaN) no cuentan en la media.
+    """
+    dias = -(-len(valores_horarios) // 24)
+    bloques = np.full(dias * 24, np.nan)
+    bloques[:len(valores_horarios)] = valores_horarios
+    with warnings.catch_warnings():
+        # Un día sin ningún dato válido produce NaN, no un aviso
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.nanmean(bloques.reshape(dias, 24), axis=1)
+
+def _afinar_promedios(valores_horarios, promedios, umbral):
+    """
+    Recalcula con aritmética exacta las medias diarias que deciden comparaciones:
+    las que quedan junto al umbral de día malo y la primera y la última válidas,
+    que determinan la tendencia.
+    """
+    validos = np.flatnonzero(~np.isnan(promedios))
+    if not validos.size:
+        return promedios
+    cerca_umbral = np.flatnonzero(np.abs(promedios - umbral) < TOLERANCIA)
+    for dia in set(cerca_umbral.tolist()) | {validos[0], validos[-1]}:
+        promedios[dia] = _media_exacta(valores_horarios[dia * 24:(dia + 1) * 24])
+    return promedios
+
+def analizar_clima(daily):
+    """Calcula el bloque de temperatura y su tendencia a partir de la serie diaria."""
+    temperatura, tendencias = {}, {}
+    temps_max = _a_array(daily.get("temperature_2m_max"))
+    temps_min = _a_array(daily.get("temperature_2m_min"))
+    if np.isnan(temps_max).all() or np.isnan(temps_min).all():
+        return temperatura, tendencias
+
+    max_registrada = np.nanmax(temps_max)
+    min_registrada = np.nanmin(temps_min)
+    temperatura = {
+        "max_promedio": _media_redondeada(temps_max, 1),
+        "min_promedio": _media_redondeada(temps_min, 1),
+        "max_registrada": round(float(max_registrada), 1),
+        "min_registrada": round(float(min_registrada), 1),
+        "variacion": round(float(max_registrada - min_registrada), 1)
+    }
+
+    # Detectar tendencia de temperatura
+    if len(temps_max) > 3:
+        primera, ultima = _extremos_validos(temps_max)
+        tendencia_temp = "estable"
+        if ultima > primera + 2:
+            tendencia_temp = "al alza"
+        elif ultima < primera - 2:
+            tendencia_temp = "a la baja"
+        tendencias["temperatura"] = tendencia_temp
+    return temperatura, tendencias
+
+def analizar_calidad_aire(hourly):
+    """Calcula el bloque de calidad del aire y su tendencia a partir de la serie horaria."""
+    calidad_aire, tendencias = {}, {}
+    pm10_values = _a_array(hourly.get("pm10"))
+    pm25_values = _a_array(hourly.get("pm2_5"))
+    if np.isnan(pm10_values).all() or np.isnan(pm25_values).all():
+        return calidad_aire, tendencias
+
+    pm10_promedios = _afinar_promedios(pm10_values, promedios_diarios(pm10_values), UMBRAL_PM10_DIARIO)
+    pm25_promedios = _afinar_promedios(pm25_values, promedios_diarios(pm25_values), UMBRAL_PM25_DIARIO)
+    dias = min(len(pm10_promedios), len(pm25_promedios))
+    dias_malos = (pm10_promedios[:dias] > UMBRAL_PM10_DIARIO) | (pm25_promedios[:dias] > UMBRAL_PM25_DIARIO)
+
+    calidad_aire = {
+        "pm10_promedio": _media_redondeada(pm10_values, 2),
+        "pm25_promedio": _media_redondeada(pm25_values, 2),
+        "pm10_max": round(float(np.nanmax(pm10_values)), 2),
+        "pm25_max": round(float(np.nanmax(pm25_values)), 2),
+        "dias_calidad_mala": int(np.count_nonzero(dias_malos))
+    }
+
+    # Detectar tendencia de calidad del aire
+    if len(pm10_promedios) > 3 and not np.isnan(pm10_promedios).all():
+        primero, ultimo = _extremos_validos(pm10_promedios)
+        tendencia_aire = "estable"
+        if ultimo > primero * 1.2:
+            tendencia_aire = "empeorando"
+        elif ultimo < primero * 0.8:
+            tendencia_aire = "mejorando"
+        tendencias["calidad_aire"] = tendencia_aire
+    return calidad_aire, tendencias
+
+def analizar_tendencias_numpy(datos_historicos):
+    """
+    Motor vectorizado de análisis de tendencias. Produce el mismo esquema de
+    informe que AireYClimaFacade.analizar_tendencias (sin las recomendaciones)
+    y tolera huecos (None) en las series de la API.
+    """
+    informe = {
+        "temperatura": {},
+        "calidad_aire": {},
+        "tendencias": {},
+        "recomendaciones": []
+    }
+
+    try:
+        daily = datos_historicos.get("weather_historical", {}).get("daily")
+        if daily:
+            informe["temperatura"], tendencias = analizar_clima(daily)
+            informe["tendencias"].update(tendencias)
+    except Exception as e:
+        informe["errores"] = informe.get("errores", []) + [f"Error analizando clima: {str(e)}"]
+
+    try:
+        hourly = datos_historicos.get("air_quality_historical", {}).get("hourly")
+        if hourly:
+            informe["calidad_aire"], tendencias = analizar_calidad_aire(hourly)
+            informe["tendencias"].update(tendencias)
+    except Exception as e:
+        informe["errores"] = informe.get("errores", []) + [f"Error analizando calidad del aire: {str(e)}"]
+
+    return informe
+
+
+class SumaExacta:
+    """
+    Suma incremental exacta de floats (algoritmo de Shewchuk, el de math.fsum).
+    Su media coincide con la de statistics.mean sin guardar los valores.
+    """
+    __slots__ = ("parciales", "n")
+
+    def __init__(self):
+        self.parciales = []
+        self.n = 0
+
+    def agregar(self, x):
+        self.n += 1
+        i = 0
+        for y in self.parciales:
+            if abs(x) < abs(y):
+                x, y = y, x
+            hi = x + y
+            lo = y - (hi - x)
+            if lo:
+                self.parciales[i] = lo
+                i += 1
+            x = hi
+        self.parciales[i:] = [x]
+
+    def media(self):
+        total = sum(map(Fraction, self.parciales), Fraction(0))
+        return float(total / self.n)
+
+
+class AgregadorInforme:
+    """
+    Calcula el informe de tendencias día a día con agregados acumulados, sin
+    guardar las series. Produce el mismo informe que el motor "python" (sin
+    recomendaciones) y omite los huecos (None).
+    """
+
+    def __init__(self):
+        self.dias_temperatura = 0
+        self.suma_max, self.suma_min = SumaExacta(), SumaExacta()
+        self.max_registrada = self.min_registrada = None
+        self.primera_max = self.ultima_max = None
+        self.dias_aire = 0
+        self.suma_pm10, self.suma_pm25 = SumaExacta(), SumaExacta()
+        self.pm10_max = self.pm25_max = None
+        self.primer_pm10_diario = self.ultimo_pm10_diario = None
+        self.dias_calidad_mala = 0
+
+    def agregar_dia(self, temp_max, temp_min, pm10_horas, pm25_horas):
+        """Incorpora un día: temperaturas máxima y mínima y sus 24 valores horarios de PM."""
+        if temp_max is not None and temp_min is not None:
+            self.dias_temperatura += 1
+            self.suma_max.agregar(temp_max)
+            self.suma_min.agregar(temp_min)
+            self.max_registrada = temp_max if self.max_registrada is None else max(self.max_registrada, temp_max)
+            self.min_registrada = temp_min if self.min_registrada is None else min(self.min_registrada, temp_min)
+            if self.primera_max is None:
+                self.primera_max = temp_max
+            self.ultima_max = temp_max
+
+        dia_pm10, dia_pm25 = SumaExacta(), SumaExacta()
+        for valor in pm10_horas or ():
+            if valor is not None:
+                dia_pm10.agregar(valor)
+                self.suma_pm10.agregar(valor)
+                self.pm10_max = valor if self.pm10_max is None else max(self.pm10_max, valor)
+        for valor in pm25_horas or ():
+            if valor is not None:
+                dia_pm25.agregar(valor)
+                self.suma_pm25.agregar(valor)
+                self.pm25_max = valor if self.pm25_max is None else max(self.pm25_max, valor)
+        if dia_pm10.n and dia_pm25.n:
+            self.dias_aire += 1
+            pm10_diario, pm25_diario = dia_pm10.media(), dia_pm25.media()
+            if pm10_diario > UMBRAL_PM10_DIARIO or pm25_diario > UMBRAL_PM25_DIARIO:
+                self.dias_calidad_mala += 1
+            if self.primer_pm10_diario is None:
+                self.primer_pm10_diario = pm10_diario
+            self.ultimo_pm10_diario = pm10_diario
+
+    def informe(self):
+        """Devuelve el informe con el mismo esquema que analizar_tendencias."""
+        informe = {
+            "temperatura": {},
+            "calidad_aire": {},
+            "tendencias": {},
+            "recomendaciones": []
+        }
+        if self.dias_temperatura:
+            informe["temperatura"] = {
+                "max_promedio": round(self.suma_max.media(), 1),
+                "min_promedio": round(self.suma_min.media(), 1),
+                "max_registrada": round(self.max_registrada, 1),
+                "min_registrada": round(self.min_registrada, 1),
+                "variacion": round(self.max_registrada - self.min_registrada, 1)
+            }
+            if self.dias_temperatura > 3:
+                tendencia_temp = "estable"
+                if self.ultima_max > self.primera_max + 2:
+                    tendencia_temp = "al alza"
+                elif self.ultima_max < self.primera_max - 2:
+                    tendencia_temp = "a la baja"
+                informe["tendencias"]["temperatura"] = tendencia_temp
+        if self.dias_aire:
+            informe["calidad_aire"] = {
+                "pm10_promedio": round(self.suma_pm10.media(), 2),
+                "pm25_promedio": round(self.suma_pm25.media(), 2),
+                "pm10_max": round(self.pm10_max, 2),
+                "pm25_max": round(self.pm25_max, 2),
+                "dias_calidad_mala": self.dias_calidad_mala
+            }
+            if self.dias_aire > 3:
+                tendencia_aire = "estable"
+                if self.ultimo_pm10_diario > self.primer_pm10_diario * 1.2:
+                    tendencia_aire = "empeorando"
+                elif self.ultimo_pm10_diario < self.primer_pm10_diario * 0.8:
+                    tendencia_aire = "mejorando"
+                informe["tendencias"]["calidad_aire"] = tendencia_aire
+        return informe
@@ -0,0 +1,154 @@
+# app/facade/cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# TTL en segundos por tipo de dato. Open-Meteo actualiza el tiempo actual cada
+# 15 minutos y las series horarias/diarias con cada ejecución horaria del modelo.
+TTL_POR_DEFECTO = {
+    "actual": 15 * 60,
+    "horario": 60 * 60,
+    "diario": 6 * 60 * 60
+}
+
+def _tamano(valor):
+    """Tamaño aproximado de un valor: su JSON compacto más la memoria de sus Serie."""
+    series = []
+    def aparte(objeto):
+        series.append(objeto.nbytes)
+        return None
+    return len(json.dumps(valor, separators=(",", ":"), default=aparte)) + sum(series)
+
+
+class CacheRespuestas:
+    """
+    Caché TTL + LRU para las respuestas de las APIs externas.
+
+    Las claves se construyen con las coordenadas ajustadas a una rejilla de
+    `resolucion` grados, de modo que peticiones casi idénticas de la misma
+    ciudad comparten entrada. Los valores almacenados se comparten entre
+    llamadas y deben tratarse como de solo lectura.
+
+    Las entradas caducadas se conservan `gracia` segundos más para poder
+    servirlas como obsoletas mientras se refrescan o si la API falla.
+    """
+
+    def __init__(self, resolucion=0.1, max_bytes=32 * 1024 * 1024, ttl=None, gracia=24 * 60 * 60):
+        """
+        Args:
+            resolucion: Tamaño de celda en grados para ajustar latitud y longitud
+            max_bytes: Tamaño máximo aproximado de la caché (JSON serializado y series en columnas)
+            ttl: Diccionario tipo -> segundos que sobrescribe TTL_POR_DEFECTO
+            gracia: Segundos que se conserva una entrada después de caducar
+        """
+        self.resolucion = resolucion
+        self.max_bytes = max_bytes
+        self.ttl = dict(TTL_POR_DEFECTO, **(ttl or {}))
+        self.gracia = gracia
+        self._entradas = OrderedDict()  # clave -> (valor, expira, tamano, guardado, actualizado)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def ajustar(self, coordenada):
+        """Ajusta una coordenada al centro de su celda de la rejilla."""
+        return round(round(float(coordenada) / self.resolucion) * self.resolucion, 6)
+
+    def clave(self, tipo, latitude, longitude, *extra):
+        """Construye la clave de caché para un tipo de dato y una ubicación."""
+        return (tipo, self.ajustar(latitude), self.ajustar(longitude)) + extra
+
+    def obtener(self, clave):
+        """Devuelve el valor almacenado o None si no existe o ha caducado."""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            valor, expira = entrada[:2]
+            ahora = time.monotonic()
+            if expira <= ahora:
+                if expira + self.gracia <= ahora:
+                    self._eliminar(clave)
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def vigente(self, clave, margen=0):
+        """
+        Devuelve el valor si no caduca en los próximos `margen` segundos, o None.
+        No cuenta como acierto ni fallo ni cambia el orden LRU.
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[1] - margen <= time.monotonic():
+                return None
+            return entrada[0]
+
+    def obtener_obsoleto(self, clave):
+        """
+        Devuelve el valor aunque haya caducado, mientras siga dentro del periodo de
+        gracia, o None. No cuenta como acierto ni fallo.
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[1] + self.gracia <= time.monotonic():
+                return None
+            return entrada[0]
+
+    def edad(self, clave):
+        """
+        Devuelve (segundos desde que se guardó, si ya ha caducado, fecha de guardado
+        como timestamp Unix) o None si no existe. La fecha identifica la versión del valor.
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            ahora = time.monotonic()
+            return ahora - entrada[3], entrada[1] <= ahora, entrada[4]
+
+    def guardar(self, clave, valor):
+        """Almacena un valor con el TTL de su tipo (primer elemento de la clave)."""
+        tamano = _tamano(valor)
+        if tamano > self.max_bytes:
+            return
+        guardado = time.monotonic()
+        expira = guardado + self.ttl[clave[0]]
+        with self._lock:
+            if clave in self._entradas:
+                self._eliminar(clave)
+            self._entradas[clave] = (valor, expira, tamano, guardado, time.time())
+            self._bytes += tamano
+            # Desalojar las entradas menos usadas hasta respetar el límite
+            while self._bytes > self.max_bytes:
+                antigua = next(iter(self._entradas))
+                self._eliminar(antigua)
+                self.desalojos += 1
+
+    def _eliminar(self, clave):
+        tamano = self._entradas.pop(clave)[2]
+        self._bytes -= tamano
+
+    def limpiar(self):
+        """Vacía la caché y reinicia los contadores."""
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+            self.aciertos = self.fallos = self.desalojos = 0
+
+    def estadisticas(self):
+        """Devuelve los contadores de aciertos, fallos y desalojos."""
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "desalojos": self.desalojos
+            }
@@ -0,0 +1,229 @@
+# app/facade/cache_compartida.py
+import json
+import os
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+
+from app.facade.cache import CacheRespuestas
+
+# Solo se actualiza el último uso de una entrada si han pasado estos segundos, para
+# que los aciertos no tengan que escribir en el fichero en cada lectura
+REFRESCO_USO = 30
+
+
+class CacheCompartida(CacheRespuestas):
+    """
+    Caché de respuestas compartida por todos los procesos de la máquina.
+
+    Misma interfaz que CacheRespuestas, pero las entradas se guardan en un
+    fichero SQLite en modo WAL: con un servidor pre-fork (gunicorn con varios
+    workers) todos los procesos comparten una sola caché caliente en lugar de
+    tener cada uno la suya. Cada escritura es una transacción, de modo que las
+    actualizaciones son atómicas y el tamaño total se mantiene por debajo de
+    `max_bytes` desalojando las entradas menos usadas. El tamaño total se lleva
+    en la tabla `totales`, que unos disparadores actualizan en la misma
+    transacción que cada cambio de `entradas`, para no sumar la tabla entera en
+    cada escritura.
+
+    Los valores se guardan serializados con pickle; cada proceso conserva los
+    últimos que ha leído y no vuelve a deserializarlos mientras no cambien.
+    """
+
+    def __init__(self, ruta, resolucion=0.1, max_bytes=64 * 1024 * 1024, ttl=None, gracia=24 * 60 * 60,
+                 max_locales=256):
+        """
+        Args:
+            ruta: Fichero SQLite de la caché, común a todos los procesos
+            resolucion: Tamaño de celda en grados para ajustar latitud y longitud
+            max_bytes: Tamaño máximo de los valores serializados en el fichero
+            ttl: Diccionario tipo -> segundos que sobrescribe TTL_POR_DEFECTO
+            gracia: Segundos que se conserva una entrada después de caducar
+            max_locales: Valores ya deserializados que conserva cada proceso
+        """
+        super().__init__(resolucion=resolucion, max_bytes=max_bytes, ttl=ttl, gracia=gracia)
+        self.ruta = ruta
+        self.max_locales = max_locales
+        self._locales = OrderedDict()  # clave -> (guardado, valor)
+        self._db = None
+        self._pid = None
+        with self._escritura() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entradas ("
+                "clave TEXT PRIMARY KEY, valor BLOB NOT NULL, tamano INTEGER NOT NULL, "
+                "guardado REAL NOT NULL, expira REAL NOT NULL, usado REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entradas_usado ON entradas (usado)")
+            db.execute("CREATE TABLE IF NOT EXISTS totales (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+            # Solo la primera vez (o con un fichero de una versión anterior) hay que sumar las entradas
+            db.execute("INSERT OR IGNORE INTO totales (id, bytes) SELECT 0, COALESCE(SUM(tamano), 0) FROM entradas")
+            db.execute(
+                "CREATE TRIGGER IF NOT EXISTS entradas_insertada AFTER INSERT ON entradas BEGIN "
+                "UPDATE totales SET bytes = bytes + NEW.tamano WHERE id = 0; END"
+            )
+            db.execute(
+                "CREATE TRIGGER IF NOT EXISTS entradas_actualizada AFTER UPDATE OF tamano ON entradas BEGIN "
+                "UPDATE totales SET bytes = bytes + NEW.tamano - OLD.tamano WHERE id = 0; END"
+            )
+            db.execute(
+                "CREATE TRIGGER IF NOT EXISTS entradas_borrada AFTER DELETE ON entradas BEGIN "
+                "UPDATE totales SET bytes = bytes - OLD.tamano WHERE id = 0; END"
+            )
+
+    def _conexion(self):
+        """Conexión del proceso actual: tras un fork se abre una nueva en lugar de heredar la del padre."""
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.ruta, timeout=10, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+            self._locales.clear()
+        return self._db
+
+    def _escritura(self):
+        """Transacción de escritura; las lecturas no la necesitan y no bloquean a otros procesos."""
+        return _Transaccion(self._conexion())
+
+    @staticmethod
+    def _texto(clave):
+        return json.dumps(clave, separators=(",", ":"))
+
+    def _leer(self, clave):
+        """Devuelve (valor, expira, guardado, usado) o None, deserializando solo si el valor cambió."""
+        texto = self._texto(clave)
+        with self._lock:
+            db = self._conexion()
+            fila = db.execute("SELECT guardado, expira, usado FROM entradas WHERE clave = ?", (texto,)).fetchone()
+            if fila is None:
+                self._locales.pop(clave, None)
+                return None
+            guardado, expira, usado = fila
+            local = self._locales.get(clave)
+            if local is not None and local[0] == guardado:
+                self._locales.move_to_end(clave)
+                return local[1], expira, guardado, usado
+            fila = db.execute("SELECT valor, guardado, expira FROM entradas WHERE clave = ?", (texto,)).fetchone()
+            if fila is None:
+                return None
+            valor, guardado, expira = pickle.loads(fila[0]), fila[1], fila[2]
+            self._recordar(clave, guardado, valor)
+            return valor, expira, guardado, usado
+
+    def _recordar(self, clave, guardado, valor):
+        self._locales[clave] = (guardado, valor)
+        self._locales.move_to_end(clave)
+        if len(self._locales) > self.max_locales:
+            self._locales.popitem(last=False)
+
+    def obtener(self, clave):
+        """Devuelve el valor almacenado o None si no existe o ha caducado."""
+        entrada = self._leer(clave)
+        ahora = time.time()
+        if entrada is None or entrada[1] <= ahora:
+            if entrada is not None and entrada[1] + self.gracia <= ahora:
+                with self._lock, self._escritura() as db:
+                    db.execute("DELETE FROM entradas WHERE clave = ? AND expira = ?", (self._texto(clave), entrada[1]))
+            with self._lock:
+                self.fallos += 1
+            return None
+        with self._lock:
+            self.aciertos += 1
+            if entrada[3] + REFRESCO_USO <= ahora:
+                with self._escritura() as db:
+                    db.execute("UPDATE entradas SET usado = ? WHERE clave = ?", (ahora, self._texto(clave)))
+        return entrada[0]
+
+    def vigente(self, clave, margen=0):
+        """
+        Devuelve el valor si no caduca en los próximos `margen` segundos, o None.
+        No cuenta como acierto ni fallo ni cambia el orden LRU.
+        """
+        entrada = self._leer(clave)
+        if entrada is None or entrada[1] - margen <= time.time():
+            return None
+        return entrada[0]
+
+    def obtener_obsoleto(self, clave):
+        """
+        Devuelve el valor aunque haya caducado, mientras siga dentro del periodo de
+        gracia, o None. No cuenta como acierto ni fallo.
+        """
+        entrada = self._leer(clave)
+        if entrada is None or entrada[1] + self.gracia <= time.time():
+            return None
+        return entrada[0]
+
+    def edad(self, clave):
+        """
+        Devuelve (segundos desde que se guardó, si ya ha caducado, fecha de guardado
+        como timestamp Unix) o None si no existe.
+        """
+        with self._lock:
+            fila = self._conexion().execute("SELECT guardado, expira FROM entradas WHERE clave = ?",
+                                            (self._texto(clave),)).fetchone()
+        if fila is None:
+            return None
+        ahora = time.time()
+        return ahora - fila[0], fila[1] <= ahora, fila[0]
+
+    def guardar(self, clave, valor):
+        """Almacena un valor con el TTL de su tipo y desaloja las entradas menos usadas si no cabe."""
+        blob = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        guardado = time.time()
+        with self._lock, self._escritura() as db:
+            # Un UPSERT (y no INSERT OR REPLACE) para que el reemplazo dispare entradas_actualizada
+            db.execute(
+                "INSERT INTO entradas (clave, valor, tamano, guardado, expira, usado) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor, tamano = excluded.tamano, "
+                "guardado = excluded.guardado, expira = excluded.expira, usado = excluded.usado",
+                (self._texto(clave), blob, len(blob), guardado, guardado + self.ttl[clave[0]], guardado)
+            )
+            total = db.execute("SELECT bytes FROM totales WHERE id = 0").fetchone()[0]
+            if total > self.max_bytes:
+                # Desalojar las menos usadas hasta respetar el límite
+                desalojadas = 0
+                for texto, tamano in db.execute("SELECT clave, tamano FROM entradas ORDER BY usado").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    db.execute("DELETE FROM entradas WHERE clave = ?", (texto,))
+                    total -= tamano
+                    desalojadas += 1
+                self.desalojos += desalojadas
+            self._recordar(clave, guardado, valor)
+
+    def limpiar(self):
+        """Vacía la caché (para todos los procesos) y reinicia los contadores de este proceso."""
+        with self._lock, self._escritura() as db:
+            db.execute("DELETE FROM entradas")
+            self._locales.clear()
+            self.aciertos = self.fallos = self.desalojos = 0
+
+    def estadisticas(self):
+        """Entradas y bytes de la caché compartida; aciertos, fallos y desalojos de este proceso."""
+        with self._lock:
+            entradas, tamano = self._conexion().execute(
+                "SELECT (SELECT COUNT(*) FROM entradas), bytes FROM totales WHERE id = 0").fetchone()
+            return {
+                "entradas": entradas,
+                "bytes": tamano,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "desalojos": self.desalojos
+            }
+
+
+class _Transaccion:
+    """Ejecuta un bloque en una transacción inmediata (con bloqueo de escritura desde el inicio)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, tipo, error, traza):
+        self.db.execute("COMMIT" if tipo is None else "ROLLBACK")
@@ -0,0 +1,84 @@
+# app/facade/coalescencia.py
+import asyncio
+import threading
+
+class Coalescedor:
+    """
+    Agrupa las peticiones idénticas en curso (single-flight).
+
+    La primera llamada con una clave lanza la petición; las que llegan con la
+    misma clave mientras sigue en curso reciben el mismo futuro en lugar de
+    repetirla. Cuando la petición termina, la clave queda libre y la siguiente
+    llamada vuelve a lanzarla (normalmente la caché ya la habrá resuelto).
+    """
+
+    def __init__(self):
+        self._en_curso = {}  # clave -> concurrent.futures.Future
+        self._en_curso_async = {}  # clave -> asyncio.Task
+        self._lock = threading.Lock()
+        self.lanzadas = 0
+        self.coalescidas = 0
+
+    def enviar(self, clave, executor, funcion, *args):
+        """
+        Devuelve el futuro de la petición en curso con esta clave o, si no hay
+        ninguna, lanza funcion(*args) en el executor.
+        """
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            if futuro is not None:
+                self.coalescidas += 1
+                return futuro
+            futuro = executor.submit(funcion, *args)
+            self._en_curso[clave] = futuro
+            self.lanzadas += 1
+        futuro.add_done_callback(lambda f: self._terminar(self._en_curso, clave, f))
+        return futuro
+
+    def lanzar_async(self, clave, corrutina):
+        """
+        Equivalente asíncrono de enviar: devuelve la tarea en curso con esta clave
+        o crea una con la función corrutina(). Se debe llamar desde el bucle de eventos.
+        """
+        with self._lock:
+            tarea = self._en_curso_async.get(clave)
+            if tarea is not None:
+                self.coalescidas += 1
+                return tarea
+            tarea = asyncio.ensure_future(corrutina())
+            self._en_curso_async[clave] = tarea
+            self.lanzadas += 1
+        tarea.add_done_callback(self._terminar_async(clave))
+        return tarea
+
+    async def esperar(self, clave, corrutina):
+        """Espera el resultado de lanzar_async(clave, corrutina)."""
+        # shield: cancelar una de las esperas no cancela la petición compartida
+        return await asyncio.shield(self.lanzar_async(clave, corrutina))
+
+    def _terminar_async(self, clave):
+        def terminar(tarea):
+            # Recoger la excepción de las tareas que nadie espera (refrescos en segundo plano)
+            if not tarea.cancelled():
+                tarea.exception()
+            self._terminar(self._en_curso_async, clave, tarea)
+        return terminar
+
+    def _terminar(self, en_curso, clave, futuro):
+        with self._lock:
+            if en_curso.get(clave) is futuro:
+                del en_curso[clave]
+
+    def limpiar(self):
+        """Reinicia los contadores (las peticiones en curso no se interrumpen)."""
+        with self._lock:
+            self.lanzadas = self.coalescidas = 0
+
+    def estadisticas(self):
+        """Devuelve las peticiones lanzadas, las coalescidas y las que siguen en curso."""
+        with self._lock:
+            return {
+                "lanzadas": self.lanzadas,
+                "coalescidas": self.coalescidas,
+                "en_curso": len(self._en_curso) + len(self._en_curso_async)
+            }
@@ -0,0 +1,244 @@
+# app/facade/difusion.py
+import asyncio
+import hashlib
+import json
+import threading
+
+import requests
+
+from app.facade.espacial import comprobar_coordenadas
+from app.facade.series import a_json
+
+# Segundos entre refrescos de las celdas con suscriptores
+INTERVALO_DIFUSION = 60
+# Segundos sin eventos tras los que se envía un comentario para mantener viva la conexión
+LATIDO_SEGUNDOS = 15
+# Milisegundos que el navegador espera antes de reconectar si se corta el canal
+REINTENTO_MS = 5000
+
+def huella_datos(datos):
+    """Huella corta del clima y la calidad del aire de una celda, para detectar cambios."""
+    contenido = json.dumps(a_json({"weather": datos.get("weather"), "air_quality": datos.get("air_quality")}),
+                           sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(contenido.encode("utf-8"), digest_size=8).hexdigest()
+
+def leer_ubicaciones(valores):
+    """
+    Convierte los parámetros `ubicacion=lat,lon` de la query string en una lista
+    de tuplas (latitud, longitud).
+
+    Raises:
+        ValueError: Si alguna ubicación no tiene dos números o están fuera de rango
+    """
+    coordenadas = []
+    for valor in valores:
+        latitude, longitude = valor.split(",")
+        coordenadas.append(comprobar_coordenadas(latitude, longitude))
+    return coordenadas
+
+def formatear_evento(suscripcion, celda, huella, datos):
+    """Evento Server-Sent Events con los datos de una celda y las ubicaciones del cliente que cubre."""
+    cuerpo = dict(datos, ubicaciones=[
+        {"latitude": latitude, "longitude": longitude} for latitude, longitude in suscripcion.ubicaciones[celda]
+    ])
+    return f"id: {huella}\nevent: actual\ndata: {json.dumps(a_json(cuerpo))}\n\n"
+
+
+class Suscripcion:
+    """
+    Ubicaciones de un cliente del canal de eventos y las actualizaciones que tiene
+    pendientes. Solo se guarda la última de cada celda: un cliente lento no acumula
+    eventos, recibe directamente el estado más reciente.
+    """
+
+    def __init__(self, ubicaciones, bucle=None):
+        """
+        Args:
+            ubicaciones: Diccionario celda -> ubicaciones (latitud, longitud) pedidas por el cliente
+            bucle: Bucle de asyncio del cliente, si espera con esperar_async
+        """
+        self.ubicaciones = ubicaciones
+        self._bucle = bucle
+        self._pendientes = {}  # celda -> (huella, datos)
+        self._lock = threading.Lock()
+        self._aviso = asyncio.Event() if bucle is not None else threading.Event()
+
+    def entregar(self, celda, huella, datos):
+        with self._lock:
+            self._pendientes[celda] = (huella, datos)
+            if self._bucle is None:
+                self._aviso.set()
+                return
+        try:
+            # asyncio.Event no es seguro entre hilos: se activa desde su propio bucle
+            self._bucle.call_soon_threadsafe(self._aviso.set)
+        except RuntimeError:
+            pass  # el bucle del cliente ya se cerró
+
+    def _recoger(self):
+        with self._lock:
+            pendientes = [(celda, huella, datos) for celda, (huella, datos) in self._pendientes.items()]
+            self._pendientes.clear()
+            self._aviso.clear()
+        return pendientes
+
+    def esperar(self, timeout):
+        """Espera como mucho `timeout` segundos y devuelve las actualizaciones (celda, huella, datos) pendientes."""
+        self._aviso.wait(timeout)
+        return self._recoger()
+
+    async def esperar_async(self, timeout):
+        """Equivalente asíncrono de esperar."""
+        try:
+            await asyncio.wait_for(self._aviso.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._recoger()
+
+
+class Difusor:
+    """
+    Canal de actualizaciones en vivo para los paneles (Server-Sent Events).
+
+    Los clientes se suscriben a un conjunto de ubicaciones, que se agrupan por la
+    celda cuyos datos usan. Un solo hilo refresca cada `intervalo` segundos todas
+    las celdas con suscriptores con una única consulta en lote a la fachada (que
+    solo sale a la red por las que han caducado en la caché) y, cuando los datos
+    de una celda cambian, entrega el evento a todos sus suscriptores a la vez.
+    Un suscriptor en espera no tiene hilo propio: bajo ASGI, miles de conexiones
+    abiertas solo cuestan su memoria.
+    """
+
+    def __init__(self, fachada, intervalo=INTERVALO_DIFUSION, max_suscripciones=10000):
+        """
+        Args:
+            fachada: AireYClimaFacade de la que se obtienen los datos
+            intervalo: Segundos entre refrescos de las celdas suscritas
+            max_suscripciones: Suscripciones abiertas a la vez como máximo
+        """
+        self.fachada = fachada
+        self.intervalo = intervalo
+        self.max_suscripciones = max_suscripciones
+        self._suscriptores = {}  # celda -> set de Suscripcion
+        self._ultimos = {}  # celda -> (huella, datos) publicados por última vez
+        self.suscripciones = 0
+        self.ciclos = 0
+        self.publicados = 0
+        self.entregas = 0
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def suscribir(self, coordenadas, bucle=None):
+        """
+        Abre una suscripción a las ubicaciones (latitud, longitud). Las celdas que ya
+        tienen datos publicados se entregan enseguida; las nuevas se piden en el
+        siguiente refresco, que se adelanta.
+
+        Args:
+            coordenadas: Lista de tuplas (latitud, longitud)
+            bucle: Bucle de asyncio del cliente, si es asíncrono
+
+        Returns:
+            La Suscripcion, o None si ya hay `max_suscripciones` abiertas
+        """
+        ubicaciones = {}
+        for latitude, longitude in coordenadas:
+            ubicaciones.setdefault(self.fachada.resolver_celda(latitude, longitude), []).append((latitude, longitude))
+        suscripcion = Suscripcion(ubicaciones, bucle)
+        with self._lock:
+            if self.suscripciones >= self.max_suscripciones:
+                return None
+            self.suscripciones += 1
+            sin_datos = False
+            for celda in ubicaciones:
+                self._suscriptores.setdefault(celda, set()).add(suscripcion)
+                ultimo = self._ultimos.get(celda)
+                if ultimo is None:
+                    sin_datos = True
+                else:
+                    suscripcion.entregar(celda, *ultimo)
+        if sin_datos:
+            self._despertar.set()
+        self.iniciar()
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        """Cierra una suscripción; las celdas que se quedan sin suscriptores dejan de refrescarse."""
+        with self._lock:
+            self.suscripciones -= 1
+            for celda in suscripcion.ubicaciones:
+                suscriptores = self._suscriptores.get(celda)
+                if suscriptores is None:
+                    continue
+                suscriptores.discard(suscripcion)
+                if not suscriptores:
+                    del self._suscriptores[celda]
+                    self._ultimos.pop(celda, None)
+
+    def publicar(self, celda, datos):
+        """Entrega los datos de una celda a sus suscriptores si han cambiado. Devuelve a cuántos."""
+        huella = huella_datos(datos)
+        with self._lock:
+            ultimo = self._ultimos.get(celda)
+            if celda not in self._suscriptores or (ultimo is not None and ultimo[0] == huella):
+                return 0
+            self._ultimos[celda] = (huella, datos)
+            suscriptores = list(self._suscriptores[celda])
+            self.publicados += 1
+            self.entregas += len(suscriptores)
+        for suscripcion in suscriptores:
+            suscripcion.entregar(celda, huella, datos)
+        return len(suscriptores)
+
+    def ciclo(self):
+        """Refresca todas las celdas suscritas y devuelve cuántas han cambiado."""
+        with self._lock:
+            celdas = list(self._suscriptores)
+        if not celdas:
+            return 0
+        try:
+            resultados = self.fachada.recoger_ultimos_datos_lote(celdas)
+        except requests.RequestException as e:
+            print("Error al refrescar las suscripciones:", e)
+            return 0
+        cambiadas = 0
+        for celda, datos in zip(celdas, resultados):
+            # Sin datos de ninguna API (error) se mantiene lo último publicado
+            if datos["weather"] or datos["air_quality"]:
+                cambiadas += self.publicar(celda, datos) > 0
+        self.ciclos += 1
+        return cambiadas
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            self._despertar.clear()
+            self.ciclo()
+            self._despertar.wait(self.intervalo)
+
+    def iniciar(self):
+        """Arranca el hilo de refresco (si no estaba ya en marcha)."""
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._parar.clear()
+            self._hilo = threading.Thread(target=self._bucle, name="difusion", daemon=True)
+            self._hilo.start()
+
+    def detener(self):
+        self._parar.set()
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "suscripciones": self.suscripciones,
+                "celdas": len(self._suscriptores),
+                "ciclos": self.ciclos,
+                "publicados": self.publicados,
+                "entregas": self.entregas
+            }
@@ -0,0 +1,119 @@
+# app/facade/espacial.py
+import math
+import threading
+from collections import OrderedDict
+
+RADIO_TIERRA_KM = 6371.0
+KM_POR_GRADO = math.pi * RADIO_TIERRA_KM / 180
+# Resolución de la rejilla de calidad del aire de Open-Meteo (CAMS Europa, 0,1°)
+RESOLUCION_MODELO_KM = 11.0
+
+def comprobar_coordenadas(latitude, longitude):
+    """
+    Devuelve la latitud y la longitud como float.
+
+    Raises:
+        ValueError: Si no son números o quedan fuera de [-90, 90] y [-180, 180]
+            (también NaN e infinito, que no pasan las comparaciones)
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError(f"Coordenadas no válidas: {latitude}, {longitude}")
+    return latitude, longitude
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    """Distancia en km sobre la esfera (fórmula del haversine)."""
+    fi1, fi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((fi2 - fi1) / 2) ** 2 + \
+        math.cos(fi1) * math.cos(fi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class IndiceEspacial:
+    """
+    Índice de las celdas ya consultadas para reutilizarlas desde ubicaciones cercanas.
+
+    Los centros se reparten en cubetas de `tam_cubeta` grados (como un geohash de
+    precisión fija), de modo que buscar el centro más cercano solo mira las cubetas
+    que alcanza el radio. Las APIs tratan cada coordenada como distinta aunque el
+    modelo tenga una resolución de kilómetros: con el índice, una consulta a unos
+    cientos de metros de una celda ya pedida usa esa celda aunque caiga al otro
+    lado de la frontera de la rejilla de la caché.
+    """
+
+    def __init__(self, tam_cubeta=0.1, radio_km=RESOLUCION_MODELO_KM, max_celdas=100000):
+        """
+        Args:
+            tam_cubeta: Tamaño en grados de las cubetas del índice
+            radio_km: Distancia máxima para reutilizar una celda ya consultada
+            max_celdas: Celdas que se conservan (las menos usadas se descartan)
+        """
+        self.tam_cubeta = tam_cubeta
+        self._columnas = math.ceil(360 / tam_cubeta)  # las columnas dan la vuelta en el antimeridiano
+        self.radio_km = radio_km
+        self.max_celdas = max_celdas
+        self._cubetas = {}  # (fila, columna) -> set de centros
+        self._celdas = OrderedDict()  # centro -> None, en orden de uso
+        self._lock = threading.Lock()
+        self.reutilizadas = 0  # consultas resueltas con la celda de otra ubicación cercana
+
+    def __len__(self):
+        return len(self._celdas)
+
+    def _cubeta(self, latitude, longitude):
+        return math.floor(latitude / self.tam_cubeta), math.floor(longitude / self.tam_cubeta) % self._columnas
+
+    def cercana(self, latitude, longitude):
+        """Devuelve el centro indexado más cercano dentro del radio, o None."""
+        fila, columna = self._cubeta(latitude, longitude)
+        radio_lat = self.radio_km / KM_POR_GRADO
+        radio_lon = radio_lat / max(math.cos(math.radians(latitude)), 1e-6)
+        filas = math.ceil(radio_lat / self.tam_cubeta)
+        columnas = min(math.ceil(radio_lon / self.tam_cubeta), self._columnas // 2)
+
+        mejor, mejor_distancia = None, self.radio_km
+        for df in range(-filas, filas + 1):
+            for dc in range(-columnas, columnas + 1):
+                for centro in self._cubetas.get((fila + df, (columna + dc) % self._columnas), ()):
+                    distancia = distancia_km(latitude, longitude, *centro)
+                    if distancia <= mejor_distancia:
+                        mejor, mejor_distancia = centro, distancia
+        return mejor
+
+    def anadir(self, centro):
+        """Indexa el centro (latitud, longitud) de una celda."""
+        if centro in self._celdas:
+            self._celdas.move_to_end(centro)
+            return
+        self._celdas[centro] = None
+        self._cubetas.setdefault(self._cubeta(*centro), set()).add(centro)
+        if len(self._celdas) > self.max_celdas:
+            antigua, _ = self._celdas.popitem(last=False)
+            cubeta = self._cubeta(*antigua)
+            self._cubetas[cubeta].discard(antigua)
+            if not self._cubetas[cubeta]:
+                del self._cubetas[cubeta]
+
+    def resolver(self, latitude, longitude, centro):
+        """
+        Devuelve la celda indexada más cercana a la ubicación dentro del radio o, si
+        no hay ninguna, indexa y devuelve `centro` (la celda propia de la ubicación).
+        """
+        with self._lock:
+            if centro not in self._celdas:
+                cercana = self.cercana(latitude, longitude)
+                if cercana is not None:
+                    self.reutilizadas += 1
+                    centro = cercana
+            self.anadir(centro)
+            return centro
+
+    def estadisticas(self):
+        with self._lock:
+            return {"celdas": len(self._celdas), "reutilizadas": self.reutilizadas}
+
+    def limpiar(self):
+        with self._lock:
+            self._cubetas.clear()
+            self._celdas.clear()
+            self.reutilizadas = 0
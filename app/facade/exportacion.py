@@ -0,0 +1,237 @@
+# app/facade/exportacion.py
+import csv
+import io
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional: sin él solo se exporta en CSV
+    pa = pq = None
+
+from app.facade.limitador import LOTE, con_prioridad
+from app.facade.series import SEGUNDOS_DIA, como_serie
+
+# Una fila por ubicación y hora; las temperaturas son las del día de esa hora
+COLUMNAS = ("latitude", "longitude", "celda_latitude", "celda_longitude", "time",
+            "temperature_2m_max", "temperature_2m_min", "pm10", "pm2_5")
+SERIES_DIARIAS = ("temperature_2m_max", "temperature_2m_min")
+SERIES_HORARIAS = ("pm10", "pm2_5")
+# Tipo MIME y extensión de cada formato
+FORMATOS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "csv": ("text/csv", "csv")
+}
+# Días que se piden de una vez a las APIs para cada ubicación
+DIAS_POR_BLOQUE = 31
+# Filas de cada grupo (row group en Parquet, record batch en Arrow) que se escribe de una vez
+FILAS_POR_GRUPO = 64 * 1024
+
+def formatos_disponibles():
+    """Formatos que se pueden generar con las dependencias instaladas."""
+    return tuple(FORMATOS) if pa is not None else ("csv",)
+
+def formato_por_defecto():
+    return "parquet" if pa is not None else "csv"
+
+def _bloques(inicio, fin, dias_por_bloque):
+    while inicio <= fin:
+        hasta = min(inicio + timedelta(days=dias_por_bloque - 1), fin)
+        yield inicio, hasta
+        inicio = hasta + timedelta(days=1)
+
+def _columnas(ubicacion, celda, weather_data, air_quality_data):
+    """Columnas (arrays de NumPy) de las filas de una ubicación y un bloque de días."""
+    daily = como_serie(weather_data.get("daily"))
+    hourly = como_serie(air_quality_data.get("hourly"))
+    # Sin calidad del aire (error de la API) se exporta al menos una fila por día
+    eje = hourly if hourly.tiempo is not None and len(hourly) else daily
+    if eje.tiempo is None or not len(eje):
+        return None
+    tiempo = eje.tiempo
+    filas = len(tiempo)
+
+    columnas = {
+        "latitude": np.full(filas, ubicacion[0]),
+        "longitude": np.full(filas, ubicacion[1]),
+        "celda_latitude": np.full(filas, celda[0]),
+        "celda_longitude": np.full(filas, celda[1]),
+        "time": tiempo
+    }
+    # Día de cada hora en la serie diaria (los dos ejes están en la hora local de la ubicación)
+    hay_diario = daily.tiempo is not None and len(daily) > 0
+    if hay_diario:
+        dias = tiempo - tiempo % SEGUNDOS_DIA
+        indices = np.minimum(np.searchsorted(daily.tiempo, dias), len(daily.tiempo) - 1)
+        encontrados = daily.tiempo[indices] == dias
+    for nombre in SERIES_DIARIAS:
+        columna = np.full(filas, np.nan)
+        serie = daily.get(nombre)
+        if hay_diario and serie is not None:
+            columna[encontrados] = serie[indices[encontrados]]
+        columnas[nombre] = columna
+    for nombre in SERIES_HORARIAS:
+        serie = hourly.get(nombre) if eje is hourly else None
+        columnas[nombre] = serie if serie is not None and len(serie) == filas else np.full(filas, np.nan)
+    return columnas
+
+def _descargar(fachada, ubicacion, desde, hasta):
+    # Los hilos del ejecutor no heredan el contexto: la prioridad se fija aquí. Las
+    # respuestas no se guardan en la caché de respuestas: una exportación la llenaría
+    # de rangos que no se vuelven a consultar y desalojaría los de las consultas interactivas
+    with con_prioridad(LOTE):
+        celda, weather_data, air_quality_data = fachada.obtener_datos_rango(*ubicacion, desde, hasta, cachear=False)
+    return _columnas(ubicacion, celda, weather_data, air_quality_data)
+
+def _concatenar(partes):
+    return {nombre: np.concatenate([parte[nombre] for parte in partes]) for nombre in COLUMNAS}
+
+def iterar_grupos(fachada, ubicaciones, inicio, fin, paralelo=8, dias_por_bloque=DIAS_POR_BLOQUE,
+                  filas_por_grupo=FILAS_POR_GRUPO):
+    """
+    Genera las filas de la exportación en grupos de unas `filas_por_grupo` filas
+    (diccionario columna -> array), en el orden de las ubicaciones y las fechas.
+
+    Se descargan en paralelo hasta `paralelo` bloques (ubicación, `dias_por_bloque`
+    días) y solo se adelantan otros tantos, de modo que la memoria usada depende
+    del tamaño de grupo y no del número de ubicaciones ni de días.
+    """
+    tareas = ((ubicacion, desde, hasta) for ubicacion in ubicaciones
+              for desde, hasta in _bloques(inicio, fin, dias_por_bloque))
+    executor = ThreadPoolExecutor(max_workers=paralelo, thread_name_prefix="exportacion")
+    en_curso = deque()
+    partes, filas = [], 0
+
+    def acumular(columnas):
+        nonlocal partes, filas
+        if columnas is not None:
+            partes.append(columnas)
+            filas += len(columnas["time"])
+        if filas >= filas_por_grupo:
+            yield _concatenar(partes)
+            partes, filas = [], 0
+
+    try:
+        for tarea in tareas:
+            en_curso.append(executor.submit(_descargar, fachada, *tarea))
+            if len(en_curso) >= 2 * paralelo:
+                yield from acumular(en_curso.popleft().result())
+        while en_curso:
+            yield from acumular(en_curso.popleft().result())
+        if partes:
+            yield _concatenar(partes)
+    finally:
+        # Si se interrumpe la exportación (cliente desconectado), no seguir descargando
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Tuberia:
+    """
+    Salida de solo escritura que guarda lo escrito hasta que se recoge. Mantiene la
+    posición total (los escritores de Parquet la usan para el índice del final).
+    """
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+        self.closed = False
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def recoger(self):
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def _esquema():
+    campos = [(nombre, pa.float64()) for nombre in COLUMNAS]
+    campos[COLUMNAS.index("time")] = ("time", pa.timestamp("s"))
+    return pa.schema(campos)
+
+def _lote_arrow(grupo, esquema):
+    return pa.record_batch([
+        pa.array(grupo[nombre].astype("datetime64[s]")) if nombre == "time" else pa.array(grupo[nombre], from_pandas=True)
+        for nombre in COLUMNAS
+    ], schema=esquema)
+
+def _filas_csv(grupo):
+    columnas = []
+    for nombre in COLUMNAS:
+        if nombre == "time":
+            columnas.append(np.datetime_as_string(grupo[nombre].astype("datetime64[s]"), unit="m").tolist())
+        else:
+            columnas.append(["" if valor != valor else valor for valor in grupo[nombre].tolist()])
+    return zip(*columnas)
+
+def exportar(fachada, ubicaciones, inicio, fin, formato="csv", **opciones):
+    """
+    Genera el fichero de exportación del histórico de varias ubicaciones como una
+    secuencia de fragmentos de bytes, uno por grupo de filas, para escribirlo o
+    enviarlo sin tenerlo entero en memoria.
+
+    Args:
+        fachada: AireYClimaFacade con la que se descargan los datos
+        ubicaciones: Lista de tuplas (latitud, longitud)
+        inicio: Primer día (date)
+        fin: Último día (date), incluido
+        formato: "parquet", "arrow" (formato de streaming de Arrow IPC) o "csv"
+        **opciones: paralelo, dias_por_bloque o filas_por_grupo de iterar_grupos
+
+    Raises:
+        ValueError: Si el formato no existe o necesita pyarrow y no está instalado
+    """
+    if formato not in formatos_disponibles():
+        raise ValueError(f"Formato no disponible: {formato} (disponibles: {', '.join(formatos_disponibles())})")
+    grupos = iterar_grupos(fachada, ubicaciones, inicio, fin, **opciones)
+
+    if formato == "csv":
+        texto = io.StringIO()
+        escritor = csv.writer(texto, lineterminator="\n")
+        escritor.writerow(COLUMNAS)
+        for grupo in grupos:
+            escritor.writerows(_filas_csv(grupo))
+            yield texto.getvalue().encode("utf-8")
+            texto.seek(0)
+            texto.truncate()
+        yield texto.getvalue().encode("utf-8")
+        return
+
+    salida = _Tuberia()
+    esquema = _esquema()
+    if formato == "parquet":
+        escritor = pq.ParquetWriter(salida, esquema, compression="zstd")
+    else:
+        escritor = pa.ipc.new_stream(salida, esquema)
+    for grupo in grupos:
+        lote = _lote_arrow(grupo, esquema)
+        if formato == "parquet":
+            escritor.write_table(pa.Table.from_batches([lote]))
+        else:
+            escritor.write_batch(lote)
+        yield salida.recoger()
+    escritor.close()
+    yield salida.recoger()
@@ -0,0 +1,272 @@
+# app/facade/geocodificacion.py
+import csv
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+import requests
+
+from app.facade.cache import CacheRespuestas
+from app.facade.limitador import LOTE, con_prioridad
+from app.facade.resiliencia import CircuitoAbierto, Disyuntor
+from app.metricas import LIMITES_BYTES, metricas
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+USER_AGENT = "mi-aplicacion-clima/1.0 (contacto@example.com)"  # Cambia el correo por uno válido
+
+def normalizar(nombre):
+    """Normaliza un nombre de ciudad: minúsculas, sin tildes y sin espacios repetidos."""
+    sin_tildes = unicodedata.normalize("NFKD", nombre).encode("ascii", "ignore").decode("ascii")
+    return " ".join(sin_tildes.lower().split())
+
+
+class Nomenclator:
+    """
+    Índice compacto de ciudades en memoria para resolver nombres sin red.
+
+    Los nombres normalizados se guardan ordenados en una lista y las
+    coordenadas en arrays paralelos de dobles, lo que permite búsquedas
+    exactas y por prefijo con búsqueda binaria.
+    """
+
+    def __init__(self, entradas=()):
+        """
+        Args:
+            entradas: Iterable de (nombre, latitud, longitud, poblacion). Si un
+                nombre se repite, se conserva la ciudad más poblada.
+        """
+        mejores = {}
+        for nombre, latitud, longitud, poblacion in entradas:
+            clave = normalizar(nombre)
+            if clave and (clave not in mejores or poblacion > mejores[clave][2]):
+                mejores[clave] = (latitud, longitud, poblacion)
+        self.nombres = sorted(mejores)
+        self.latitudes = array("d", (mejores[n][0] for n in self.nombres))
+        self.longitudes = array("d", (mejores[n][1] for n in self.nombres))
+
+    @classmethod
+    def desde_geonames(cls, ruta, alternativos=True):
+        """
+        Carga un fichero TSV con el formato de GeoNames (p. ej. cities15000.txt).
+
+        Args:
+            ruta: Ruta del fichero TSV
+            alternativos: Indexar también los nombres alternativos de cada ciudad
+        """
+        def entradas():
+            with open(ruta, encoding="utf-8", newline="") as fichero:
+                for fila in csv.reader(fichero, delimiter="\t", quoting=csv.QUOTE_NONE):
+                    latitud, longitud = float(fila[4]), float(fila[5])
+                    poblacion = int(fila[14] or 0)
+                    nombres = {fila[1], fila[2]}
+                    if alternativos and fila[3]:
+                        nombres.update(fila[3].split(","))
+                    for nombre in nombres:
+                        yield nombre, latitud, longitud, poblacion
+        return cls(entradas())
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def buscar(self, nombre):
+        """Devuelve (latitud, longitud) para un nombre exacto o None."""
+        clave = normalizar(nombre)
+        i = bisect_left(self.nombres, clave)
+        if i < len(self.nombres) and self.nombres[i] == clave:
+            return self.latitudes[i], self.longitudes[i]
+        return None
+
+    def por_prefijo(self, prefijo, limite=10):
+        """Devuelve hasta `limite` tuplas (nombre, latitud, longitud) que empiezan por el prefijo."""
+        clave = normalizar(prefijo)
+        resultados = []
+        i = bisect_left(self.nombres, clave)
+        while i < len(self.nombres) and len(resultados) < limite and self.nombres[i].startswith(clave):
+            resultados.append((self.nombres[i], self.latitudes[i], self.longitudes[i]))
+            i += 1
+        return resultados
+
+
+class Geocodificador:
+    """
+    Resuelve nombres de ciudad a coordenadas por niveles: caché en memoria,
+    nomenclátor local opcional, caché persistente en SQLite y, solo si todo
+    lo anterior falla, Nominatim (respetando su límite de 1 petición/s).
+    Los nombres que Nominatim no encuentra también se recuerdan, durante menos
+    tiempo, para no volver a consultarlos en cada petición.
+    """
+
+    def __init__(self, ruta_db=":memory:", nomenclator=None, ttl=90 * 24 * 60 * 60,
+                 intervalo_minimo=1.0, timeout=(3.05, 10), limitador=None, ttl_no_encontradas=6 * 60 * 60):
+        """
+        Args:
+            ruta_db: Fichero SQLite de la caché persistente
+            nomenclator: Nomenclator local para resolver sin red (opcional)
+            ttl: Segundos de validez de las coordenadas almacenadas
+            ttl_no_encontradas: Segundos durante los que no se vuelve a buscar en
+                Nominatim un nombre que no encontró
+            intervalo_minimo: Segundos mínimos entre peticiones a Nominatim
+            timeout: Timeout (conexión, lectura) de las peticiones a Nominatim
+            limitador: Limitador compartido con la cuota diaria de Nominatim (opcional)
+        """
+        self.nomenclator = nomenclator
+        self.ttl = ttl
+        self.ttl_no_encontradas = ttl_no_encontradas
+        self.intervalo_minimo = intervalo_minimo
+        self.timeout = timeout
+        self.limitador = limitador
+        self.memoria = CacheRespuestas(max_bytes=1024 * 1024, ttl={
+            "geocodificacion": 24 * 60 * 60,
+            "no_encontrada": ttl_no_encontradas
+        })
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        self._ultima_peticion = 0.0
+        # Si Nominatim falla de forma repetida se deja de consultar durante un tiempo
+        self.disyuntor = Disyuntor("Nominatim")
+        self._lock_red = threading.Lock()
+        self._lock_db = threading.Lock()
+        self._db = sqlite3.connect(ruta_db, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geocodificacion ("
+                "nombre TEXT PRIMARY KEY, latitud REAL NOT NULL, longitud REAL NOT NULL, guardado REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS no_encontradas (nombre TEXT PRIMARY KEY, guardado REAL NOT NULL)"
+            )
+
+    def resolver(self, ciudad):
+        """Devuelve (latitud, longitud) de la ciudad o (None, None) si no se encuentra."""
+        nombre = normalizar(ciudad)
+        if not nombre:
+            return None, None
+        clave = ("geocodificacion", nombre)
+        coordenadas = self.memoria.obtener(clave)
+        if coordenadas is None and self.nomenclator is not None:
+            coordenadas = self.nomenclator.buscar(nombre)
+        if coordenadas is None:
+            coordenadas = self._leer_disco(nombre)
+        if coordenadas is None:
+            if self._no_encontrada(nombre):
+                return None, None
+            coordenadas = self._consultar_nominatim(ciudad)
+            if coordenadas == ():
+                # Nominatim respondió sin resultados: no se vuelve a preguntar en un tiempo
+                self._guardar_no_encontrada(nombre)
+                return None, None
+            if coordenadas is not None:
+                self._guardar_disco(nombre, coordenadas)
+        if coordenadas is None:
+            # Sin respuesta de Nominatim, mejor unas coordenadas caducadas que ninguna
+            coordenadas = self._leer_disco(nombre, caducadas=True)
+        if coordenadas is None:
+            return None, None
+        self.memoria.guardar(clave, tuple(coordenadas))
+        return tuple(coordenadas)
+
+    def resolver_lote(self, ciudades):
+        """
+        Resuelve varias ciudades consultando una sola vez cada nombre normalizado;
+        los que Nominatim no encontró hace poco no se vuelven a consultar.
+        """
+        resueltas = {}
+        resultados = {}
+        with con_prioridad(LOTE):
+            for ciudad in ciudades:
+                nombre = normalizar(ciudad)
+                if nombre not in resueltas:
+                    resueltas[nombre] = self.resolver(ciudad)
+                resultados[ciudad] = resueltas[nombre]
+        return resultados
+
+    def _leer_disco(self, nombre, caducadas=False):
+        limite = float("-inf") if caducadas else time.time() - self.ttl
+        with self._lock_db:
+            fila = self._db.execute(
+                "SELECT latitud, longitud FROM geocodificacion WHERE nombre = ? AND guardado > ?",
+                (nombre, limite)
+            ).fetchone()
+        return fila
+
+    def _no_encontrada(self, nombre):
+        """Si Nominatim no encontró el nombre hace menos de `ttl_no_encontradas` segundos."""
+        clave = ("no_encontrada", nombre)
+        if self.memoria.vigente(clave) is not None:
+            return True
+        with self._lock_db:
+            fila = self._db.execute(
+                "SELECT guardado FROM no_encontradas WHERE nombre = ? AND guardado > ?",
+                (nombre, time.time() - self.ttl_no_encontradas)
+            ).fetchone()
+        if fila is None:
+            return False
+        self.memoria.guardar(clave, True)
+        return True
+
+    def _guardar_no_encontrada(self, nombre):
+        self.memoria.guardar(("no_encontrada", nombre), True)
+        with self._lock_db, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO no_encontradas (nombre, guardado) VALUES (?, ?)", (nombre, time.time())
+            )
+
+    def _guardar_disco(self, nombre, coordenadas):
+        with self._lock_db, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO geocodificacion (nombre, latitud, longitud, guardado) VALUES (?, ?, ?, ?)",
+                (nombre, coordenadas[0], coordenadas[1], time.time())
+            )
+
+    def _consultar_nominatim(self, ciudad):
+        """
+        Devuelve (latitud, longitud), () si Nominatim responde sin resultados o None
+        si no se ha podido consultar (error, disyuntor abierto o sin turno).
+        """
+        params = {"q": ciudad, "format": "json", "limit": 1}
+        try:
+            if self.limitador is not None:
+                self.limitador.adquirir()
+            try:
+                self.disyuntor.permitir()
+            except CircuitoAbierto:
+                if self.limitador is not None:
+                    self.limitador.devolver()
+                raise
+            with self._lock_red:
+                espera = self._ultima_peticion + self.intervalo_minimo - time.monotonic()
+                if espera > 0:
+                    time.sleep(espera)
+                inicio = time.perf_counter()
+                try:
+                    with metricas.en_curso("aire_clima_upstream_en_curso", api="nominatim"):
+                        response = self.session.get(NOMINATIM_URL, params=params, timeout=self.timeout)
+                except requests.RequestException:
+                    self.disyuntor.fallo()
+                    metricas.incrementar("aire_clima_upstream_errores_total", api="nominatim")
+                    raise
+                finally:
+                    self._ultima_peticion = time.monotonic()
+            self.disyuntor.registrar(response.status_code)
+            metricas.observar("aire_clima_upstream_segundos", time.perf_counter() - inicio, api="nominatim")
+            metricas.observar("aire_clima_upstream_bytes", len(response.content), LIMITES_BYTES, api="nominatim")
+            metricas.incrementar("aire_clima_upstream_respuestas_total", api="nominatim", codigo=response.status_code)
+            if response.status_code == 200 and response.text.strip():
+                geocoding_data = response.json()
+                if not geocoding_data:
+                    return ()
+                location = geocoding_data[0]
+                return float(location["lat"]), float(location["lon"])
+        except Exception as e:
+            print(f"Error al obtener coordenadas: {e}")
+        return None
+
+    def limpiar(self):
+        """Vacía la caché en memoria y la persistente."""
+        self.memoria.limpiar()
+        with self._lock_db, self._db:
+            self._db.execute("DELETE FROM geocodificacion")
+            self._db.execute("DELETE FROM no_encontradas")
@@ -0,0 +1,271 @@
+# app/facade/limitador.py
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import requests
+
+# Prioridades de las peticiones salientes (un número menor se atiende antes)
+INTERACTIVA, LOTE, FONDO = 0, 1, 2
+
+# Límites por host: peticiones por segundo (None, sin límite de ritmo), ráfaga
+# máxima y cuota diaria. Los de Open-Meteo son los del plan gratuito (600 por
+# minuto y 10 000 al día); el ritmo de Nominatim (1 petición/s, de una en una)
+# lo marca ya Geocodificador.intervalo_minimo, aquí solo se cuenta su cuota.
+LIMITES_POR_HOST = {
+    "api.open-meteo.com": {"por_segundo": 10, "rafaga": 100, "cuota_diaria": 10000},
+    "air-quality-api.open-meteo.com": {"por_segundo": 10, "rafaga": 100, "cuota_diaria": 10000},
+    "nominatim.openstreetmap.org": {"por_segundo": None, "cuota_diaria": 5000}
+}
+
+_prioridad = ContextVar("prioridad_salida", default=INTERACTIVA)
+
+
+class LimiteSuperado(requests.RequestException):
+    """La petición no se envía: la cola de su host está llena o no le llegaría el turno a tiempo."""
+
+    def __init__(self, mensaje, reintentar_en=None):
+        super().__init__(mensaje)
+        self.reintentar_en = reintentar_en
+
+
+class CuotaAgotada(LimiteSuperado):
+    """Se ha gastado la cuota diaria del host (o la parte que no está reservada a los usuarios)."""
+
+
+def prioridad_actual():
+    return _prioridad.get()
+
+@contextmanager
+def con_prioridad(prioridad):
+    """Las peticiones salientes lanzadas dentro del bloque usan esta prioridad."""
+    token = _prioridad.set(prioridad)
+    try:
+        yield
+    finally:
+        _prioridad.reset(token)
+
+def segundos_retry_after(valor, defecto=1.0):
+    """Segundos de una cabecera Retry-After numérica, o `defecto` si falta o no es un número."""
+    try:
+        return max(0.0, float(valor))
+    except (TypeError, ValueError):
+        return defecto
+
+
+class Limitador:
+    """
+    Cubeta de fichas (token bucket) para las peticiones a un host externo.
+
+    Cada petición gasta una ficha y las fichas se reponen a `por_segundo`, hasta
+    `rafaga`. Las que no tienen ficha esperan en una cola ordenada por prioridad
+    (y por orden de llegada dentro de cada prioridad), acotada a `max_cola`; una
+    petición que no conseguiría su turno antes de su plazo se rechaza en lugar
+    de esperar para nada. Además se cuenta la cuota diaria (días UTC): a partir
+    de `1 - reserva_interactiva` de la cuota solo pasan las peticiones
+    interactivas, y agotada del todo se rechazan todas con CuotaAgotada, de modo
+    que la fachada sirve sus copias en caché en lugar de fallar.
+    """
+
+    def __init__(self, nombre, por_segundo=None, rafaga=1, cuota_diaria=None, reserva_interactiva=0.2,
+                 max_cola=100, espera_maxima=10.0):
+        """
+        Args:
+            nombre: Nombre del host, para los mensajes de error
+            por_segundo: Peticiones por segundo (None para no limitar el ritmo)
+            rafaga: Peticiones que se pueden enviar seguidas tras un periodo sin uso
+            cuota_diaria: Peticiones máximas por día UTC (None para no contarlas)
+            reserva_interactiva: Fracción de la cuota que solo pueden gastar las peticiones interactivas
+            max_cola: Peticiones que pueden esperar turno a la vez
+            espera_maxima: Segundos máximos que una petición espera su turno
+        """
+        self.nombre = nombre
+        self.por_segundo = por_segundo
+        self.rafaga = rafaga
+        self.cuota_diaria = cuota_diaria
+        self.reserva_interactiva = reserva_interactiva
+        self.max_cola = max_cola
+        self.espera_maxima = espera_maxima
+        self._fichas = float(rafaga)
+        self._repuesto = time.monotonic()
+        self._frenado_hasta = 0.0  # instante (time.monotonic) hasta el que no se envía nada
+        self._cola = []  # montículo de [prioridad, turno]
+        self._turnos = itertools.count()
+        self._condicion = threading.Condition()
+        self._dia = None
+        self.usadas_hoy = 0
+        self.enviadas = 0
+        self.rechazadas = 0
+
+    def _reponer(self, ahora):
+        if self.por_segundo is not None:
+            # Durante una pausa (frenar) no se reponen fichas
+            transcurrido = ahora - max(self._repuesto, self._frenado_hasta)
+            self._fichas = min(self.rafaga, self._fichas + max(0.0, transcurrido) * self.por_segundo)
+        self._repuesto = ahora
+
+    def _comprobar_cuota(self, prioridad):
+        hoy = datetime.now(timezone.utc).date()
+        if hoy != self._dia:
+            self._dia, self.usadas_hoy = hoy, 0
+        if self.cuota_diaria is None:
+            return
+        limite = self.cuota_diaria if prioridad == INTERACTIVA else self.cuota_diaria * (1 - self.reserva_interactiva)
+        if self.usadas_hoy >= limite:
+            self.rechazadas += 1
+            manana = datetime.combine(hoy, datetime.min.time(), timezone.utc).timestamp() + 24 * 60 * 60
+            raise CuotaAgotada(f"Cuota diaria de {self.nombre} agotada", reintentar_en=manana - time.time())
+
+    def _limite(self, plazo):
+        espera = self.espera_maxima if plazo is None else min(plazo, self.espera_maxima)
+        return time.monotonic() + espera
+
+    def _entrar(self, prioridad):
+        """Comprueba la cuota y pone la petición en la cola (con el lock tomado)."""
+        self._comprobar_cuota(prioridad)
+        self._reponer(time.monotonic())
+        # La cota es para las que tienen que esperar; la que sale al momento no cuenta
+        esperara = bool(self._cola) or self._frenado_hasta > time.monotonic() or \
+            (self.por_segundo is not None and self._fichas < 1)
+        if esperara and len(self._cola) >= self.max_cola:
+            self.rechazadas += 1
+            raise LimiteSuperado(f"Demasiadas peticiones en espera para {self.nombre}",
+                                 reintentar_en=len(self._cola) / (self.por_segundo or 1))
+        entrada = [prioridad, next(self._turnos)]
+        heapq.heappush(self._cola, entrada)
+        return entrada
+
+    def _intentar(self, entrada):
+        """
+        Da el turno a la petición si es la primera de la cola y hay ficha; devuelve
+        0 en ese caso o los segundos que quedan para su ficha (None si no es la primera).
+        """
+        ahora = time.monotonic()
+        self._reponer(ahora)
+        if self._cola[0] is not entrada:
+            return None
+        if self._frenado_hasta > ahora:
+            return self._frenado_hasta - ahora
+        if self.por_segundo is not None and self._fichas < 1:
+            return (1 - self._fichas) / self.por_segundo
+        heapq.heappop(self._cola)
+        if self.por_segundo is not None:
+            self._fichas -= 1
+        self.usadas_hoy += 1
+        self.enviadas += 1
+        self._condicion.notify_all()
+        return 0
+
+    def _salir(self, entrada):
+        """Saca de la cola una petición que se rinde (con el lock tomado)."""
+        self._cola.remove(entrada)
+        heapq.heapify(self._cola)
+        self.rechazadas += 1
+        self._condicion.notify_all()
+
+    def _rechazar(self, entrada, espera):
+        self._salir(entrada)
+        raise LimiteSuperado(f"Sin turno para {self.nombre} dentro del plazo", reintentar_en=espera)
+
+    def adquirir(self, prioridad=None, plazo=None):
+        """
+        Espera el turno de una petición saliente.
+
+        Args:
+            prioridad: INTERACTIVA, LOTE o FONDO (por defecto, la del contexto actual)
+            plazo: Segundos máximos de espera (como mucho `espera_maxima`)
+
+        Raises:
+            LimiteSuperado: Si la cola está llena o el turno no llega dentro del plazo
+            CuotaAgotada: Si no queda cuota diaria para esta prioridad
+        """
+        prioridad = prioridad_actual() if prioridad is None else prioridad
+        limite = self._limite(plazo)
+        with self._condicion:
+            entrada = self._entrar(prioridad)
+            while True:
+                espera = self._intentar(entrada)
+                if espera == 0:
+                    return
+                restante = limite - time.monotonic()
+                if restante <= 0 or (espera is not None and espera > restante):
+                    self._rechazar(entrada, espera)
+                self._condicion.wait(restante if espera is None else espera)
+
+    async def adquirir_async(self, prioridad=None, plazo=None):
+        """Equivalente asíncrono de adquirir: espera su turno sin bloquear el bucle de eventos."""
+        prioridad = prioridad_actual() if prioridad is None else prioridad
+        limite = self._limite(plazo)
+        with self._condicion:
+            entrada = self._entrar(prioridad)
+        try:
+            while True:
+                with self._condicion:
+                    espera = self._intentar(entrada)
+                    if espera == 0:
+                        return
+                    restante = limite - time.monotonic()
+                    if restante <= 0 or (espera is not None and espera > restante):
+                        self._rechazar(entrada, espera)
+                # Las que no son primeras de la cola vuelven a mirar cada poco
+                await asyncio.sleep(min(restante, 0.01 if espera is None else espera))
+        except asyncio.CancelledError:
+            with self._condicion:
+                self._salir(entrada)
+            raise
+
+    def devolver(self):
+        """Descuenta de la cuota una petición que obtuvo turno pero no se llegó a enviar."""
+        with self._condicion:
+            self.usadas_hoy = max(0, self.usadas_hoy - 1)
+            self.enviadas -= 1
+
+    def frenar(self, segundos):
+        """Detiene los envíos `segundos` segundos (p. ej. tras un 429 con Retry-After)."""
+        with self._condicion:
+            self._frenado_hasta = max(self._frenado_hasta, time.monotonic() + segundos)
+            # Al reanudar no se envía de golpe la ráfaga que quedaba antes de la pausa
+            self._fichas = min(self._fichas, 1)
+            self._condicion.notify_all()
+
+    def estadisticas(self):
+        with self._condicion:
+            estadisticas = {"enviadas": self.enviadas, "rechazadas": self.rechazadas,
+                            "en_cola": len(self._cola), "cuota_usada": self.usadas_hoy}
+            if self.cuota_diaria is not None:
+                estadisticas["cuota_restante"] = max(0, self.cuota_diaria - self.usadas_hoy)
+            return estadisticas
+
+
+class PlanificadorSalida:
+    """
+    Punto único por el que pasan las peticiones salientes: un Limitador por
+    host, compartido por la fachada, la interfaz y el geocodificador.
+    """
+
+    def __init__(self, limites=None):
+        """
+        Args:
+            limites: Diccionario host -> argumentos de Limitador (por defecto, LIMITES_POR_HOST);
+                los hosts que no aparecen no se limitan
+        """
+        self.limitadores = {
+            host: Limitador(host, **opciones)
+            for host, opciones in (LIMITES_POR_HOST if limites is None else limites).items()
+        }
+        self._lock = threading.Lock()
+
+    def para(self, url):
+        """Devuelve el Limitador del host de la URL (uno sin límites si no está configurado)."""
+        host = urlsplit(url).hostname
+        with self._lock:
+            limitador = self.limitadores.get(host)
+            if limitador is None:
+                limitador = self.limitadores[host] = Limitador(host)
+            return limitador
@@ -0,0 +1,180 @@
+# app/facade/malla.py
+import base64
+import math
+import struct
+import zlib
+
+import numpy as np
+
+from app.facade.aireYClimaFacade import alinear_hora_actual
+from app.facade.analisis import UMBRALES_CALIDAD
+
+# Categorías por su código en la malla (0, sin datos; de 1, la mejor, a 5, la peor)
+CATEGORIAS_CALIDAD = ("Datos no disponibles", "Muy buena") + tuple(
+    calidad for _, _, calidad in reversed(UMBRALES_CALIDAD))
+# Colores RGBA de cada código para la imagen PNG (las celdas sin datos son transparentes)
+PALETA_CALIDAD = (
+    (0, 0, 0, 0),
+    (80, 240, 230, 255),
+    (80, 204, 170, 255),
+    (240, 230, 65, 255),
+    (255, 80, 80, 255),
+    (150, 0, 50, 255)
+)
+
+def clasificar_calidad(pm10, pm2_5):
+    """
+    Código de calidad del aire (índice de CATEGORIAS_CALIDAD) de cada par de valores
+    de PM10 y PM2.5, con los umbrales de UMBRALES_CALIDAD. Los valores NaN (sin
+    datos) dan el código 0.
+
+    Args:
+        pm10: Array de NumPy con los valores de PM10
+        pm2_5: Array de NumPy con los valores de PM2.5, de la misma forma
+    """
+    pm10 = np.asarray(pm10, dtype=np.float64)
+    pm2_5 = np.asarray(pm2_5, dtype=np.float64)
+    calidad = np.ones(pm10.shape, dtype=np.uint8)
+    # De la mejor a la peor: cada umbral superado sobrescribe el código anterior
+    for codigo, (limite_pm10, limite_pm2_5, _) in enumerate(reversed(UMBRALES_CALIDAD), start=2):
+        calidad[(pm10 > limite_pm10) | (pm2_5 > limite_pm2_5)] = codigo
+    calidad[np.isnan(pm10) | np.isnan(pm2_5)] = 0
+    return calidad
+
+def leer_bbox(valor):
+    """
+    Convierte el parámetro `bbox=oeste,sur,este,norte` (grados) en una tupla.
+
+    Raises:
+        ValueError: Si no son cuatro números o no forman un rectángulo válido
+    """
+    oeste, sur, este, norte = (float(parte) for parte in valor.split(","))
+    if not (-180 <= oeste <= este <= 180 and -90 <= sur <= norte <= 90):
+        raise ValueError(f"Rectángulo no válido: {valor}")
+    return oeste, sur, este, norte
+
+def _nodos(desde, hasta, resolucion):
+    return math.floor((hasta - desde) / resolucion + 1e-9) + 1
+
+def dimensiones_malla(bbox, resolucion):
+    """Filas y columnas de la malla de un rectángulo (oeste, sur, este, norte)."""
+    oeste, sur, este, norte = bbox
+    return _nodos(sur, norte, resolucion), _nodos(oeste, este, resolucion)
+
+def _valor(valores):
+    """Primer valor de una serie como float (NaN si falta)."""
+    valor = valores[0] if valores else None
+    return np.nan if valor is None else float(valor)
+
+def codificar_png(indices, paleta):
+    """
+    Imagen PNG de color indexado (8 bits) con un píxel por elemento de `indices`.
+
+    Args:
+        indices: Array 2D de enteros (0-255), fila a fila de arriba abajo
+        paleta: Colores RGBA de cada índice
+    """
+    filas, columnas = indices.shape
+
+    def trozo(tipo, datos):
+        return struct.pack(">I", len(datos)) + tipo + datos + struct.pack(">I", zlib.crc32(tipo + datos))
+
+    # Cada fila de la imagen empieza por su tipo de filtro (0: sin filtro)
+    crudo = np.hstack([np.zeros((filas, 1), dtype=np.uint8), indices.astype(np.uint8)]).tobytes()
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        trozo(b"IHDR", struct.pack(">IIBBBBB", columnas, filas, 8, 3, 0, 0, 0)),
+        trozo(b"PLTE", bytes(canal for color in paleta for canal in color[:3])),
+        trozo(b"tRNS", bytes(color[3] for color in paleta)),
+        trozo(b"IDAT", zlib.compress(crudo, 6)),
+        trozo(b"IEND", b"")
+    ))
+
+
+class Malla:
+    """
+    Malla regular de nodos sobre un rectángulo, para superponer en un mapa la
+    calidad del aire y la temperatura actuales.
+
+    Los nodos están a `resolucion` grados desde la esquina noroeste, fila a fila
+    de norte a sur. Cada nodo toma los datos de su celda de la rejilla de la caché:
+    como la malla es el producto de sus dos ejes, las celdas distintas se obtienen
+    ajustando solo las latitudes y longitudes de los ejes, y los valores de cada
+    nodo se reparten desde las celdas con una indexación de NumPy, sin recorrer
+    los nodos uno a uno.
+    """
+
+    def __init__(self, bbox, resolucion, ajustar):
+        """
+        Args:
+            bbox: Tupla (oeste, sur, este, norte) en grados
+            resolucion: Distancia en grados entre nodos vecinos
+            ajustar: Función que lleva una coordenada al centro de su celda (CacheRespuestas.ajustar)
+        """
+        oeste, sur, este, norte = bbox
+        self.resolucion = resolucion
+        self.filas, self.columnas = dimensiones_malla(bbox, resolucion)
+        self.latitudes = np.round(norte - resolucion * np.arange(self.filas), 6)
+        self.longitudes = np.round(oeste + resolucion * np.arange(self.columnas), 6)
+        # Celdas distintas de cada eje y la de cada nodo
+        self._latitudes_celda, self._indices_lat = np.unique(
+            [ajustar(latitude) for latitude in self.latitudes.tolist()], return_inverse=True)
+        self._longitudes_celda, self._indices_lon = np.unique(
+            [ajustar(longitude) for longitude in self.longitudes.tolist()], return_inverse=True)
+        self.temperatura = self.pm10 = self.pm2_5 = self.calidad = None
+
+    @property
+    def celdas(self):
+        """Celdas (latitud, longitud) de la rejilla de la caché que cubren la malla."""
+        return [(latitude, longitude) for latitude in self._latitudes_celda.tolist()
+                for longitude in self._longitudes_celda.tolist()]
+
+    def rellenar(self, datos):
+        """
+        Reparte entre los nodos los datos actuales de sus celdas y clasifica la
+        calidad del aire de cada uno.
+
+        Args:
+            datos: Diccionario celda -> {"weather", "air_quality"} (AireYClimaFacade.recoger_datos_celdas)
+        """
+        forma = (len(self._latitudes_celda), len(self._longitudes_celda))
+        temperatura, pm10, pm2_5 = np.full(forma, np.nan), np.full(forma, np.nan), np.full(forma, np.nan)
+        for i, latitude in enumerate(self._latitudes_celda.tolist()):
+            for j, longitude in enumerate(self._longitudes_celda.tolist()):
+                dato = datos.get((latitude, longitude)) or {}
+                valor = (dato.get("weather") or {}).get("current_weather", {}).get("temperature")
+                temperatura[i, j] = np.nan if valor is None else valor
+                hourly = (alinear_hora_actual(dato.get("air_quality"), 1) or {}).get("hourly") or {}
+                pm10[i, j] = _valor(hourly.get("pm10"))
+                pm2_5[i, j] = _valor(hourly.get("pm2_5"))
+
+        nodos = np.ix_(self._indices_lat, self._indices_lon)
+        self.temperatura = temperatura[nodos]
+        self.pm10 = pm10[nodos]
+        self.pm2_5 = pm2_5[nodos]
+        self.calidad = clasificar_calidad(self.pm10, self.pm2_5)
+        return self
+
+    def a_json(self):
+        """
+        Diccionario serializable con la malla. Las series van en base64, fila a fila
+        desde el noroeste: la calidad como códigos uint8 y el resto como float32
+        little-endian (NaN, sin datos).
+        """
+        series = {"calidad": self.calidad.astype(np.uint8)}
+        for nombre in ("temperatura", "pm10", "pm2_5"):
+            series[nombre] = getattr(self, nombre).astype("<f4")
+        return {
+            "norte": self.latitudes[0].item(),
+            "oeste": self.longitudes[0].item(),
+            "resolucion": self.resolucion,
+            "filas": self.filas,
+            "columnas": self.columnas,
+            "categorias": list(CATEGORIAS_CALIDAD),
+            "tipos": {nombre: serie.dtype.name for nombre, serie in series.items()},
+            **{nombre: base64.b64encode(serie.tobytes()).decode("ascii") for nombre, serie in series.items()}
+        }
+
+    def a_png(self):
+        """Imagen PNG con un píxel por nodo, coloreado según su calidad del aire."""
+        return codificar_png(self.calidad, PALETA_CALIDAD)
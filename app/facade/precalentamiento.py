@@ -0,0 +1,123 @@
+# app/facade/precalentamiento.py
+import threading
+
+import requests
+
+from app.facade.limitador import LimiteSuperado
+
+class ContadorFrecuentes:
+    """
+    Cuenta aproximada de las consultas más frecuentes con memoria acotada
+    (algoritmo Space-Saving). Guarda como mucho `capacidad` elementos; cuando
+    llega uno nuevo y no hay sitio, sustituye al menos contado y hereda su
+    cuenta, de modo que los elementos realmente frecuentes nunca se pierden.
+    """
+
+    def __init__(self, capacidad=200):
+        """
+        Args:
+            capacidad: Número máximo de elementos contados a la vez
+        """
+        self.capacidad = capacidad
+        self._cuentas = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, elemento):
+        with self._lock:
+            if elemento in self._cuentas or len(self._cuentas) < self.capacidad:
+                self._cuentas[elemento] = self._cuentas.get(elemento, 0) + 1
+                return
+            menos_frecuente = min(self._cuentas, key=self._cuentas.get)
+            self._cuentas[elemento] = self._cuentas.pop(menos_frecuente) + 1
+
+    def mas_frecuentes(self, n):
+        """Devuelve los `n` elementos más contados, de más a menos frecuente."""
+        with self._lock:
+            return sorted(self._cuentas, key=self._cuentas.get, reverse=True)[:n]
+
+    def limpiar(self):
+        with self._lock:
+            self._cuentas.clear()
+
+
+class Precalentador:
+    """
+    Refresca en segundo plano los datos de las ubicaciones más consultadas y de
+    las fijadas en la configuración, poco antes de que caduquen en la caché.
+    Como los TTL siguen la frecuencia de actualización de Open-Meteo, las
+    consultas de usuario sobre esas ubicaciones no llegan a esperar a la red.
+    """
+
+    def __init__(self, fachada, ubicaciones_fijas=(), max_ubicaciones=20, peticiones_minuto=60,
+                 intervalo=60, antelacion=300, dias=7):
+        """
+        Args:
+            fachada: AireYClimaFacade cuya caché se mantiene caliente
+            ubicaciones_fijas: Pares (latitud, longitud) que se refrescan siempre
+            max_ubicaciones: Número de consultas frecuentes que se refrescan en cada ciclo
+            peticiones_minuto: Presupuesto de peticiones a las APIs externas por minuto
+            intervalo: Segundos entre ciclos de refresco
+            antelacion: Se refrescan las entradas que caducan en menos de estos segundos
+            dias: Días de histórico que se refrescan para las ubicaciones fijas
+        """
+        self.fachada = fachada
+        self.ubicaciones_fijas = [(float(lat), float(lon)) for lat, lon in ubicaciones_fijas]
+        self.max_ubicaciones = max_ubicaciones
+        self.peticiones_minuto = peticiones_minuto
+        self.intervalo = intervalo
+        self.antelacion = antelacion
+        self.dias = dias
+        self.ciclos = 0
+        self.peticiones = 0
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def consultas(self):
+        """Consultas a refrescar, en orden de prioridad: las fijas y después las frecuentes."""
+        consultas = []
+        for latitude, longitude in self.ubicaciones_fijas:
+            consultas.append(("actual", latitude, longitude))
+            consultas.append(("historico", latitude, longitude, self.dias))
+        for consulta in self.fachada.frecuentes.mas_frecuentes(self.max_ubicaciones):
+            if consulta not in consultas:
+                consultas.append(consulta)
+        return consultas
+
+    def ciclo(self):
+        """Refresca las consultas pendientes sin superar el presupuesto del ciclo."""
+        presupuesto = self.peticiones_minuto * self.intervalo / 60
+        lanzadas = 0
+        for tipo, latitude, longitude, *dias in self.consultas():
+            if lanzadas >= presupuesto:
+                break
+            try:
+                lanzadas += self.fachada.precalentar(
+                    latitude, longitude, dias[0] if dias else None, antelacion=self.antelacion)
+            except LimiteSuperado as e:
+                # Sin turno o sin cuota para el trabajo de fondo: se deja para el siguiente ciclo
+                print("Precalentamiento aplazado:", e)
+                break
+            except requests.RequestException as e:
+                print("Error al precalentar datos:", e)
+        self.ciclos += 1
+        self.peticiones += lanzadas
+        return lanzadas
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            self.ciclo()
+            self._parar.wait(self.intervalo)
+
+    def iniciar(self):
+        """Arranca el hilo de refresco (si no estaba ya en marcha)."""
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="precalentamiento", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
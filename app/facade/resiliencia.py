@@ -0,0 +1,76 @@
+# app/facade/resiliencia.py
+import threading
+import time
+
+import requests
+
+class CircuitoAbierto(requests.RequestException):
+    """Se rechaza la petición sin enviarla porque el servicio externo está fallando."""
+
+
+class PlazoAgotado(requests.Timeout):
+    """La respuesta del servicio externo no llegó dentro del plazo de la petición."""
+
+
+class Disyuntor:
+    """
+    Disyuntor (circuit breaker) para un servicio externo.
+
+    Tras `umbral_fallos` fallos seguidos se abre y rechaza las peticiones
+    durante `tiempo_apertura` segundos sin llegar a enviarlas. Pasado ese
+    tiempo deja pasar una sola petición de prueba (semiabierto): si funciona
+    se cierra de nuevo y, si falla, vuelve a abrirse.
+    """
+    CERRADO, ABIERTO, SEMIABIERTO = "cerrado", "abierto", "semiabierto"
+
+    def __init__(self, nombre, umbral_fallos=5, tiempo_apertura=30):
+        """
+        Args:
+            nombre: Nombre del servicio, para los mensajes de error
+            umbral_fallos: Fallos consecutivos que abren el circuito
+            tiempo_apertura: Segundos que permanece abierto antes de probar de nuevo
+        """
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self.estado = self.CERRADO
+        self.fallos = 0
+        self.aperturas = 0
+        self._abierto_desde = 0.0
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """Lanza CircuitoAbierto si la petición no debe enviarse."""
+        with self._lock:
+            if self.estado == self.CERRADO:
+                return
+            if self.estado == self.ABIERTO and time.monotonic() - self._abierto_desde >= self.tiempo_apertura:
+                # Dejar pasar esta petición como prueba
+                self.estado = self.SEMIABIERTO
+                return
+        raise CircuitoAbierto(f"{self.nombre} no disponible temporalmente")
+
+    def exito(self):
+        with self._lock:
+            self.estado = self.CERRADO
+            self.fallos = 0
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.estado == self.SEMIABIERTO or self.fallos >= self.umbral_fallos:
+                if self.estado != self.ABIERTO:
+                    self.aperturas += 1
+                self.estado = self.ABIERTO
+                self._abierto_desde = time.monotonic()
+
+    def registrar(self, status_code):
+        """Cuenta una respuesta HTTP: los 5xx y 429 son fallos del servicio, el resto no."""
+        if status_code >= 500 or status_code == 429:
+            self.fallo()
+        else:
+            self.exito()
+
+    def estadisticas(self):
+        with self._lock:
+            return {"estado": self.estado, "fallos": self.fallos, "aperturas": self.aperturas}
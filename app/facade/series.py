@@ -0,0 +1,175 @@
+# app/facade/series.py
+import numpy as np
+
+# Formato de las fechas de Open-Meteo: "YYYY-MM-DD" en series diarias, "YYYY-MM-DDTHH:MM" en horarias
+UNIDAD_DIARIA = "D"
+UNIDAD_HORARIA = "m"
+# Decimales de las medias de las series agregadas (los datos de origen tienen uno)
+DECIMALES_AGREGADOS = 2
+SEGUNDOS_DIA = 24 * 60 * 60
+
+def _columna(valores):
+    """Convierte una lista de la API (con posibles None) en un array float64 de solo lectura."""
+    columna = np.array(valores if valores is not None else [], dtype=float)
+    columna.flags.writeable = False
+    return columna
+
+
+class Serie:
+    """
+    Serie temporal en columnas: el eje de tiempos como segundos Unix (int64) y
+    cada variable como un array float64 con NaN en los huecos.
+
+    Sustituye internamente a los bloques "daily"/"hourly" de Open-Meteo (listas
+    de floats y de fechas en texto), que ocupan varias veces más memoria. Se
+    consulta como esos bloques (`serie.get("pm10")`) y se vuelve a convertir a
+    JSON solo al responder. Las series guardadas en caché se comparten entre
+    llamadas, por lo que sus columnas son de solo lectura.
+    """
+    __slots__ = ("tiempo", "columnas", "unidad")
+
+    def __init__(self, tiempo=None, columnas=None, unidad=UNIDAD_HORARIA):
+        """
+        Args:
+            tiempo: Array int64 de segundos Unix (hora local de la API) o None si no hay eje de tiempos
+            columnas: Diccionario nombre -> array float64
+            unidad: UNIDAD_DIARIA o UNIDAD_HORARIA, para volver a formatear las fechas
+        """
+        self.tiempo = tiempo
+        self.columnas = columnas or {}
+        self.unidad = unidad
+
+    @classmethod
+    def desde_json(cls, bloque):
+        """Construye la serie a partir de un bloque "daily" u "hourly" de la API."""
+        columnas = {nombre: _columna(valores) for nombre, valores in bloque.items() if nombre != "time"}
+        fechas = bloque.get("time")
+        if fechas is None:
+            return cls(None, columnas)
+        unidad = UNIDAD_DIARIA if fechas and len(fechas[0]) == 10 else UNIDAD_HORARIA
+        tiempo = np.array(fechas, dtype="datetime64[s]").astype(np.int64)
+        tiempo.flags.writeable = False
+        return cls(tiempo, columnas, unidad)
+
+    @classmethod
+    def concatenar(cls, series):
+        """Une varias series consecutivas; las columnas que falten en alguna se rellenan con NaN."""
+        series = [serie for serie in series if len(serie)]
+        if not series:
+            return cls()
+        nombres = list(dict.fromkeys(nombre for serie in series for nombre in serie.columnas))
+        columnas = {
+            nombre: np.concatenate([serie.columnas.get(nombre, np.full(len(serie), np.nan)) for serie in series])
+            for nombre in nombres
+        }
+        tiempos = [serie.tiempo for serie in series if serie.tiempo is not None]
+        return cls(np.concatenate(tiempos) if tiempos else None, columnas, series[0].unidad)
+
+    def __len__(self):
+        if self.tiempo is not None:
+            return len(self.tiempo)
+        return max((len(columna) for columna in self.columnas.values()), default=0)
+
+    def __contains__(self, nombre):
+        return nombre in self.columnas
+
+    def __getitem__(self, nombre):
+        return self.columnas[nombre]
+
+    def get(self, nombre, defecto=None):
+        return self.columnas.get(nombre, defecto)
+
+    @property
+    def nbytes(self):
+        """Memoria ocupada por los datos de la serie."""
+        total = sum(columna.nbytes for columna in self.columnas.values())
+        return total + (self.tiempo.nbytes if self.tiempo is not None else 0)
+
+    def fechas(self):
+        """Fecha (YYYY-MM-DD) de cada instante de la serie."""
+        if self.tiempo is None:
+            return []
+        return np.datetime_as_string(self.tiempo.astype("datetime64[s]"), unit="D").tolist()
+
+    def lista(self, nombre, inicio=0, fin=None):
+        """Valores de una columna (o de un tramo) como lista JSON, con None en los huecos."""
+        columna = self.columnas.get(nombre)
+        if columna is None:
+            return []
+        return [None if valor != valor else valor for valor in columna[inicio:fin].tolist()]
+
+    def posiciones(self, instantes):
+        """Posición del primer instante de la serie no anterior a cada uno de `instantes` (segundos Unix)."""
+        if self.tiempo is None:
+            return np.zeros(len(instantes), dtype=np.int64)
+        return np.searchsorted(self.tiempo, instantes)
+
+    def seleccionar(self, nombres):
+        """Serie con el mismo eje de tiempos y solo las columnas indicadas que existan."""
+        return Serie(self.tiempo, {nombre: columna for nombre, columna in self.columnas.items() if nombre in nombres},
+                     self.unidad)
+
+    def agregar(self, horas):
+        """
+        Serie con la media de cada tramo de `horas` horas (24 para medias diarias),
+        contados desde la medianoche del primer día de la serie (y no desde la época
+        Unix, para que los tramos que no dividen el día o las semanas empiecen ese día).
+        Los tramos sin valores quedan como NaN.
+        """
+        if self.tiempo is None or not len(self.tiempo):
+            return self
+        paso = horas * 60 * 60
+        medianoche = self.tiempo[0] // SEGUNDOS_DIA * SEGUNDOS_DIA
+        tramos = (self.tiempo - medianoche) // paso
+        inicios = np.flatnonzero(np.concatenate(([True], tramos[1:] != tramos[:-1])))
+        tiempo = medianoche + tramos[inicios] * paso
+        tiempo.flags.writeable = False
+        columnas = {}
+        for nombre, columna in self.columnas.items():
+            validos = ~np.isnan(columna)
+            sumas = np.add.reduceat(np.where(validos, columna, 0.0), inicios)
+            cuentas = np.add.reduceat(validos.astype(np.int64), inicios)
+            with np.errstate(invalid="ignore"):
+                medias = np.round(sumas / cuentas, DECIMALES_AGREGADOS)
+            medias.flags.writeable = False
+            columnas[nombre] = medias
+        return Serie(tiempo, columnas, self.unidad)
+
+    def a_json(self):
+        """Devuelve el bloque con el formato de la API: listas de fechas en texto y de valores."""
+        bloque = {}
+        if self.tiempo is not None:
+            bloque["time"] = np.datetime_as_string(self.tiempo.astype("datetime64[s]"), unit=self.unidad).tolist()
+        for nombre in self.columnas:
+            bloque[nombre] = self.lista(nombre)
+        return bloque
+
+
+def como_serie(bloque):
+    """Devuelve el bloque como Serie (vacía si no hay bloque)."""
+    if isinstance(bloque, Serie):
+        return bloque
+    return Serie.desde_json(bloque) if bloque else Serie()
+
+def valores(bloque, nombre):
+    """Valores de una columna como lista, tanto si el bloque es una Serie como un bloque JSON."""
+    if isinstance(bloque, Serie):
+        return bloque.lista(nombre)
+    return bloque.get(nombre, [])
+
+def compactar(datos):
+    """Copia de una respuesta de la API con sus bloques "daily" y "hourly" convertidos en Serie."""
+    return {
+        clave: como_serie(valor) if clave in ("daily", "hourly") and isinstance(valor, dict) else valor
+        for clave, valor in datos.items()
+    }
+
+def a_json(objeto):
+    """Convierte recursivamente las Serie de una respuesta a su formato JSON."""
+    if isinstance(objeto, Serie):
+        return objeto.a_json()
+    if isinstance(objeto, dict):
+        return {clave: a_json(valor) for clave, valor in objeto.items()}
+    if isinstance(objeto, (list, tuple)):
+        return [a_json(valor) for valor in objeto]
+    return objeto
@@ -0,0 +1,235 @@
+# app/metricas.py
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites de los histogramas: segundos (latencias) y bytes (tamaño de las respuestas)
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+AYUDA = {
+    "aire_clima_peticion_segundos": "Duración de las peticiones HTTP atendidas, por endpoint",
+    "aire_clima_peticiones_total": "Peticiones HTTP atendidas, por endpoint y código",
+    "aire_clima_peticiones_en_curso": "Peticiones HTTP que se están atendiendo",
+    "aire_clima_tramo_segundos": "Duración de cada etapa de una petición",
+    "aire_clima_upstream_segundos": "Latencia de las APIs externas",
+    "aire_clima_upstream_bytes": "Tamaño de las respuestas de las APIs externas",
+    "aire_clima_upstream_respuestas_total": "Respuestas de las APIs externas, por código",
+    "aire_clima_upstream_errores_total": "Peticiones a las APIs externas sin respuesta (red o timeout)",
+    "aire_clima_upstream_en_curso": "Peticiones a las APIs externas en curso"
+}
+
+# Estadísticas de las fuentes que solo crecen (salvo al reiniciar o limpiar): se
+# exportan como contadores `aire_clima_<prefijo>_<clave>_total` para poder usar rate()
+CONTADORES_FUENTES = {
+    "cache": ("aciertos", "fallos", "desalojos"),
+    "coalescencia": ("lanzadas", "coalescidas"),
+    "limitador": ("enviadas", "rechazadas"),
+    "disyuntor": ("aperturas",),
+    "difusion": ("ciclos", "publicados", "entregas"),
+    "celdas": ("reutilizadas",)
+}
+
+# Etapas medidas en la petición actual, para la cabecera Server-Timing
+_tramos = contextvars.ContextVar("tramos", default=None)
+
+def _etiquetas(etiquetas):
+    return tuple(sorted(etiquetas.items()))
+
+def _formatear(nombre, etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return nombre
+    texto = ",".join('{}="{}"'.format(clave, str(valor).replace("\\", "\\\\").replace('"', '\\"'))
+                     for clave, valor in pares)
+    return f"{nombre}{{{texto}}}"
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Histograma:
+    """Histograma de cubetas fijas con la suma y el número de observaciones."""
+    __slots__ = ("limites", "cuentas", "suma", "_lock")
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        i = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            self.cuentas[i] += 1
+            self.suma += valor
+
+    def lineas(self, nombre, etiquetas):
+        with self._lock:
+            cuentas, suma = list(self.cuentas), self.suma
+        acumulado = 0
+        for limite, cuenta in zip(self.limites + ("+Inf",), cuentas):
+            acumulado += cuenta
+            yield f"{_formatear(nombre + '_bucket', etiquetas, [('le', limite)])} {acumulado}"
+        yield f"{_formatear(nombre + '_sum', etiquetas)} {_numero(suma)}"
+        yield f"{_formatear(nombre + '_count', etiquetas)} {acumulado}"
+
+
+class RegistroMetricas:
+    """
+    Métricas del proceso en formato de texto de Prometheus: histogramas de
+    latencia y tamaño, contadores, indicadores de peticiones en curso y las
+    estadísticas que ya llevan las cachés, el coalescedor y los disyuntores,
+    que se leen al exportar. Cada observación cuesta un bisect y un lock, por
+    lo que puede quedarse activo en producción.
+    """
+
+    def __init__(self):
+        self._histogramas = {}  # (nombre, etiquetas) -> Histograma
+        self._contadores = {}  # (nombre, etiquetas) -> número
+        self._en_curso = {}  # (nombre, etiquetas) -> número
+        self._fuentes = []  # (prefijo, función que devuelve un diccionario de estadísticas, etiquetas)
+        self._lock = threading.Lock()
+
+    def observar(self, nombre, valor, limites=LIMITES_SEGUNDOS, **etiquetas):
+        clave = (nombre, _etiquetas(etiquetas))
+        histograma = self._histogramas.get(clave)
+        if histograma is None:
+            with self._lock:
+                histograma = self._histogramas.setdefault(clave, Histograma(limites))
+        histograma.observar(valor)
+
+    def incrementar(self, nombre, cantidad=1, **etiquetas):
+        clave = (nombre, _etiquetas(etiquetas))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + cantidad
+
+    def ajustar(self, nombre, cambio, **etiquetas):
+        """Suma cambio (positivo o negativo) a un indicador de operaciones en curso."""
+        clave = (nombre, _etiquetas(etiquetas))
+        with self._lock:
+            self._en_curso[clave] = self._en_curso.get(clave, 0) + cambio
+
+    @contextmanager
+    def en_curso(self, nombre, **etiquetas):
+        """Cuenta como en curso lo que se ejecuta dentro del bloque."""
+        self.ajustar(nombre, 1, **etiquetas)
+        try:
+            yield
+        finally:
+            self.ajustar(nombre, -1, **etiquetas)
+
+    @contextmanager
+    def tramo(self, nombre):
+        """
+        Mide una etapa de la petición (geocodificación, APIs, análisis, render...)
+        y la anota para la cabecera Server-Timing de la petición actual.
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.observar("aire_clima_tramo_segundos", duracion, tramo=nombre)
+            tramos = _tramos.get()
+            if tramos is not None:
+                tramos.append((nombre, duracion))
+
+    def registrar_fuente(self, prefijo, estadisticas, **etiquetas):
+        """
+        Exporta como indicadores `aire_clima_<prefijo>_<clave>` los valores del
+        diccionario que devuelve estadisticas() en el momento de exportar (como
+        contadores `..._total` los de CONTADORES_FUENTES).
+        """
+        with self._lock:
+            self._fuentes.append((prefijo, estadisticas, _etiquetas(etiquetas)))
+
+    def exportar(self):
+        """Devuelve todas las métricas en el formato de texto de Prometheus."""
+        with self._lock:
+            histogramas = sorted(self._histogramas.items())
+            contadores = sorted(self._contadores.items())
+            en_curso = sorted(self._en_curso.items())
+            fuentes = list(self._fuentes)
+
+        # Todas las muestras de una familia deben ir seguidas, bajo una sola línea TYPE,
+        # aunque vengan de varias fuentes (p. ej. las cachés de respuestas y de páginas)
+        familias = {}  # nombre -> (tipo, líneas)
+        def familia(nombre, tipo):
+            return familias.setdefault(nombre, (tipo, []))[1]
+
+        for (nombre, etiquetas), histograma in histogramas:
+            familia(nombre, "histogram").extend(histograma.lineas(nombre, etiquetas))
+        for (nombre, etiquetas), valor in contadores:
+            familia(nombre, "counter").append(f"{_formatear(nombre, etiquetas)} {_numero(valor)}")
+        for (nombre, etiquetas), valor in en_curso:
+            familia(nombre, "gauge").append(f"{_formatear(nombre, etiquetas)} {valor}")
+
+        for prefijo, estadisticas, etiquetas in fuentes:
+            valores = dict(estadisticas())
+            if "aciertos" in valores and "fallos" in valores:
+                consultas = valores["aciertos"] + valores["fallos"]
+                valores["ratio_aciertos"] = valores["aciertos"] / consultas if consultas else 0.0
+            for clave, valor in valores.items():
+                nombre = f"aire_clima_{prefijo}_{clave}"
+                if clave in CONTADORES_FUENTES.get(prefijo, ()):
+                    nombre += "_total"
+                    muestras = familia(nombre, "counter")
+                else:
+                    muestras = familia(nombre, "gauge")
+                if isinstance(valor, str):
+                    # Estados (p. ej. del disyuntor) como etiqueta con valor 1
+                    muestras.append(f"{_formatear(nombre, etiquetas, [(clave, valor)])} 1")
+                else:
+                    muestras.append(f"{_formatear(nombre, etiquetas)} {_numero(valor)}")
+
+        lineas = []
+        for nombre, (tipo, muestras) in familias.items():
+            if nombre in AYUDA:
+                lineas.append(f"# HELP {nombre} {AYUDA[nombre]}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            lineas.extend(muestras)
+        return "\n".join(lineas) + "\n"
+
+
+# Registro compartido por la fachada, la API y la interfaz
+metricas = RegistroMetricas()
+
+
+def instalar(app):
+    """
+    Mide cada petición de la aplicación Flask y, si SERVER_TIMING está activo
+    en la configuración, añade a la respuesta la cabecera Server-Timing con
+    la duración de cada etapa.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def iniciar_medicion():
+        g.metricas_inicio = time.perf_counter()
+        g.metricas_tramos = _tramos.set([])
+        metricas.ajustar("aire_clima_peticiones_en_curso", 1)
+
+    @app.after_request
+    def terminar_medicion(response):
+        inicio = g.pop("metricas_inicio", None)
+        if inicio is None:
+            return response
+        duracion = time.perf_counter() - inicio
+        endpoint = request.endpoint or "desconocido"
+        metricas.observar("aire_clima_peticion_segundos", duracion, endpoint=endpoint)
+        metricas.incrementar("aire_clima_peticiones_total", endpoint=endpoint, codigo=response.status_code)
+        if app.config.get("SERVER_TIMING"):
+            tramos = (_tramos.get() or []) + [("total", duracion)]
+            response.headers["Server-Timing"] = ", ".join(
+                f"{nombre};dur={segundos * 1000:.1f}" for nombre, segundos in tramos)
+        return response
+
+    @app.teardown_request
+    def limpiar_medicion(error=None):
+        token = g.pop("metricas_tramos", None)
+        if token is not None:
+            _tramos.reset(token)
+            metricas.ajustar("aire_clima_peticiones_en_curso", -1)
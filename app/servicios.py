@@ -0,0 +1,62 @@
+# app/servicios.py
+import os
+from app.facade.aireYClimaFacade import AireYClimaFacade
+from app.facade.almacen import AlmacenSeries
+from app.facade.cache import CacheRespuestas
+from app.facade.cache_compartida import CacheCompartida
+from app.facade.difusion import Difusor
+from app.facade.geocodificacion import NOMINATIM_URL, Geocodificador, Nomenclator
+from app.facade.limitador import PlanificadorSalida
+from app.metricas import metricas
+
+# Carpeta para los datos locales (cachés persistentes), fuera del control de versiones
+INSTANCE_PATH = os.environ.get(
+    "AIRE_CLIMA_INSTANCE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance")
+)
+os.makedirs(INSTANCE_PATH, exist_ok=True)
+
+def crear_cache():
+    """
+    Caché de respuestas según AIRE_CLIMA_CACHE: "memoria" (por defecto, propia de
+    cada proceso) o "compartida" (un fichero SQLite común a todos los workers de
+    un servidor pre-fork, que así comparten una sola caché caliente).
+    """
+    tipo = os.environ.get("AIRE_CLIMA_CACHE", "memoria")
+    if tipo == "compartida":
+        return CacheCompartida(os.path.join(INSTANCE_PATH, "cache.sqlite"))
+    if tipo != "memoria":
+        raise ValueError(f"AIRE_CLIMA_CACHE no válido: {tipo} (memoria o compartida)")
+    return CacheRespuestas()
+
+# Límites de ritmo y cuota de las APIs externas, comunes a todo el proceso
+planificador = PlanificadorSalida()
+
+# Instancia compartida de la fachada: la usan tanto la API como la interfaz web,
+# de modo que comparten pool de conexiones y caché dentro del proceso. Los días
+# históricos ya descargados se conservan en un almacén local.
+fachada = AireYClimaFacade(cache=crear_cache(), almacen=AlmacenSeries(os.path.join(INSTANCE_PATH, "series.sqlite")),
+                           planificador=planificador)
+
+# Geocodificador compartido. El nomenclátor offline (TSV de GeoNames) es opcional.
+_ruta_nomenclator = os.environ.get("NOMENCLATOR_TSV")
+geocodificador = Geocodificador(
+    ruta_db=os.path.join(INSTANCE_PATH, "geocodificacion.sqlite"),
+    nomenclator=Nomenclator.desde_geonames(_ruta_nomenclator) if _ruta_nomenclator else None,
+    limitador=planificador.para(NOMINATIM_URL)
+)
+
+# Canal de actualizaciones en vivo: un solo refresco por celda para todos sus suscriptores
+difusor = Difusor(fachada)
+
+# Estadísticas de cachés, coalescencia y disyuntores, leídas en cada exportación de /metrics
+metricas.registrar_fuente("cache", lambda: fachada.cache.estadisticas(), cache="respuestas")
+metricas.registrar_fuente("cache", lambda: geocodificador.memoria.estadisticas(), cache="geocodificacion")
+metricas.registrar_fuente("coalescencia", lambda: fachada.coalescedor.estadisticas())
+metricas.registrar_fuente("difusion", difusor.estadisticas)
+metricas.registrar_fuente("celdas", lambda: fachada.celdas.estadisticas() if fachada.celdas else {})
+for _api, _disyuntor in fachada.disyuntores.items():
+    metricas.registrar_fuente("disyuntor", _disyuntor.estadisticas, api=_api)
+metricas.registrar_fuente("disyuntor", geocodificador.disyuntor.estadisticas, api="nominatim")
+for _host, _limitador in planificador.limitadores.items():
+    metricas.registrar_fuente("limitador", _limitador.estadisticas, host=_host)
@@ -1,39 +1,33 @@
 # app/ui/interfaz.py
-from flask import Blueprint, render_template, request
+from datetime import date
+from flask import Blueprint, make_response, render_template, request
 import requests
+from app.cache_http import respuesta_condicional, version_datos
+from app.facade.aireYClimaFacade import MAX_DIAS_HISTORICO
+from app.facade.analisis import UMBRALES_CALIDAD
+from app.facade.cache import CacheRespuestas
+from app.metricas import metricas
+from app.servicios import fachada, geocodificador
 
 ui = Blueprint('ui', __name__, template_folder='templates')
 
-def obtener_datos_clima(ciudad):
-    # Obtener coordenadas de la ciudad usando una API de geocodificación
-    geocoding_url = "https://nominatim.openstreetmap.org/search"
-    geocoding_params = {
-        "q": ciudad,
-        "format": "json",
-        "limit": 1
-    }
-    headers = {
-        "User-Agent": "mi-aplicacion-clima/1.0 (contacto@example.com)"  # Cambia el correo por uno válido
-    }
-    geocoding_response = requests.get(geocoding_url, params=geocoding_params, headers=headers)
+# Segundos que navegadores y proxies pueden reutilizar cada página
+MAX_AGE_INTERFAZ = 60
+MAX_AGE_HISTORICO = 10 * 60
 
+# Páginas ya generadas, por ciudad, días y versión de los datos
+fragmentos = CacheRespuestas(max_bytes=8 * 1024 * 1024, ttl={"index": 60 * 60, "historico": 24 * 60 * 60}, gracia=0)
+metricas.registrar_fuente("cache", fragmentos.estadisticas, cache="paginas")
 
-    if geocoding_response.status_code == 200 and geocoding_response.text.strip():
+def obtener_datos_clima(ciudad):
+    # Obtener coordenadas de la ciudad (caché local o API de geocodificación)
+    latitude, longitude = obtener_coordenadas(ciudad)
+    if latitude is not None and longitude is not None:
         try:
-            geocoding_data = geocoding_response.json()
-            if geocoding_data and len(geocoding_data) > 0:
-                location = geocoding_data[0]
-                latitude = location["lat"]
-                longitude = location["lon"]
-
-                # Llamar a la API interna para obtener datos del clima y calidad del aire
-                url = f"http://127.0.0.1:5000/api/aire-clima/actual"
-                response = requests.get(url, params={"latitude": latitude, "longitude": longitude})
-
-                if response.status_code == 200:
-                    return response.json()
-        except ValueError as e:
-            print("Error al decodificar JSON de geocodificación:", e)
+            # Consultar la fachada directamente, sin pasar por la API HTTP
+            return fachada.recoger_ultimo_dato(latitude, longitude)
+        except requests.RequestException as e:
+            print("Error al obtener datos del clima:", e)
     return {"error": "No se pudo obtener el dato"}
 
 
@@ -41,65 +35,62 @@ def obtener_datos_clima(ciudad):
 def mostrar_interfaz():
     ciudad = request.args.get("ciudad", "Vitoria")  # Ciudad por defecto: Madrid
     datos = obtener_datos_clima(ciudad)
+    
+    # La página solo cambia cuando cambian los datos: se reutiliza el HTML ya generado
+    version = version_datos(datos.get("frescura"))
+    clave = ("index", ciudad, version)
+    html = fragmentos.obtener(clave) if version is not None else None
+    if html is None:
+        html = renderizar_interfaz(datos)
+        if version is not None:
+            fragmentos.guardar(clave, html)
+    return respuesta_condicional(make_response(html), datos.get("frescura"), MAX_AGE_INTERFAZ)
+
+
+def renderizar_interfaz(datos):
     temperatura = datos.get("weather", {}).get("current_weather", {}).get("temperature", "N/A")
     
     # Acceder al primer valor de las listas de PM10 y PM2.5
     air_quality = datos.get("air_quality", {}).get("hourly", {})
-    pm10 = air_quality.get("pm10", ["N/A"])[0]  # Primer valor de la lista
-    pm2_5 = air_quality.get("pm2_5", ["N/A"])[0]  # Primer valor de la lista
+    pm10 = (air_quality.get("pm10") or ["N/A"])[0]  # Valor de la hora en curso
+    pm2_5 = (air_quality.get("pm2_5") or ["N/A"])[0]  # Valor de la hora en curso
     
     calidad_aire = calcular_calidad_aire(pm10, pm2_5)
-    return render_template(
-        'index.html',
-        temperatura=temperatura,
-        pm10=pm10,
-        pm2_5=pm2_5,
-        calidad_aire=calidad_aire,
-        request=request
-    )
+    
+    # Avisar si se muestran datos caducados mientras se actualizan
+    frescura = datos.get("frescura", {}).values()
+    obsoleto = any(f["obsoleto"] for f in frescura)
+    edad_minutos = max((f["edad"] or 0 for f in frescura), default=0) // 60
+    with metricas.tramo("render"):
+        return render_template(
+            'index.html',
+            temperatura=temperatura,
+            pm10=pm10,
+            pm2_5=pm2_5,
+            calidad_aire=calidad_aire,
+            obsoleto=obsoleto,
+            edad_minutos=edad_minutos,
+            request=request
+        )
     
     
 def calcular_calidad_aire(pm10, pm2_5):
     if pm10 == "N/A" or pm2_5 == "N/A":
         return "Datos no disponibles"
-    if pm10 > 150 or pm2_5 > 75:
-        return "Mala calidad"
-    elif pm10 > 100 or pm2_5 > 50:
-        return "Algo mala"
-    elif pm10 > 50 or pm2_5 > 25:
-        return "Media"
-    elif pm10 > 25 or pm2_5 > 15:
-        return "Buena"
-    else:
-        return "Muy buena"
+    for limite_pm10, limite_pm2_5, calidad in UMBRALES_CALIDAD:
+        if pm10 > limite_pm10 or pm2_5 > limite_pm2_5:
+            return calidad
+    return "Muy buena"
 
 # Nueva función para obtener coordenadas de una ciudad
 def obtener_coordenadas(ciudad):
-    geocoding_url = "https://nominatim.openstreetmap.org/search"
-    geocoding_params = {
-        "q": ciudad,
-        "format": "json",
-        "limit": 1
-    }
-    headers = {
-        "User-Agent": "mi-aplicacion-clima/1.0 (contacto@example.com)"
-    }
-    try:
-        geocoding_response = requests.get(geocoding_url, params=geocoding_params, headers=headers)
-        if geocoding_response.status_code == 200 and geocoding_response.text.strip():
-            geocoding_data = geocoding_response.json()
-            if geocoding_data:
-                location = geocoding_data[0]
-                return float(location["lat"]), float(location["lon"])
-    except Exception as e:
-        print(f"Error al obtener coordenadas: {e}")
-    
-    return None, None
+    with metricas.tramo("geocodificacion"):
+        return geocodificador.resolver(ciudad)
 
 @ui.route('/historico')
 def mostrar_historico():
     ciudad = request.args.get("ciudad", "Vitoria")
-    dias = int(request.args.get("dias", 7))
+    dias = min(max(int(request.args.get("dias", 7)), 1), MAX_DIAS_HISTORICO)
     
     # Conseguir las coordenadas de la ciudad
     latitude, longitude = obtener_coordenadas(ciudad)
@@ -107,21 +98,27 @@ def mostrar_historico():
     if latitude is None or longitude is None:
         return render_template('historico.html', error="No se pudo obtener la ubicación", ciudad=ciudad, dias=dias)
     
-    # Llamar a la API de datos históricos
-    url = f"http://127.0.0.1:5000/api/aire-clima/historico"
-    response = requests.get(url, params={"latitude": latitude, "longitude": longitude, "dias": dias})
-    
-    if response.status_code != 200:
+    # Obtener y analizar los datos históricos directamente con la fachada
+    try:
+        datos_historicos = fachada.obtener_datos_historicos(latitude, longitude, dias)
+    except requests.RequestException:
         return render_template('historico.html', error="Error al obtener datos históricos", ciudad=ciudad, dias=dias)
     
-    datos = response.json()
-    informe = datos.get("informe", {})
-    
-    return render_template(
-        'historico.html',
-        ciudad=ciudad,
-        dias=dias,
-        informe=informe
-    )
-
-
+    # Los días cerrados salen del almacén sin versión; la fecha de hoy fija el rango
+    frescura = datos_historicos.get("frescura", {})
+    version = tuple(f.get("actualizado") for f in frescura.values())
+    clave = ("historico", ciudad, dias, date.today().isoformat(), version)
+    con_datos = datos_historicos.get("weather_historical") and datos_historicos.get("air_quality_historical")
+    html = fragmentos.obtener(clave) if con_datos else None
+    if html is None:
+        informe = fachada.analizar_tendencias(datos_historicos)
+        with metricas.tramo("render"):
+            html = render_template(
+                'historico.html',
+                ciudad=ciudad,
+                dias=dias,
+                informe=informe
+            )
+        if con_datos:
+            fragmentos.guardar(clave, html)
+    return respuesta_condicional(make_response(html), frescura, MAX_AGE_HISTORICO)
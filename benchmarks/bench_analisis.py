@@ -0,0 +1,51 @@
+# benchmarks/bench_analisis.py
+"""
+Compara los motores de analizar_tendencias ("python" con statistics.mean y
+"numpy" vectorizado) sobre ventanas de 1, 30 y 365 días.
+
+Uso:
+    python -m benchmarks.bench_analisis [--repeticiones 20]
+"""
+import argparse
+import random
+import timeit
+
+from app.facade.aireYClimaFacade import AireYClimaFacade
+
+
+def generar_datos(dias, semilla=0):
+    aleatorio = random.Random(semilla)
+    return {
+        "weather_historical": {
+            "daily": {
+                "temperature_2m_max": [round(aleatorio.uniform(10, 35), 1) for _ in range(dias)],
+                "temperature_2m_min": [round(aleatorio.uniform(-5, 15), 1) for _ in range(dias)]
+            }
+        },
+        "air_quality_historical": {
+            "hourly": {
+                "pm10": [round(aleatorio.uniform(5, 90), 1) for _ in range(dias * 24)],
+                "pm2_5": [round(aleatorio.uniform(2, 45), 1) for _ in range(dias * 24)]
+            }
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    motores = {nombre: AireYClimaFacade(motor_analisis=nombre) for nombre in ("python", "numpy")}
+    print(f"{'días':>5} {'python (ms)':>12} {'numpy (ms)':>12} {'aceleración':>12}")
+    for dias in (1, 30, 365):
+        datos = generar_datos(dias)
+        tiempos = {}
+        for nombre, fachada in motores.items():
+            total = min(timeit.repeat(lambda: fachada.analizar_tendencias(datos), number=args.repeticiones, repeat=3))
+            tiempos[nombre] = total / args.repeticiones * 1000
+        print(f"{dias:>5} {tiempos['python']:>12.3f} {tiempos['numpy']:>12.3f} {tiempos['python'] / tiempos['numpy']:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/bench_interfaz.py
+"""
+Compara la latencia por página y los workers ocupados de la interfaz web
+llamando a la fachada en el mismo proceso frente al antiguo bucle HTTP
+contra /api/aire-clima/actual.
+
+Uso:
+    python -m benchmarks.bench_interfaz [--peticiones 200] [--concurrencia 8] [--latencia-ms 50]
+"""
+import argparse
+import logging
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+
+import requests
+from flask import Blueprint, render_template, request
+from werkzeug.serving import make_server
+
+from app.facade.cache import CacheRespuestas
+from app.servicios import fachada, geocodificador
+from main import create_app
+
+GEOCODIFICACION = [{"lat": "42.85", "lon": "-2.67", "display_name": "Vitoria"}]
+CLIMA = {"current_weather": {"temperature": 18.2}}
+CALIDAD_AIRE = {"hourly": {"pm10": [12.0] * 120, "pm2_5": [7.5] * 120}}
+
+
+def crear_blueprint_bucle(puerto):
+    """Reproduce la ruta '/' original, que pedía los datos a la propia API por HTTP."""
+    legado = Blueprint('legado', __name__)
+    sesion = requests.Session()
+
+    @legado.route('/legado/')
+    def mostrar_interfaz_legado():
+        location = requests.get("https://nominatim.openstreetmap.org/search").json()[0]
+        url = f"http://127.0.0.1:{puerto}/api/aire-clima/actual"
+        datos = sesion.get(url, params={"latitude": location["lat"], "longitude": location["lon"]}).json()
+        temperatura = datos["weather"]["current_weather"]["temperature"]
+        pm10 = datos["air_quality"]["hourly"]["pm10"][0]
+        pm2_5 = datos["air_quality"]["hourly"]["pm2_5"][0]
+        return render_template('index.html', temperatura=temperatura, pm10=pm10, pm2_5=pm2_5,
+                               calidad_aire="Muy buena", request=request)
+
+    return legado
+
+
+def medir(url, peticiones, concurrencia):
+    sesion = requests.Session()
+
+    def una_peticion(_):
+        inicio = time.perf_counter()
+        sesion.get(url).raise_for_status()
+        return time.perf_counter() - inicio
+
+    with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+        latencias = sorted(executor.map(una_peticion, range(peticiones)))
+    return {
+        "p50_ms": round(statistics.median(latencias) * 1000, 2),
+        "p95_ms": round(latencias[int(len(latencias) * 0.95) - 1] * 1000, 2),
+        "media_ms": round(statistics.mean(latencias) * 1000, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peticiones", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--latencia-ms", type=float, default=50.0, help="Latencia simulada de cada API externa")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    app = create_app({"PRECALENTAR": False})
+    servidor = make_server("127.0.0.1", 0, app, threaded=True)
+    app.register_blueprint(crear_blueprint_bucle(servidor.server_port))
+
+    # Contar las peticiones que ocupan un worker del servidor a la vez
+    en_curso = {"actual": 0, "maximo": 0}
+    lock = threading.Lock()
+
+    @app.before_request
+    def entrar():
+        with lock:
+            en_curso["actual"] += 1
+            en_curso["maximo"] = max(en_curso["maximo"], en_curso["actual"])
+
+    @app.teardown_request
+    def salir(_):
+        with lock:
+            en_curso["actual"] -= 1
+
+    def api_externa(url, params, prioridad=None):
+        time.sleep(args.latencia_ms / 1000)
+        return CLIMA if url == fachada.weather_api_url else CALIDAD_AIRE
+
+    geocodificacion = Mock(status_code=200, text="[...]", content=b"[...]")
+    geocodificacion.json.return_value = GEOCODIFICACION
+
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{servidor.server_port}"
+    # Sin caché, para medir el coste completo de cada página. El geocodificador usa su
+    # propia sesión: también se simula para no consultar Nominatim de verdad
+    with patch.object(fachada, "_obtener_json", side_effect=api_externa), \
+            patch.object(fachada, "cache", CacheRespuestas(max_bytes=0)), \
+            patch("requests.get", return_value=geocodificacion), \
+            patch.object(geocodificador.session, "get", return_value=geocodificacion):
+        for nombre, ruta in (("en proceso", "/"), ("bucle HTTP", "/legado/")):
+            en_curso["maximo"] = 0
+            resultado = medir(base + ruta, args.peticiones, args.concurrencia)
+            resultado["workers_max"] = en_curso["maximo"]
+            print(f"{nombre:>12}: {resultado}")
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# benchmarks/carga_async.py
+"""
+Prueba de carga de /api/aire-clima/actual: servidor WSGI con un número fijo
+de hilos (el despliegue síncrono habitual) frente a la aplicación ASGI bajo
+uvicorn. Las APIs externas se sustituyen por un servidor local que responde
+con una latencia fija, y la caché se desactiva para que cada petición llegue
+a las APIs. Cada servidor corre en su propio proceso para que el generador de
+carga no compita con ellos por el GIL.
+
+Uso:
+    python -m benchmarks.carga_async [--peticiones 2000] [--concurrencia 500] [--hilos 16] [--latencia-ms 200]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import socket
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import uvicorn
+from werkzeug.serving import BaseWSGIServer
+
+from app.facade.cache import CacheRespuestas
+
+PUERTO_API, PUERTO_WSGI, PUERTO_ASGI = 8799, 8797, 8798
+BASE_API = f"http://127.0.0.1:{PUERTO_API}"
+
+CLIMA = json.dumps({"current_weather": {"temperature": 18.2}}).encode()
+CALIDAD_AIRE = json.dumps({"hourly": {"pm10": [12.0] * 120, "pm2_5": [7.5] * 120}}).encode()
+
+
+def crear_api_simulada(latencia):
+    """Aplicación ASGI que imita a Open-Meteo respondiendo tras `latencia` segundos."""
+    async def api_simulada(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        await asyncio.sleep(latencia)
+        cuerpo = CLIMA if scope["path"].startswith("/clima") else CALIDAD_AIRE
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": cuerpo})
+    return api_simulada
+
+
+class ServidorHilosFijos(BaseWSGIServer):
+    """Servidor WSGI que atiende las peticiones con un pool fijo de hilos."""
+
+    def __init__(self, host, port, app, hilos):
+        super().__init__(host, port, app)
+        self.executor = ThreadPoolExecutor(max_workers=hilos)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def _sin_cache(fachada):
+    """Apunta la fachada a la API simulada y desactiva su caché."""
+    fachada.weather_api_url = BASE_API + "/clima"
+    fachada.air_quality_api_url = BASE_API + "/aire"
+    fachada.cache = CacheRespuestas(max_bytes=0)
+
+
+def servir_api_simulada(latencia):
+    uvicorn.run(crear_api_simulada(latencia), host="127.0.0.1", port=PUERTO_API, log_level="warning")
+
+
+def servir_wsgi(hilos):
+    from app.servicios import fachada
+    from main import create_app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    _sin_cache(fachada)
+    ServidorHilosFijos("127.0.0.1", PUERTO_WSGI, create_app({"PRECALENTAR": False}), hilos).serve_forever()
+
+
+def servir_asgi():
+    from app.api import asgi
+
+    _sin_cache(asgi.fachada)
+    uvicorn.run(asgi.aplicacion, host="127.0.0.1", port=PUERTO_ASGI, log_level="warning")
+
+
+def esperar_puerto(puerto):
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", puerto)).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+async def una_peticion(puerto, ruta):
+    """
+    GET mínimo con una conexión nueva por petición. Se usan sockets de asyncio
+    en lugar de un cliente HTTP completo para que el generador de carga no
+    sea el cuello de botella en máquinas con pocos núcleos.
+    """
+    lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+    escritor.write(f"GET {ruta} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode())
+    respuesta = await lector.read()
+    escritor.close()
+    if respuesta[9:12] != b"200":
+        raise RuntimeError(respuesta[:100])
+
+
+async def medir(puerto, peticiones, concurrencia):
+    limite = asyncio.Semaphore(concurrencia)
+    ruta = "/api/aire-clima/actual?latitude=42.85&longitude=-2.67"
+
+    async def medir_una(_):
+        async with limite:
+            inicio = time.perf_counter()
+            await una_peticion(puerto, ruta)
+            return time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    latencias = sorted(await asyncio.gather(*map(medir_una, range(peticiones))))
+    duracion = time.perf_counter() - inicio
+    return {
+        "peticiones_s": round(peticiones / duracion, 1),
+        "p50_ms": round(statistics.median(latencias) * 1000, 2),
+        "p99_ms": round(latencias[int(len(latencias) * 0.99) - 1] * 1000, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=500)
+    parser.add_argument("--hilos", type=int, default=16, help="Hilos del servidor WSGI")
+    parser.add_argument("--latencia-ms", type=float, default=200.0, help="Latencia simulada de cada API externa")
+    args = parser.parse_args()
+
+    procesos = [
+        multiprocessing.Process(target=servir_api_simulada, args=(args.latencia_ms / 1000,), daemon=True),
+        multiprocessing.Process(target=servir_wsgi, args=(args.hilos,), daemon=True),
+        multiprocessing.Process(target=servir_asgi, daemon=True)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    for puerto in (PUERTO_API, PUERTO_WSGI, PUERTO_ASGI):
+        esperar_puerto(puerto)
+
+    for nombre, puerto in ((f"WSGI {args.hilos} hilos", PUERTO_WSGI), ("ASGI uvicorn", PUERTO_ASGI)):
+        resultado = asyncio.run(medir(puerto, args.peticiones, args.concurrencia))
+        print(f"{nombre:>16}: {resultado}")
+
+    for proceso in procesos:
+        proceso.terminate()
+
+
+if __name__ == "__main__":
+    main()
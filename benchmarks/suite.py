@@ -0,0 +1,360 @@
+# benchmarks/suite.py
+"""
+Batería de benchmarks de extremo a extremo. Arranca un servidor local que
+reproduce respuestas grabadas de Open-Meteo (previsión y calidad del aire) y
+de Nominatim, con latencia y errores configurables, y la aplicación WSGI
+apuntando a él. Después lanza cada escenario (API y páginas de la interfaz)
+con varios niveles de concurrencia fijos y mide peticiones por segundo,
+latencias p50/p95/p99 y memoria del servidor.
+
+Los resultados se guardan en JSON (por defecto benchmarks/resultados/<commit>.json)
+para poder comparar dos commits:
+
+    python -m benchmarks.suite [--concurrencias 1 8 32] [--peticiones 300] [--latencia-ms 50]
+                               [--jitter-ms 20] [--errores 0.0] [--sin-cache] [--salida fichero.json]
+    python -m benchmarks.suite --comparar anterior.json [actual.json]
+    python -m benchmarks.suite --grabar
+
+Con --comparar y un solo fichero se ejecuta la batería y se compara con él;
+con dos, solo se comparan. --grabar sustituye las grabaciones de
+benchmarks/datos por respuestas reales de las APIs (requiere red).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qs
+
+import uvicorn
+
+from benchmarks.carga_async import ServidorHilosFijos, esperar_puerto
+
+PUERTO_SIMULADO, PUERTO_APLICACION = 8789, 8788
+BASE_SIMULADA = f"http://127.0.0.1:{PUERTO_SIMULADO}"
+DIRECTORIO_DATOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datos")
+DIRECTORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+GRABACIONES = ("clima_actual", "clima_diario", "calidad_aire_horaria", "nominatim")
+
+# Ubicaciones consultadas por turnos: las mismas ciudades que la grabación de Nominatim
+CIUDADES = ("Vitoria", "Madrid", "Bilbao", "Barcelona", "Sevilla", "Valencia", "Zaragoza", "Donostia")
+COORDENADAS = ((42.85, -2.67), (40.42, -3.70), (43.26, -2.93), (41.38, 2.18),
+               (37.39, -6.00), (39.47, -0.38), (41.65, -0.88), (43.32, -1.98))
+
+ESCENARIOS = {
+    "api_actual": lambda i: "/api/aire-clima/actual?latitude={}&longitude={}".format(*COORDENADAS[i % len(COORDENADAS)]),
+    "api_historico": lambda i: "/api/aire-clima/historico?latitude={}&longitude={}&dias=30".format(
+        *COORDENADAS[i % len(COORDENADAS)]),
+    "ui_index": lambda i: f"/?ciudad={CIUDADES[i % len(CIUDADES)]}",
+    "ui_historico": lambda i: f"/historico?ciudad={CIUDADES[i % len(CIUDADES)]}&dias=7"
+}
+
+
+def cargar_grabaciones():
+    grabaciones = {}
+    for nombre in GRABACIONES:
+        with open(os.path.join(DIRECTORIO_DATOS, nombre + ".json"), encoding="utf-8") as f:
+            grabaciones[nombre] = json.load(f)
+    return grabaciones
+
+
+def _dias(query):
+    inicio = date.fromisoformat(query["start_date"][0])
+    fin = date.fromisoformat(query["end_date"][0])
+    return [inicio + timedelta(days=d) for d in range((fin - inicio).days + 1)]
+
+
+def _repetir(valores, n):
+    """Repite la serie grabada hasta tener n valores."""
+    return [valores[i % len(valores)] for i in range(n)]
+
+
+def responder(ruta, query, grabaciones):
+    """
+    Respuesta de la API simulada. Las series grabadas se repiten para cubrir el
+    rango de fechas pedido, con el mismo formato que la API real.
+    """
+    if ruta == "/search":
+        buscada = query.get("q", [""])[0].lower()
+        return [lugar for lugar in grabaciones["nominatim"] if lugar["name"].lower().startswith(buscada)][:1]
+
+    historico = "start_date" in query
+    dias = _dias(query) if historico else [date.today() + timedelta(days=d) for d in range(5)]
+    if ruta == "/v1/forecast" and not historico:
+        return grabaciones["clima_actual"]
+    if ruta == "/v1/forecast":
+        grabada = grabaciones["clima_diario"]
+        return dict(grabada, daily={
+            "time": [dia.isoformat() for dia in dias],
+            "temperature_2m_max": _repetir(grabada["daily"]["temperature_2m_max"], len(dias)),
+            "temperature_2m_min": _repetir(grabada["daily"]["temperature_2m_min"], len(dias))
+        })
+    grabada = grabaciones["calidad_aire_horaria"]
+    return dict(grabada, hourly={
+        "time": [f"{dia.isoformat()}T{hora:02d}:00" for dia in dias for hora in range(24)],
+        "pm10": _repetir(grabada["hourly"]["pm10"], 24 * len(dias)),
+        "pm2_5": _repetir(grabada["hourly"]["pm2_5"], 24 * len(dias))
+    })
+
+
+def crear_servidor_simulado(latencia, jitter, errores, semilla=0):
+    """
+    Aplicación ASGI que imita a Open-Meteo y Nominatim.
+
+    Args:
+        latencia: Segundos de espera antes de cada respuesta
+        jitter: Variación aleatoria (±) de la latencia en segundos
+        errores: Fracción de respuestas que devuelven un error 429, 500 o 503
+        semilla: Semilla de la latencia y los errores, para repetir una ejecución
+    """
+    aleatorio = random.Random(semilla)
+    grabaciones = cargar_grabaciones()
+
+    async def servidor_simulado(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        await asyncio.sleep(max(0.0, latencia + aleatorio.uniform(-jitter, jitter)))
+        if aleatorio.random() < errores:
+            estado, cuerpo = aleatorio.choice((429, 500, 503)), {"error": True, "reason": "Error simulado"}
+        else:
+            query = parse_qs(scope["query_string"].decode("latin-1"))
+            estado, cuerpo = 200, responder(scope["path"], query, grabaciones)
+        await send({"type": "http.response.start", "status": estado,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": json.dumps(cuerpo).encode()})
+    return servidor_simulado
+
+
+def servir_simulado(latencia, jitter, errores):
+    uvicorn.run(crear_servidor_simulado(latencia, jitter, errores), host="127.0.0.1",
+                port=PUERTO_SIMULADO, log_level="warning")
+
+
+def servir_aplicacion(hilos, sin_cache, directorio):
+    # Cachés persistentes en un directorio temporal: cada ejecución empieza en frío
+    os.environ["AIRE_CLIMA_INSTANCE"] = directorio
+    from app.facade import geocodificacion
+    from app.facade.cache import CacheRespuestas
+    from app.servicios import fachada, geocodificador
+    from main import create_app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    fachada.weather_api_url = BASE_SIMULADA + "/v1/forecast"
+    fachada.air_quality_api_url = BASE_SIMULADA + "/v1/air-quality"
+    geocodificacion.NOMINATIM_URL = BASE_SIMULADA + "/search"
+    geocodificador.intervalo_minimo = 0
+    if sin_cache:
+        fachada.cache = CacheRespuestas(max_bytes=0)
+    ServidorHilosFijos("127.0.0.1", PUERTO_APLICACION, create_app({"PRECALENTAR": False}), hilos).serve_forever()
+
+
+def memoria_proceso(pid):
+    """Memoria residente actual y máxima (MB) de un proceso, o None si no se puede leer (solo Linux)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            campos = dict(linea.split(":", 1) for linea in f if ":" in linea)
+    except OSError:
+        return None, None
+    return tuple(round(int(campos[campo].split()[0]) / 1024, 1) for campo in ("VmRSS", "VmHWM"))
+
+
+async def una_peticion(ruta):
+    """GET con una conexión nueva; devuelve el código de estado HTTP."""
+    lector, escritor = await asyncio.open_connection("127.0.0.1", PUERTO_APLICACION)
+    escritor.write(f"GET {ruta} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode())
+    respuesta = await lector.read()
+    escritor.close()
+    return int(respuesta[9:12])
+
+
+def percentil(ordenadas, p):
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    return ordenadas[max(0, math.ceil(p / 100 * len(ordenadas)) - 1)]
+
+
+async def medir(escenario, peticiones, concurrencia):
+    """Lanza `peticiones` peticiones del escenario con `concurrencia` clientes en bucle cerrado."""
+    rutas = ESCENARIOS[escenario]
+    pendientes = iter(range(peticiones))
+    latencias, errores = [], 0
+
+    async def cliente():
+        nonlocal errores
+        for i in pendientes:
+            inicio = time.perf_counter()
+            try:
+                estado = await una_peticion(rutas(i))
+            except OSError:
+                estado = 0
+            latencias.append(time.perf_counter() - inicio)
+            if estado != 200:
+                errores += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        "peticiones": peticiones,
+        "errores": errores,
+        "peticiones_s": round(peticiones / duracion, 1),
+        "p50_ms": round(statistics.median(latencias) * 1000, 2),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2)
+    }
+
+
+def ejecutar(args):
+    contexto = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directorio:
+        simulado = contexto.Process(target=servir_simulado, daemon=True,
+                                    args=(args.latencia_ms / 1000, args.jitter_ms / 1000, args.errores))
+        aplicacion = contexto.Process(target=servir_aplicacion, daemon=True,
+                                      args=(args.hilos, args.sin_cache, directorio))
+        simulado.start()
+        aplicacion.start()
+        esperar_puerto(PUERTO_SIMULADO)
+        esperar_puerto(PUERTO_APLICACION)
+
+        resultados = []
+        try:
+            for escenario in args.escenarios:
+                # Una vuelta por todas las ubicaciones antes de medir (geocodificación, caché y almacén)
+                asyncio.run(medir(escenario, len(CIUDADES), 1))
+                for concurrencia in args.concurrencias:
+                    resultado = asyncio.run(medir(escenario, args.peticiones, concurrencia))
+                    resultado["rss_mb"], resultado["rss_max_mb"] = memoria_proceso(aplicacion.pid)
+                    resultado = dict(escenario=escenario, concurrencia=concurrencia, **resultado)
+                    print(f"{escenario:>14} c={concurrencia:<4} {resultado['peticiones_s']:>8} pet/s  "
+                          f"p50 {resultado['p50_ms']:>8} ms  p95 {resultado['p95_ms']:>8} ms  "
+                          f"p99 {resultado['p99_ms']:>8} ms  errores {resultado['errores']:>4}  "
+                          f"RSS {resultado['rss_mb']} MB")
+                    resultados.append(resultado)
+        finally:
+            aplicacion.terminate()
+            simulado.terminate()
+    return resultados
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(anterior, actual, umbral):
+    """
+    Compara dos ficheros de resultados escenario a escenario. Devuelve las líneas
+    del informe; las que empeoran más de `umbral` (fracción) se marcan como regresión.
+    """
+    previos = {(r["escenario"], r["concurrencia"]): r for r in anterior["resultados"]}
+    lineas = [f"{anterior.get('commit')} -> {actual.get('commit')}"]
+    for resultado in actual["resultados"]:
+        previo = previos.get((resultado["escenario"], resultado["concurrencia"]))
+        if previo is None:
+            continue
+        cambios = []
+        # Más peticiones por segundo es mejor; más latencia o memoria, peor
+        for metrica, signo in (("peticiones_s", -1), ("p95_ms", 1), ("p99_ms", 1), ("rss_max_mb", 1)):
+            if not previo.get(metrica) or resultado.get(metrica) is None:
+                continue
+            cambio = (resultado[metrica] - previo[metrica]) / previo[metrica]
+            marca = " REGRESIÓN" if signo * cambio > umbral else ""
+            cambios.append(f"{metrica} {previo[metrica]} -> {resultado[metrica]} ({cambio:+.0%}){marca}")
+        lineas.append(f"{resultado['escenario']:>14} c={resultado['concurrencia']:<4} " + "; ".join(cambios))
+    return lineas
+
+
+def grabar():
+    """Sustituye las grabaciones por respuestas reales de Open-Meteo y Nominatim."""
+    import requests
+    from app.facade.geocodificacion import NOMINATIM_URL, USER_AGENT
+
+    latitude, longitude = COORDENADAS[0]
+    ayer = date.today() - timedelta(days=1)
+    peticiones = {
+        "clima_actual": ("https://api.open-meteo.com/v1/forecast",
+                         {"latitude": latitude, "longitude": longitude, "current_weather": True}),
+        "clima_diario": ("https://api.open-meteo.com/v1/forecast",
+                         {"latitude": latitude, "longitude": longitude, "timezone": "auto",
+                          "start_date": (ayer - timedelta(days=6)).isoformat(), "end_date": ayer.isoformat(),
+                          "daily": "temperature_2m_max,temperature_2m_min"}),
+        "calidad_aire_horaria": ("https://air-quality-api.open-meteo.com/v1/air-quality",
+                                 {"latitude": latitude, "longitude": longitude, "timezone": "auto",
+                                  "start_date": ayer.isoformat(), "end_date": ayer.isoformat(),
+                                  "hourly": "pm10,pm2_5"})
+    }
+    sesion = requests.Session()
+    sesion.headers["User-Agent"] = USER_AGENT
+    grabaciones = {nombre: sesion.get(url, params=params, timeout=10).json()
+                   for nombre, (url, params) in peticiones.items()}
+    grabaciones["nominatim"] = []
+    for ciudad in CIUDADES:
+        lugares = sesion.get(NOMINATIM_URL, params={"q": ciudad, "format": "json", "limit": 1}, timeout=10).json()
+        # El servidor simulado busca por "name": se guarda con el nombre consultado
+        for lugar in lugares:
+            lugar["name"] = ciudad
+        grabaciones["nominatim"] += lugares
+        # Política de uso de Nominatim: como mucho una petición por segundo
+        time.sleep(1)
+    for nombre, datos in grabaciones.items():
+        with open(os.path.join(DIRECTORIO_DATOS, nombre + ".json"), "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, indent=1)
+            f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escenarios", nargs="+", choices=ESCENARIOS, default=list(ESCENARIOS))
+    parser.add_argument("--concurrencias", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--peticiones", type=int, default=300, help="Peticiones por escenario y concurrencia")
+    parser.add_argument("--hilos", type=int, default=16, help="Hilos del servidor WSGI")
+    parser.add_argument("--latencia-ms", type=float, default=50.0, help="Latencia de la API simulada")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Variación (±) de la latencia simulada")
+    parser.add_argument("--errores", type=float, default=0.0, help="Fracción de respuestas con error de la API simulada")
+    parser.add_argument("--sin-cache", action="store_true", help="Desactiva la caché de respuestas de la fachada")
+    parser.add_argument("--salida", help="Fichero JSON de resultados (por defecto resultados/<commit>.json)")
+    parser.add_argument("--comparar", nargs="+", metavar="FICHERO", help="Resultados anteriores (y actuales)")
+    parser.add_argument("--umbral", type=float, default=0.10, help="Empeoramiento que cuenta como regresión")
+    parser.add_argument("--grabar", action="store_true", help="Graba respuestas reales en benchmarks/datos")
+    args = parser.parse_args()
+
+    if args.grabar:
+        grabar()
+        return
+    if args.comparar and len(args.comparar) == 2:
+        with open(args.comparar[0]) as f_anterior, open(args.comparar[1]) as f_actual:
+            print("\n".join(comparar(json.load(f_anterior), json.load(f_actual), args.umbral)))
+        return
+
+    commit = commit_actual()
+    informe = {
+        "commit": commit,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "parametros": {clave: valor for clave, valor in vars(args).items()
+                       if clave not in ("salida", "comparar", "umbral", "grabar")},
+        "resultados": ejecutar(args)
+    }
+    salida = args.salida or os.path.join(DIRECTORIO_RESULTADOS, f"{commit or 'sin-commit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w") as f:
+        json.dump(informe, f, indent=1)
+    print(f"Resultados guardados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar[0]) as f:
+            print("\n".join(comparar(json.load(f), informe, args.umbral)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,85 @@
 # main.py
+import click
 from flask import Flask
 from app.api.routes import api
 from app.ui.interfaz import ui  # Importar la interfaz web
+from app.facade.precalentamiento import Precalentador
+from app import metricas
+from app.cache_http import comprimir_respuesta
+from app.facade.difusion import leer_ubicaciones
+from app.facade.espacial import comprobar_coordenadas
+from app.facade.exportacion import FORMATOS, exportar, formato_por_defecto, formatos_disponibles
+from app.servicios import fachada
 
-def create_app():
+# Configuración por defecto; se puede sobrescribir con variables de entorno
+# FLASK_<CLAVE> (p. ej. FLASK_PRECALENTAR_UBICACIONES='[[42.85, -2.67]]')
+CONFIGURACION = {
+    "PRECALENTAR": True,
+    "PRECALENTAR_UBICACIONES": [],
+    "PRECALENTAR_MAX_UBICACIONES": 20,
+    "PRECALENTAR_PETICIONES_MINUTO": 60,
+    "PRECALENTAR_INTERVALO": 60,
+    "PRECALENTAR_ANTELACION": 300,
+    # Añade a cada respuesta la cabecera Server-Timing con la duración de sus etapas
+    "SERVER_TIMING": False
+}
+
+@click.command("exportar")
+@click.option("--ubicacion", "ubicaciones", type=(float, float), multiple=True,
+              help="Latitud y longitud de una ubicación (repetible)")
+@click.option("--fichero-ubicaciones", type=click.File("r"),
+              help="Fichero con una ubicación 'latitud,longitud' por línea")
+@click.option("--desde", type=click.DateTime(["%Y-%m-%d"]), required=True, help="Primer día (AAAA-MM-DD)")
+@click.option("--hasta", type=click.DateTime(["%Y-%m-%d"]), required=True, help="Último día, incluido (AAAA-MM-DD)")
+@click.option("--formato", type=click.Choice(list(FORMATOS)), default=formato_por_defecto(), show_default=True)
+@click.option("--salida", type=click.File("wb"), default="-", help="Fichero de salida (por defecto, la salida estándar)")
+@click.option("--paralelo", type=click.IntRange(1, 64), default=8, show_default=True,
+              help="Descargas simultáneas a las APIs")
+def exportar_historico(ubicaciones, fichero_ubicaciones, desde, hasta, formato, salida, paralelo):
+    """Exporta el clima diario y la calidad del aire horaria de varias ubicaciones a un solo fichero."""
+    try:
+        coordenadas = [comprobar_coordenadas(*ubicacion) for ubicacion in ubicaciones]
+    except ValueError:
+        raise click.BadParameter("latitud o longitud fuera de rango", param_hint="--ubicacion")
+    if fichero_ubicaciones is not None:
+        lineas = [linea.strip() for linea in fichero_ubicaciones if linea.strip() and not linea.startswith("#")]
+        try:
+            coordenadas.extend(leer_ubicaciones(lineas))
+        except ValueError:
+            raise click.BadParameter("se espera una ubicación 'latitud,longitud' por línea", param_hint="--fichero-ubicaciones")
+    if not coordenadas:
+        raise click.UsageError("Falta al menos una ubicación (--ubicacion o --fichero-ubicaciones)")
+    if hasta < desde:
+        raise click.UsageError("--hasta no puede ser anterior a --desde")
+    if formato not in formatos_disponibles():
+        raise click.UsageError(f"El formato {formato} necesita pyarrow, que no está instalado")
+    
+    for fragmento in exportar(fachada, coordenadas, desde.date(), hasta.date(), formato, paralelo=paralelo):
+        salida.write(fragmento)
+
+def create_app(config=None):
     app = Flask(__name__)
+    app.config.update(CONFIGURACION)
+    app.config.from_prefixed_env()
+    app.config.update(config or {})
     app.register_blueprint(api)
     app.register_blueprint(ui)  # Registrar la interfaz web
+    metricas.instalar(app)  # Duración de cada petición y de sus etapas
+    app.after_request(comprimir_respuesta)  # gzip/brotli según Accept-Encoding
+    app.cli.add_command(exportar_historico)  # flask --app main exportar ...
+    
+    # Refresco en segundo plano de las ubicaciones más consultadas
+    if app.config["PRECALENTAR"]:
+        precalentador = Precalentador(
+            fachada,
+            ubicaciones_fijas=app.config["PRECALENTAR_UBICACIONES"],
+            max_ubicaciones=app.config["PRECALENTAR_MAX_UBICACIONES"],
+            peticiones_minuto=app.config["PRECALENTAR_PETICIONES_MINUTO"],
+            intervalo=app.config["PRECALENTAR_INTERVALO"],
+            antelacion=app.config["PRECALENTAR_ANTELACION"]
+        )
+        app.extensions["precalentador"] = precalentador
+        precalentador.iniciar()
     return app
 
 if __name__ == "__main__":